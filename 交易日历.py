@@ -0,0 +1,140 @@
+import bisect
+import datetime as dt
+import logging
+import threading
+import time
+
+from 接口缓存 import next_rollover
+from 接口网关 import pro
+
+# ------------------------------------------------------
+# 进程级交易日历服务：每个进程只拉取一次 trade_cal，每个交易日切换时刻（9:00）后自动刷新。
+# 交易日保存为升序数组，并为日历内的每个自然日预先算好“不晚于该日的最后一个交易日”的下标，
+# 前后翻交易日、取最近 N 个交易日、按日期区间切片都只是数组下标运算。
+# 用法：from 交易日历 import calendar，然后 calendar.latest() / calendar.prev(d) / calendar.last_n(5) 等。
+# 日期一律为 YYYYMMDD 字符串；取不到时返回 None 或空列表。
+# ------------------------------------------------------
+
+YEARS_BACK = 2    # 向前加载的年数
+DAYS_AHEAD = 31   # 向后加载的自然日数，用于 next()
+
+
+def _today_str():
+    return dt.date.today().strftime('%Y%m%d')
+
+
+class TradeCalendar:
+    """
+    交易日历。loader(start_date, end_date) 返回含 cal_date、is_open 两列的 DataFrame，
+    默认通过接口网关调用 trade_cal。
+    """
+
+    def __init__(self, loader=None, exchange='SSE'):
+        self._loader = loader
+        self.exchange = exchange
+        # (升序交易日列表, {自然日: 不晚于该日的最后一个交易日的下标，-1 表示之前没有交易日})
+        # 两者作为一个元组整体替换，刷新时并发的查询看到的始终是同一份数据
+        self._data = ([], {})
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self, start_date, end_date):
+        if self._loader is not None:
+            return self._loader(start_date, end_date)
+        return pro.trade_cal(exchange=self.exchange, start_date=start_date, end_date=end_date,
+                             fields='cal_date,is_open')
+
+    def _ensure(self):
+        if time.time() < self._expires_at:
+            return self._data
+        with self._lock:
+            if time.time() < self._expires_at:
+                return self._data
+            today = dt.date.today()
+            start_date = today.replace(year=today.year - YEARS_BACK, day=1).strftime('%Y%m%d')
+            end_date = (today + dt.timedelta(days=DAYS_AHEAD)).strftime('%Y%m%d')
+            try:
+                df = self._load(start_date, end_date)
+            except Exception as e:
+                # 加载失败时保留旧数据，下次调用再重试
+                logging.error(f"获取交易日历出错: {e}")
+                return self._data
+            if df is None or df.empty:
+                logging.error("获取交易日历失败，返回空数据")
+                return self._data
+
+            cal_dates = df['cal_date'].astype(str).tolist()
+            is_open = df['is_open'].astype(int).tolist()
+            order = sorted(range(len(cal_dates)), key=cal_dates.__getitem__)
+
+            days, floor = [], {}
+            for i in order:
+                if is_open[i] == 1:
+                    days.append(cal_dates[i])
+                floor[cal_dates[i]] = len(days) - 1
+
+            self._data = (days, floor)
+            self._expires_at = next_rollover(time.time())
+            return self._data
+
+    @staticmethod
+    def _floor_index(days, floor, date):
+        """不晚于 date 的最后一个交易日的下标，没有时为 -1"""
+        index = floor.get(date)
+        if index is None:
+            # 超出已加载的日历范围（或日期格式不规范）时退回二分查找
+            index = bisect.bisect_right(days, date) - 1
+        return index
+
+    # ---------------- 查询 ----------------
+    def is_open(self, date):
+        days, floor = self._ensure()
+        index = self._floor_index(days, floor, date)
+        return index >= 0 and days[index] == date
+
+    def latest(self, date=None):
+        """不晚于 date（默认今天）的最近一个交易日"""
+        days, floor = self._ensure()
+        index = self._floor_index(days, floor, date or _today_str())
+        return days[index] if index >= 0 else None
+
+    def prev(self, date=None, n=1):
+        """date（默认今天）之前的第 n 个交易日，不含 date 本身"""
+        days, floor = self._ensure()
+        date = date or _today_str()
+        index = self._floor_index(days, floor, date)
+        if index >= 0 and days[index] == date:
+            index -= 1
+        index -= n - 1
+        return days[index] if 0 <= index < len(days) else None
+
+    def next(self, date=None, n=1, refresh=True):
+        """date（默认今天）之后的第 n 个交易日，不含 date 本身；refresh=False 时只用已加载的数据，不触发加载"""
+        days, floor = self._ensure() if refresh else self._data
+        index = self._floor_index(days, floor, date or _today_str()) + n
+        return days[index] if 0 <= index < len(days) else None
+
+    def last_n(self, n, end=None):
+        """截至 end（默认今天，含当天）的最近 n 个交易日，升序"""
+        days, floor = self._ensure()
+        index = self._floor_index(days, floor, end or _today_str())
+        if index < 0 or n <= 0:
+            return []
+        return days[max(0, index - n + 1): index + 1]
+
+    def window(self, start, end=None):
+        """[start, end] 区间内的交易日，升序；end 默认今天"""
+        days, floor = self._ensure()
+        lo = self._floor_index(days, floor, start)
+        if lo < 0 or days[lo] != start:
+            lo += 1
+        hi = self._floor_index(days, floor, end or _today_str())
+        return days[lo: hi + 1] if lo <= hi else []
+
+    def refresh(self):
+        """强制下次查询时重新加载"""
+        self._expires_at = 0.0
+
+
+# 进程级共享实例
+calendar = TradeCalendar()
@@ -0,0 +1,201 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+# ------------------------------------------------------
+# 分段存储：只追加的按日期分区数据集（新闻快讯、新闻联播等），每次更新只处理新数据，不重写历史文件。
+#   <root>/<YYYYMMDD>/<段名>.parquet   每次追加按日期拆成若干段，每段一个新文件
+#   <root>/index.sqlite3              已写入记录的内容哈希（按去重字段计算），新记录只需查这张表即可去重
+# append(df)          去掉批内重复和已写入的记录，剩下的按日期写成新段，返回新写入的条数
+# read(start, end)    读取日期范围内的所有段并合并
+# compact(before)     把已经结束的日期的多个段合并为一个文件；rebuild_index() 按全部记录重建哈希索引
+# import_legacy(path) 把旧的整文件 CSV 导入为分段（只在分段存储为空时导入一次），导入后原文件改名保留
+# ------------------------------------------------------
+
+BUSY_TIMEOUT_SECONDS = 30
+
+
+def _segment_files(partition_dir):
+    return sorted(
+        os.path.join(partition_dir, name) for name in os.listdir(partition_dir) if name.endswith(".parquet")
+    )
+
+
+class SegmentStore:
+    """
+    root：存储目录；date_column、date_format：用于分区的日期字段及其格式；
+    key_columns：去重字段，内容相同（按字符串比较）的记录只保存一次。
+    """
+
+    def __init__(self, root, date_column, key_columns, date_format=None):
+        self.root = root
+        self.date_column = date_column
+        self.key_columns = list(key_columns)
+        self.date_format = date_format
+        self.index_path = os.path.join(root, "index.sqlite3")
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(self.root, exist_ok=True)
+            conn = sqlite3.connect(self.index_path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS hashes (h INTEGER PRIMARY KEY) WITHOUT ROWID")
+            self._local.conn = conn
+        return conn
+
+    def _hashes(self, df):
+        """按去重字段计算每条记录的 64 位内容哈希（存为有符号整数，便于放进 SQLite）"""
+        keys = df[self.key_columns].astype(str)
+        return pd.util.hash_pandas_object(keys, index=False).to_numpy().view(np.int64)
+
+    def _days(self, df):
+        dates = pd.to_datetime(df[self.date_column].astype(str), format=self.date_format, errors="coerce")
+        return dates.dt.strftime("%Y%m%d")
+
+    def partitions(self):
+        """已有数据的日期（升序）"""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root)
+                      if name.isdigit() and os.path.isdir(os.path.join(self.root, name)))
+
+    def _write_segment(self, day, df):
+        partition_dir = os.path.join(self.root, day)
+        os.makedirs(partition_dir, exist_ok=True)
+        path = os.path.join(partition_dir, f"{time.time_ns()}-{os.getpid()}-{threading.get_ident()}.parquet")
+        tmp_path = f"{path}.tmp"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        return path
+
+    # ---------------- 写入 ----------------
+    def append(self, df):
+        if df is None or df.empty:
+            return 0
+        df = df.reset_index(drop=True)
+        hashes = self._hashes(df)
+        first = ~pd.Series(hashes).duplicated().to_numpy()
+        df, hashes = df[first], hashes[first]
+
+        conn = self._connect()
+        # 写锁覆盖“查重 -> 写段 -> 记哈希”，多个进程同时追加时不会重复写入
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            existing = set()
+            candidates = hashes.tolist()
+            for start in range(0, len(candidates), 500):
+                chunk = candidates[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                existing.update(h for (h,) in conn.execute(
+                    f"SELECT h FROM hashes WHERE h IN ({placeholders})", chunk))
+            fresh = np.array([h not in existing for h in candidates], dtype=bool)
+            new_rows, new_hashes = df[fresh], hashes[fresh]
+            days = self._days(new_rows)
+            dated = days.notna().to_numpy()
+            if not dated.all():
+                logging.error(f"{self.root} 有 {int((~dated).sum())} 条记录的日期无法解析，未保存")
+            for day, part in new_rows[dated].groupby(days[dated].to_numpy(), sort=True):
+                self._write_segment(day, part)
+            conn.executemany("INSERT OR IGNORE INTO hashes (h) VALUES (?)",
+                             [(h,) for h in new_hashes[dated].tolist()])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return int(dated.sum())
+
+    # ---------------- 读取 ----------------
+    def read(self, start=None, end=None, columns=None):
+        """返回 [start, end]（YYYYMMDD，含两端，为空表示不限）内的数据，按日期升序"""
+        frames = []
+        for day in self.partitions():
+            if (start and day < str(start)) or (end and day > str(end)):
+                continue
+            for path in _segment_files(os.path.join(self.root, day)):
+                try:
+                    frames.append(pd.read_parquet(path, columns=columns))
+                except Exception as e:
+                    logging.error(f"读取分段 {path} 失败: {e}")
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        df = pd.concat(frames, ignore_index=True)
+        # 合并过程中被中断时同一条记录可能同时出现在新旧段里
+        if set(self.key_columns) <= set(df.columns):
+            df = df[~pd.Series(self._hashes(df)).duplicated().to_numpy()]
+        return df.reset_index(drop=True)
+
+    # ---------------- 维护 ----------------
+    def compact(self, before=None, min_segments=2):
+        """
+        把 before（YYYYMMDD，不含，为空表示不限）之前、段数不少于 min_segments 的日期合并为一个段，返回合并的日期数。
+        合并保留全部记录，哈希索引不变；持有写锁，与追加、其他进程的合并互斥。
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            compacted = 0
+            for day in self.partitions():
+                if before and day >= str(before):
+                    continue
+                paths = _segment_files(os.path.join(self.root, day))
+                if len(paths) < min_segments:
+                    continue
+                df = pd.concat([pd.read_parquet(path) for path in paths], ignore_index=True)
+                df = df[~pd.Series(self._hashes(df)).duplicated().to_numpy()]
+                # 先写合并后的段再删旧段，中途中断时读取端按内容去重
+                self._write_segment(day, df.sort_values(self.date_column, kind="stable"))
+                for path in paths:
+                    os.remove(path)
+                compacted += 1
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return compacted
+
+    def rebuild_index(self):
+        """按全部已保存的记录重建哈希索引（索引文件丢失或损坏时使用），返回索引中的记录数"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM hashes")
+            for day in self.partitions():
+                for path in _segment_files(os.path.join(self.root, day)):
+                    df = pd.read_parquet(path, columns=self.key_columns)
+                    conn.executemany("INSERT OR IGNORE INTO hashes (h) VALUES (?)",
+                                     [(h,) for h in self._hashes(df).tolist()])
+            count = conn.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return count
+
+    def import_legacy(self, path, prepare=None, **read_csv_kwargs):
+        """
+        分段存储为空且旧 CSV 存在时整体导入一次，导入后原文件改名为 <path>.migrated；返回导入条数。
+        prepare 为导入前对整张表做的规范化（与新数据入库前的处理一致）。
+        """
+        if not os.path.exists(path) or self.partitions():
+            return 0
+        df = pd.read_csv(path, **read_csv_kwargs)
+        if prepare is not None:
+            df = prepare(df)
+        written = self.append(df)
+        os.replace(path, f"{path}.migrated")
+        return written
+
+
+# 进程级共享实例：新闻快讯、新闻联播（快讯_app、联播_app 写入，新闻查询_app 读取）
+news_store = SegmentStore(os.path.join("date", "news"), date_column="datetime",
+                          key_columns=["datetime", "content"], date_format="%Y-%m-%d %H:%M:%S")
+cctv_store = SegmentStore(os.path.join("date", "cctv_news"), date_column="date",
+                          key_columns=["date", "title", "content"], date_format="%Y%m%d")
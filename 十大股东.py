@@ -1,11 +1,6 @@
 import streamlit as st
-import tushare as ts
 import pandas as pd
-import os
-import ast
 import logging
-import time
-from datetime import datetime, timedelta
 
 # 配置日志
 logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -13,10 +8,22 @@ logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(levelname)s - %
 # 设置 Pandas 显示选项
 pd.set_option('display.max_colwidth', None)
 
-# 从 secrets.toml 中读取 Tushare API Token
-tushare_token = st.secrets["api_keys"]["tushare_token"]
-ts.set_token(tushare_token)
-pro = ts.pro_api()
+# 所有 Tushare 调用统一经过接口网关（进程内共享限流）
+from 接口网关 import pro
+from 并发执行 import fan_out
+from 限流器 import BULK, priority
+from 股票池 import pools
+
+def has_hkscc_holder(ts_code):
+    """判断该股票的前十大股东中是否包含“香港中央结算有限公司”"""
+    # 调用 top10_holders 接口，只请求 holder_name 字段
+    df = pro.top10_holders(ts_code=ts_code, limit=10, fields=["holder_name"])
+    if df.empty:
+        return False
+    # 对 holder_name 进行清洗：去除空格并统一小写
+    holder_names = df['holder_name'].apply(lambda x: str(x).strip().lower())
+    return any("香港中央结算有限公司" in name for name in holder_names.values)
+
 
 def main():
     st.write("筛选包含“香港中央结算有限公司”的股票，并保存到文件。")
@@ -28,46 +35,22 @@ def main():
     total_stocks = len(stock_list)
     st.write(f"共获取股票数量: {total_stocks}")
 
-    qualified_stocks = []  # 用于存放符合条件的股票代码
-    call_count = 0
-    start_time = time.time()
-
     progress_bar = st.progress(0)
 
-    # 遍历所有股票
-    for i, (_, row) in enumerate(stock_list.iterrows()):
-        ts_code = row['ts_code']
-        try:
-            # 调用 top10_holders 接口，只请求 holder_name 字段
-            df = pro.top10_holders(ts_code=ts_code, limit=10, fields=["holder_name"])
-            if not df.empty:
-                # 对 holder_name 进行清洗：去除空格并统一小写
-                df['holder_name_clean'] = df['holder_name'].apply(lambda x: str(x).strip().lower())
-                # 判断是否包含 "香港中央结算有限公司"
-                if any("香港中央结算有限公司" in name for name in df['holder_name_clean'].values):
-                    if ts_code not in qualified_stocks:
-                        qualified_stocks.append(ts_code)
-        except Exception as e:
-            st.error(f"处理股票 {ts_code} 时发生错误: {e}")
-
-        # 控制 API 调用频率，每390次调用后，如果60秒内调用未满，则等待剩余时间
-        call_count += 1
-        if call_count >= 390:
-            elapsed = time.time() - start_time
-            if elapsed < 60:
-                time.sleep(60 - elapsed)
-            call_count = 0
-            start_time = time.time()
-
-        progress_bar.progress((i + 1) / total_stocks)
-
-    # 将符合条件的股票代码写入文件（覆盖已存在的文件）
-    save_dir = "date"
-    if not os.path.exists(save_dir):
-        os.makedirs(save_dir)
-    with open(file_path, 'w', encoding='utf-8') as f:
-        for stock in qualified_stocks:
-            f.write(stock + "\n")
+    # 并发遍历所有股票，调用频率由接口网关按 top10_holders 的额度控制；
+    # 以批量优先级运行，页面上的即时查询可以插队
+    ts_codes = stock_list['ts_code'].drop_duplicates().tolist()
+    with priority(BULK):
+        outcome = fan_out(has_hkscc_holder, ts_codes, default=False,
+                          on_progress=lambda done, total: progress_bar.progress(done / total))
+    for index, e in outcome.errors.items():
+        st.error(f"处理股票 {ts_codes[index]} 时发生错误: {e}")
+
+    # 用于存放符合条件的股票代码
+    qualified_stocks = [ts_code for ts_code, qualified in zip(ts_codes, outcome.results) if qualified]
+
+    # 将符合条件的股票代码写入文件（覆盖已存在的文件），并保存当天的股票池快照
+    pools.save("股东", qualified_stocks)
 
     st.write(f"筛选获得的股票总数量: {len(qualified_stocks)}")
     st.success(f"结果已保存到：{file_path}")
@@ -0,0 +1,97 @@
+import argparse
+import logging
+
+import pandas as pd
+
+from 交易日历 import calendar
+from 并发执行 import fan_out
+from 本地仓库 import DATASETS, warehouse
+from 行情面板 import panels
+from 证券索引 import securities
+from 限流器 import BULK, priority
+
+# ------------------------------------------------------
+# 夜间增量同步：把各页面依赖的按交易日全市场快照补齐到本地数据仓库（见 本地仓库.py）。
+# 每个数据集从同步水位（最后一个已完整同步的交易日）的下一个交易日同步到最新交易日，
+# 首次同步取最近 DEFAULT_LOOKBACK_DAYS 个交易日。
+# 已存在的分区不再拉取，中途中断后重新运行即从断点继续；各数据集并行同步，调用额度由接口网关统一控制。
+# 同步前按 stock_basic 补齐证券编号（见 证券索引.py），日线同步完成后把新分区追加进内存映射行情面板（见 行情面板.py）。
+# 用法（建议每个交易日收盘后定时运行）：
+#   python 夜间同步.py
+#   python 夜间同步.py --since 20250101 --datasets daily,hm_detail
+# ------------------------------------------------------
+
+logging.basicConfig(filename='error.log', level=logging.ERROR,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_LOOKBACK_DAYS = 120
+
+
+def sync_dataset(name, since=None):
+    """同步单个数据集，返回 (本次新写入的分区数, 同步后的水位)"""
+    store = warehouse.get(name)
+    latest = calendar.latest()
+    if latest is None:
+        raise RuntimeError("获取交易日历失败")
+    mark = warehouse.watermarks().get(name, {}).get("watermark")
+    if since:
+        start = since
+    elif mark:
+        start = calendar.next(mark)
+    else:
+        start = calendar.last_n(DEFAULT_LOOKBACK_DAYS, end=latest)[0]
+    if start is None or start > latest:
+        return 0, mark
+
+    written = store.sync(start, latest)
+
+    # 水位推进到从起点开始连续存在分区的最后一个交易日；当天尚未发布的数据下次再补
+    new_mark = mark
+    for day in calendar.window(start, latest):
+        if not store.has(day):
+            break
+        if new_mark is None or day > new_mark:
+            new_mark = day
+    if new_mark != mark:
+        warehouse.set_watermark(name, new_mark)
+    return len(written), new_mark
+
+
+def run(datasets=None, since=None):
+    """同步指定的数据集（默认全部），返回每个数据集的同步结果"""
+    names = list(datasets or DATASETS)
+    with priority(BULK):
+        try:
+            securities.refresh()
+        except Exception as e:
+            logging.error(f"刷新证券索引失败: {e}")
+        outcome = fan_out(lambda name: sync_dataset(name, since), names, max_in_flight=len(names))
+    if "daily" in names:
+        try:
+            panels.sync()
+        except Exception as e:
+            logging.error(f"追加行情面板失败: {e}")
+    rows = []
+    for index, name in enumerate(names):
+        if index in outcome.errors:
+            rows.append({"数据集": name, "新写入分区": 0, "水位": None, "结果": f"失败: {outcome.errors[index]}"})
+        else:
+            written, mark = outcome.results[index]
+            rows.append({"数据集": name, "新写入分区": written, "水位": mark, "结果": "完成"})
+    return pd.DataFrame(rows, columns=["数据集", "新写入分区", "水位", "结果"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="把按交易日的全市场快照增量同步到本地数据仓库")
+    parser.add_argument("--since", help="从该日期（YYYYMMDD）起重新检查并补齐，默认从各数据集的水位继续")
+    parser.add_argument("--datasets", help="逗号分隔的数据集名称，默认全部：" + ",".join(DATASETS))
+    args = parser.parse_args()
+    datasets = [name.strip() for name in args.datasets.split(",")] if args.datasets else None
+    unknown = [name for name in datasets or [] if name not in DATASETS]
+    if unknown:
+        parser.error(f"未知的数据集: {','.join(unknown)}")
+    print(run(datasets, args.since).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+import atexit
+import json
+import logging
+import os
+import sys
+import threading
+
+import pandas as pd
+
+# ------------------------------------------------------
+# 字段审计与自动裁剪：很多调用不传 fields，接口返回全部字段，页面却只读其中几列。
+# 通过环境变量 TUSHARE_FIELD_AUDIT 控制：
+#   apply   默认。未传 fields 的调用按已学到的字段表（FIELD_PROJECTION_PATH）自动补上 fields
+#   record  审计模式。未传 fields 的调用返回可记录列访问的 DataFrame，记下每个调用点实际读取的列，
+#           进程退出时与已有字段表合并（多次运行取并集）后写回
+#   off     不审计也不裁剪
+# 调用点按 "文件名:函数名:接口名" 标识，与行号无关，代码小改动后仍然有效。
+# 审计只能记录 df['列']、df[['列', ...]]、df.列、loc、sort_values/groupby/drop_duplicates 等按列名的访问，
+# pd.concat 合并同一调用点的多页结果、rename 改名后继续记录（改名后的列记回原列名）；
+# 调用点整表使用（to_dict、values、iterrows、按位置取列、取整行等）时记为 "*"，该调用点不做裁剪。
+# 调用过但没有记到任何列的调用点（记录在途中丢失或只判断 empty）同样记为 "*"，宁可不裁剪也不裁错。
+# ------------------------------------------------------
+
+FIELD_PROJECTION_PATH = os.path.join("date", "field_projection.json")
+
+ALL_COLUMNS = "*"
+
+# 调用点回溯时跳过的模块（网关自身与 functools.partial）
+_INTERNAL_FILES = ("接口网关.py", "字段审计.py", "functools.py")
+
+# rename 内部也会整体替换列名，此时由 rename 自己记下新旧列名的对应
+_renaming = threading.local()
+
+
+def audit_mode():
+    mode = os.environ.get("TUSHARE_FIELD_AUDIT", "apply").strip().lower()
+    if mode not in ("apply", "record", "off"):
+        logging.error(f"未知的 TUSHARE_FIELD_AUDIT={mode}，按 apply 处理")
+        return "apply"
+    return mode
+
+
+def call_site(api_name):
+    """返回发起调用的业务代码位置，形如 评分系统.py:fetch_hm_detail_5days:hm_detail"""
+    frame = sys._getframe(1)
+    while frame is not None and os.path.basename(frame.f_code.co_filename) in _INTERNAL_FILES:
+        frame = frame.f_back
+    if frame is None:
+        return None
+    return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}:{api_name}"
+
+
+def _column_names(key):
+    """把 __getitem__ 等的参数转换为列名列表；布尔索引、切片等不是按列名访问，返回空列表"""
+    if isinstance(key, str):
+        return [key]
+    if isinstance(key, (list, tuple, pd.Index)) and all(isinstance(k, str) for k in key):
+        return list(key)
+    return []
+
+
+class _Recorder:
+    """一次调用返回结果的列访问记录，回写到所属的 FieldAudit；aliases 为改名后的列名 -> 原列名"""
+
+    def __init__(self, audit, site, columns, aliases=None):
+        self.audit = audit
+        self.site = site
+        self.columns = set(columns)
+        self.aliases = dict(aliases or {})
+
+    def knows(self, name):
+        return name in self.aliases or name in self.columns
+
+    def read(self, names):
+        names = [self.aliases.get(name, name) for name in names]
+        names = [name for name in names if name in self.columns]
+        if names:
+            self.audit.record(self.site, names)
+
+    def read_all(self):
+        self.audit.record(self.site, [ALL_COLUMNS])
+
+    def renamed(self, aliases):
+        merged = {new: self.aliases.get(old, old) for new, old in aliases.items()}
+        return _Recorder(self.audit, self.site, self.columns, {**self.aliases, **merged})
+
+
+class _AuditedIndexer:
+    """loc / iloc 的包装：按列名取列时记录该列，按位置取列或取整行（返回 Series）时记为整表使用"""
+
+    def __init__(self, frame, indexer, by_label):
+        self._frame = frame
+        self._indexer = indexer
+        self._by_label = by_label
+
+    def __getitem__(self, key):
+        result = self._indexer[key]
+        if isinstance(key, tuple) and len(key) > 1:
+            names = _column_names(key[1]) if self._by_label else []
+            if names:
+                self._frame._note(names)
+            else:
+                self._frame._note_all()
+        elif not isinstance(result, pd.DataFrame):
+            self._frame._note_all()
+        return result
+
+    def __setitem__(self, key, value):
+        self._indexer[key] = value
+
+    def __getattr__(self, name):
+        return getattr(self._indexer, name)
+
+
+class AuditedFrame(pd.DataFrame):
+    """记录按列名读取的 DataFrame；由它派生的 DataFrame（排序、筛选、复制后）继续记录"""
+
+    _metadata = ["_recorder"]
+
+    @property
+    def _constructor(self):
+        return AuditedFrame
+
+    def _note(self, names):
+        recorder = self.__dict__.get("_recorder")
+        if recorder is not None:
+            recorder.read(names)
+
+    def _note_all(self):
+        recorder = self.__dict__.get("_recorder")
+        if recorder is not None:
+            recorder.read_all()
+
+    def __getitem__(self, key):
+        self._note(_column_names(key))
+        return super().__getitem__(key)
+
+    def __getattr__(self, name):
+        if not name.startswith("_") and self.__dict__.get("_recorder", _EMPTY).knows(name):
+            self._note([name])
+        return super().__getattr__(name)
+
+    def __setattr__(self, name, value):
+        if name == "columns" and not getattr(_renaming, "active", False):
+            # 整体替换列名后无法对应回原列名
+            self._note_all()
+        super().__setattr__(name, value)
+
+    def __finalize__(self, other, method=None, **kwargs):
+        result = super().__finalize__(other, method=method, **kwargs)
+        objs = getattr(other, "input_objs", None)
+        if method == "concat" and objs is not None:
+            recorders = [obj.__dict__.get("_recorder") for obj in objs if isinstance(obj, pd.DataFrame)]
+            recorders = [recorder for recorder in recorders if recorder is not None]
+            if recorders and len({recorder.site for recorder in recorders}) == 1:
+                # 同一调用点的多页结果：合并后继续记录
+                columns = set().union(*(recorder.columns for recorder in recorders))
+                aliases = {}
+                for recorder in recorders:
+                    aliases.update(recorder.aliases)
+                object.__setattr__(result, "_recorder",
+                                   _Recorder(recorders[0].audit, recorders[0].site, columns, aliases))
+            else:
+                for recorder in recorders:
+                    recorder.read_all()
+        return result
+
+    @property
+    def loc(self):
+        return _AuditedIndexer(self, super().loc, by_label=True)
+
+    @property
+    def iloc(self):
+        return _AuditedIndexer(self, super().iloc, by_label=False)
+
+    def rename(self, *args, **kwargs):
+        before = list(self.columns)
+        _renaming.active = True
+        try:
+            result = super().rename(*args, **kwargs)
+        finally:
+            _renaming.active = False
+        target = self if result is None else result
+        recorder = self.__dict__.get("_recorder")
+        if recorder is not None and isinstance(target, AuditedFrame) and len(target.columns) == len(before):
+            aliases = {new: old for old, new in zip(before, target.columns) if new != old}
+            if aliases:
+                object.__setattr__(target, "_recorder", recorder.renamed(aliases))
+        return result
+
+    def sort_values(self, by, *args, **kwargs):
+        self._note(_column_names(by))
+        return super().sort_values(by, *args, **kwargs)
+
+    def groupby(self, by=None, *args, **kwargs):
+        self._note(_column_names(by))
+        return super().groupby(by, *args, **kwargs)
+
+    def drop_duplicates(self, subset=None, *args, **kwargs):
+        if subset is None:
+            self._note_all()
+        else:
+            self._note(_column_names(subset))
+        return super().drop_duplicates(subset, *args, **kwargs)
+
+    def set_index(self, keys, *args, **kwargs):
+        self._note(_column_names(keys))
+        return super().set_index(keys, *args, **kwargs)
+
+    def merge(self, right, *args, **kwargs):
+        self._note_all()
+        return super().merge(right, *args, **kwargs)
+
+    def to_dict(self, *args, **kwargs):
+        self._note_all()
+        return super().to_dict(*args, **kwargs)
+
+    def iterrows(self):
+        self._note_all()
+        return super().iterrows()
+
+    def itertuples(self, *args, **kwargs):
+        self._note_all()
+        return super().itertuples(*args, **kwargs)
+
+    @property
+    def values(self):
+        self._note_all()
+        return super().values
+
+
+class _NoColumns:
+    columns = frozenset()
+
+    @staticmethod
+    def knows(name):
+        return False
+
+
+_EMPTY = _NoColumns()
+
+
+class FieldAudit:
+    """
+    字段表：调用点 -> 该调用点读取过的列名集合。
+    project(site) 返回应补上的 fields 字符串（无记录、没有读到任何列或整表使用时返回 None）；
+    wrap(site, df) 返回记录列访问的 DataFrame（审计模式使用）。
+    """
+
+    def __init__(self, path=FIELD_PROJECTION_PATH):
+        self.path = path
+        self._reads = {}
+        self._lock = threading.Lock()
+        self._loaded = None
+        self._dirty = False
+
+    def _projections(self):
+        if self._loaded is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._loaded = {site: set(columns) for site, columns in json.load(f).items()}
+            except FileNotFoundError:
+                self._loaded = {}
+            except Exception as e:
+                logging.error(f"读取字段表 {self.path} 失败: {e}")
+                self._loaded = {}
+        return self._loaded
+
+    def project(self, site):
+        with self._lock:
+            columns = self._projections().get(site)
+        if not columns or ALL_COLUMNS in columns:
+            return None
+        return ",".join(sorted(columns))
+
+    def wrap(self, site, df):
+        audited = AuditedFrame(df)
+        audited._recorder = _Recorder(self, site, df.columns)
+        with self._lock:
+            self._reads.setdefault(site, set())
+            self._dirty = True
+        return audited
+
+    def record(self, site, names):
+        with self._lock:
+            self._reads.setdefault(site, set()).update(names)
+            self._dirty = True
+
+    def report(self):
+        """本进程审计到的调用点与读取的列"""
+        with self._lock:
+            rows = [
+                {"调用点": site, "读取的列": ",".join(sorted(columns)) or "(未读取任何列)"}
+                for site, columns in sorted(self._reads.items())
+            ]
+        return pd.DataFrame(rows, columns=["调用点", "读取的列"])
+
+    def save(self):
+        """把本进程的审计结果与已有字段表合并后写回"""
+        with self._lock:
+            if not self._dirty:
+                return
+            merged = {site: set(columns) for site, columns in self._projections().items()}
+            for site, columns in self._reads.items():
+                # 一列都没记到时不能确定该调用点用了哪些列，按整表使用处理，不做裁剪
+                merged.setdefault(site, set()).update(columns or {ALL_COLUMNS})
+            self._loaded = merged
+            self._dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump({site: sorted(columns) for site, columns in sorted(merged.items())},
+                          f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            logging.error(f"写入字段表 {self.path} 失败: {e}")
+
+
+# 进程级共享实例；审计模式下进程退出时写回字段表
+field_audit = FieldAudit()
+atexit.register(field_audit.save)
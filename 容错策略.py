@@ -0,0 +1,205 @@
+import logging
+import random
+import threading
+import time
+
+# ------------------------------------------------------
+# 接口调用的容错策略，由接口网关统一使用：
+#   RetryPolicy     指数退避 + 随机抖动的重试，所有重试共用一个全局重试预算，
+#                   Tushare 整体异常时不会因为大量重试把额度和时间耗尽
+#   NegativeCache   记住返回空结果的请求（新股无财报、停牌股无行情等），有效期内不再重复请求
+#   CircuitBreaker  每个接口一个熔断器，连续失败达到阈值后在冷却期内直接失败，
+#                   冷却期过后放行一次试探请求，成功则恢复；只有连接错误、超时和服务端 5xx 计入失败，
+#                   参数错误、权限不足、额度用完等调用方自身的问题不会让接口对所有会话熔断
+# ------------------------------------------------------
+
+MAX_ATTEMPTS = 4             # 单个请求最多尝试次数（含首次）
+BASE_DELAY_SECONDS = 1.0     # 第一次重试前的退避基数
+MAX_DELAY_SECONDS = 30.0     # 单次退避的上限
+RETRY_BUDGET_RATIO = 0.1     # 每个成功请求为重试预算积累 0.1 次
+RETRY_BUDGET_RESERVE = 20    # 重试预算的初始值与上限
+
+BREAKER_FAILURE_THRESHOLD = 5   # 连续失败多少次后熔断
+BREAKER_RESET_SECONDS = 30      # 熔断后的冷却时间
+
+# 这些错误重试也不会成功，直接抛出
+NON_RETRYABLE_MESSAGES = ("权限", "积分", "token", "参数")
+
+
+class CircuitOpenError(Exception):
+    """接口处于熔断状态，请求未发出"""
+
+
+class QuotaExceededError(Exception):
+    """账号当天的接口额度已用完，请求未发出"""
+
+
+class ServerError(Exception):
+    """接口服务端返回 5xx"""
+
+
+def is_service_failure(error):
+    """连接错误、超时（均为 OSError）和服务端 5xx 说明接口本身不可用，计入熔断"""
+    return isinstance(error, (ServerError, OSError))
+
+
+class RetryBudget:
+    """
+    全局重试预算：每个成功请求存入 ratio 次重试额度，每次重试消耗 1 次，
+    额度上限为 reserve。额度用完后失败的请求不再重试。
+    """
+
+    def __init__(self, ratio=RETRY_BUDGET_RATIO, reserve=RETRY_BUDGET_RESERVE):
+        self.ratio = ratio
+        self.reserve = reserve
+        self._tokens = float(reserve)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.reserve, self._tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class RetryPolicy:
+    """
+    call(func, label)：执行 func()，遇到可重试的异常时按
+    min(max_delay, base_delay * 2^n) 为上限的随机时长（full jitter）退避后重试。
+    """
+
+    def __init__(self, max_attempts=MAX_ATTEMPTS, base_delay=BASE_DELAY_SECONDS,
+                 max_delay=MAX_DELAY_SECONDS, budget=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget if budget is not None else RetryBudget()
+
+    @staticmethod
+    def is_retryable(error):
+        if isinstance(error, (CircuitOpenError, QuotaExceededError, LookupError, TypeError, ValueError)):
+            return False
+        message = str(error)
+        return not any(word in message for word in NON_RETRYABLE_MESSAGES)
+
+    def backoff(self, attempt):
+        """第 attempt 次重试（从 1 开始）前的等待秒数"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+    def call(self, func, label=""):
+        attempt = 0
+        while True:
+            try:
+                result = func()
+            except Exception as e:
+                attempt += 1
+                if attempt >= self.max_attempts or not self.is_retryable(e):
+                    raise
+                if not self.budget.withdraw():
+                    logging.error(f"{label} 调用失败且重试预算已用完，不再重试: {e}")
+                    raise
+                delay = self.backoff(attempt)
+                logging.error(f"{label} 第 {attempt} 次调用失败，{delay:.1f} 秒后重试: {e}")
+                time.sleep(delay)
+                continue
+            self.budget.deposit()
+            return result
+
+
+class NegativeCache:
+    """
+    空结果缓存：key -> (失效时刻, 空 DataFrame)。只保存在内存中，进程内共享。
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, df = entry
+            if time.time() >= expires_at:
+                del self._entries[key]
+                return None
+        return df.copy()
+
+    def put(self, key, df, expires_at):
+        with self._lock:
+            self._entries[key] = (expires_at, df)
+
+
+class CircuitBreaker:
+    """
+    单个接口的熔断器：closed（正常）-> open（熔断，直接失败）-> half_open（放行一次试探）。
+    """
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """请求发出前调用；熔断中抛出 CircuitOpenError"""
+        with self._lock:
+            if self.state == "closed":
+                return
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return
+            remaining = max(0.0, self.reset_seconds - (time.monotonic() - self._opened_at))
+            raise CircuitOpenError(f"接口 {self.name} 连续失败已熔断，约 {remaining:.0f} 秒后重试")
+
+    def cancel(self):
+        """allow() 放行后请求没有发出（如额度用完）或因调用方自身的问题失败，试探机会留给下一个请求"""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    logging.error(f"接口 {self.name} 连续失败 {self._failures} 次，熔断 {self.reset_seconds} 秒")
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+class BreakerRegistry:
+    """按接口名惰性创建熔断器"""
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, api_name):
+        with self._lock:
+            breaker = self._breakers.get(api_name)
+            if breaker is None:
+                breaker = CircuitBreaker(api_name, self.failure_threshold, self.reset_seconds)
+                self._breakers[api_name] = breaker
+            return breaker
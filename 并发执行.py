@@ -0,0 +1,140 @@
+import contextvars
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import pandas as pd
+
+# ------------------------------------------------------
+# 逐只股票调用接口的循环改为有限并发执行。
+# 在途请求数由 max_in_flight 限制，实际调用频率仍由接口网关的令牌桶按接口额度控制，
+# 因此并发只是把等待网络的时间重叠起来，不会超出额度。
+# fetch_pages 用同样的方式并发拉取 limit/offset 分页接口的各页。
+# ------------------------------------------------------
+
+DEFAULT_MAX_IN_FLIGHT = 8
+
+try:
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+except ImportError:  # 非 Streamlit 环境（命令行脚本）
+    add_script_run_ctx = get_script_run_ctx = None
+
+
+class FanOutResult:
+    """
+    results 与输入顺序一一对应；失败的条目为 default，异常记录在 errors（下标 -> 异常）。
+    """
+
+    def __init__(self, results, errors):
+        self.results = results
+        self.errors = errors
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def __len__(self):
+        return len(self.results)
+
+
+def _bind_script_ctx():
+    """让工作线程继承当前 Streamlit 会话上下文，线程内可以正常调用 st.xxx"""
+    if get_script_run_ctx is None:
+        return None
+    try:
+        ctx = get_script_run_ctx(suppress_warning=True)
+    except TypeError:  # 旧版本 Streamlit 没有 suppress_warning 参数
+        ctx = get_script_run_ctx()
+    if ctx is None:
+        return None
+
+    def initializer():
+        add_script_run_ctx(threading.current_thread(), ctx)
+
+    return initializer
+
+
+def fan_out(func, items, max_in_flight=DEFAULT_MAX_IN_FLIGHT, on_progress=None, default=None):
+    """
+    对 items 中每个元素并发执行 func(item)，同时在途的调用不超过 max_in_flight 个。
+    on_progress(done, total) 在调用线程中回调，可直接驱动 st.progress。
+    单个条目出错不会中断整体执行，结果位置填 default，异常收集在返回值的 errors 中。
+    """
+    items = list(items)
+    total = len(items)
+    results = [default] * total
+    errors = {}
+    if total == 0:
+        return FanOutResult(results, errors)
+
+    max_in_flight = max(1, min(max_in_flight, total))
+    done_count = 0
+    next_index = 0
+    pending = {}
+
+    with ThreadPoolExecutor(max_workers=max_in_flight, initializer=_bind_script_ctx()) as executor:
+        def submit(index):
+            # 复制当前上下文，使调用方设置的上下文变量在工作线程中同样生效
+            ctx = contextvars.copy_context()
+            pending[executor.submit(ctx.run, func, items[index])] = index
+
+        while next_index < total and len(pending) < max_in_flight:
+            submit(next_index)
+            next_index += 1
+
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                index = pending.pop(future)
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    errors[index] = e
+                    logging.error(f"并发任务 {items[index]} 执行出错: {e}")
+                done_count += 1
+                if next_index < total:
+                    submit(next_index)
+                    next_index += 1
+            if on_progress is not None:
+                on_progress(done_count, total)
+
+    return FanOutResult(results, errors)
+
+
+def fetch_pages(fetch_page, limit, max_in_flight=DEFAULT_MAX_IN_FLIGHT, is_last=None,
+                dedup_subset=None, on_page=None):
+    """
+    并发拉取 limit/offset 分页接口的全部页，返回按 offset 顺序合并、去重后的 DataFrame。
+    fetch_page(offset) 拉取一页；返回行数少于 limit 的页视为最后一页，
+    is_last(page) 返回 True 时该页也视为最后一页（如已覆盖所需的日期范围）。
+    第一页单独拉取；之后每轮并发拉取的页数按 1、2、4…… 增长到 max_in_flight，
+    到达最后一页时多拉的页数不超过已拉取的页数。最后一页之后的页直接丢弃。
+    新数据在分页期间写入时，页边界上的行会错位重复，按 dedup_subset 去重（None 表示按整行）。
+    on_page(pages, rows) 每轮结束后回调；任意一页失败时抛出异常。
+    """
+    pages = []
+    finished = False
+    offset = 0
+    wave = 1
+    while not finished:
+        offsets = [offset + i * limit for i in range(wave)]
+        outcome = fan_out(fetch_page, offsets, max_in_flight=max_in_flight)
+        if outcome.errors:
+            index = min(outcome.errors)
+            raise outcome.errors[index]
+        for page in outcome.results:
+            if page is None:
+                page = pd.DataFrame()
+            pages.append(page)
+            if len(page) < limit or (is_last is not None and is_last(page)):
+                finished = True
+                break
+        offset = offsets[-1] + limit
+        wave = min(wave * 2, max(1, max_in_flight))
+        if on_page is not None:
+            on_page(len(pages), sum(len(page) for page in pages))
+
+    frames = [page for page in pages if not page.empty]
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True)
+    return df.drop_duplicates(subset=dedup_subset).reset_index(drop=True)
@@ -1,7 +1,5 @@
-import tushare as ts
 import pandas as pd
 import os
-import time
 import logging
 from datetime import datetime
 import streamlit as st
@@ -17,49 +15,34 @@ logging.basicConfig(
 DATE_FOLDER = "date"
 
 # 文件路径定义
-NEWS_FILE = os.path.join(DATE_FOLDER, 'news_data.csv')
+NEWS_FILE = os.path.join(DATE_FOLDER, 'news_data.csv')  # 旧版整文件存储，首次更新时导入分段存储
 CACHE_FILE = os.path.join(DATE_FOLDER, 'news_cache.txt')  # 用于存储最新的 datetime
 
-# 从 secrets.toml 文件中读取 Tushare API Token
-tushare_token = st.secrets["api_keys"]["tushare_token"]
+# 所有 Tushare 调用统一经过接口网关（进程内共享限流）
+from 接口网关 import pro
+from 并发执行 import fetch_pages
+from 分段存储 import news_store  # 快讯按发布日期分段保存，新闻查询页按日期范围读取
 
-# 设置 Tushare API Token
-ts.set_token(tushare_token)
-pro = ts.pro_api()
 
-
-def save_data_update(df_new, save_file):
+def save_data_update(df_new, store=None):
     """
-    更新保存数据到指定文件。若文件存在，则合并并去重后保存；若不存在，则直接保存新数据。
+    把新拉取的快讯追加到分段存储：按 (datetime, content) 的内容哈希去重，只写入新记录，不重写历史数据。
     """
+    store = store or news_store
     try:
-        # 确保文件夹存在
-        os.makedirs(DATE_FOLDER, exist_ok=True)
-
-        if os.path.exists(save_file):
-            # 读取现有数据
-            df_existing = pd.read_csv(save_file, encoding='utf-8-sig')
-            st.info(f"读取到现有数据，共 {len(df_existing)} 条记录。")
-
-            # 合并新数据与现有数据
-            df_combined = pd.concat([df_existing, df_new], ignore_index=True)
-            st.info(f"合并后数据共 {len(df_combined)} 条记录。")
-
-            # 去重，基于 'datetime' 和 'content' 两个字段
-            before_dedup = len(df_combined)
-            df_combined.drop_duplicates(subset=["datetime", "content"], inplace=True)
-            after_dedup = len(df_combined)
-            duplicates_removed = before_dedup - after_dedup
-            if duplicates_removed > 0:
-                st.info(f"去除了 {duplicates_removed} 条重复记录。")
-
-            # 保存合并去重后的数据
-            df_combined.to_csv(save_file, index=False, encoding='utf-8-sig')
-            st.success(f"已更新保存数据到 {save_file}。")
-        else:
-            # 文件不存在，直接保存新数据
-            df_new.to_csv(save_file, index=False, encoding='utf-8-sig')
-            st.success(f"已保存新数据到 {save_file}。")
+        # 旧版整文件 CSV 只在第一次使用分段存储时导入
+        imported = store.import_legacy(NEWS_FILE, encoding='utf-8-sig')
+        if imported:
+            st.info(f"已把 {NEWS_FILE} 中的 {imported} 条历史记录导入分段存储。")
+
+        written = store.append(df_new)
+        duplicates_removed = len(df_new) - written
+        if duplicates_removed > 0:
+            st.info(f"去除了 {duplicates_removed} 条重复记录。")
+        st.success(f"已追加保存 {written} 条新数据到 {store.root}。")
+
+        # 今天之前的日期不会再有新快讯，把多次追加产生的段合并为一个文件
+        store.compact(before=datetime.now().strftime('%Y%m%d'))
     except Exception as e:
         st.error(f"保存数据失败: {e}")
         logging.error("保存数据失败", exc_info=True)
@@ -98,91 +81,56 @@ def update_cache(cache_file, latest_datetime):
         logging.error("更新缓存文件失败", exc_info=True)
 
 
-def fetch_news_data(pro, last_datetime=None, limit=1000, calls_per_minute=10):
-
-    all_data = []
-    offset = 0
-    api_call_timestamps = []  # 用于记录每次调用的时间戳
-
-    st.info("开始拉取新闻快讯数据...")
-
-    while True:
-        current_time = time.time()
-        # 清理超过60秒的时间戳
-        api_call_timestamps = [t for t in api_call_timestamps if current_time - t < 60]
-        if len(api_call_timestamps) >= calls_per_minute:
-            sleep_time = 60 - (current_time - api_call_timestamps[0])
-            st.info(f"达到每分钟调用上限, 等待 {sleep_time:.2f} 秒")
-            time.sleep(sleep_time)
-            continue
-
-        params = {
-            "limit": limit,
-            "offset": offset,
-            "fields": ["datetime", "content", "channels"]
-        }
-
-        if last_datetime:
-            start_time_str = last_datetime.strftime('%Y%m%d%H%M%S')
-            params["start_time"] = start_time_str  # 假设 API 支持该参数
+def fetch_news_data(pro, last_datetime=None, limit=1000):
+    """
+    分页拉取新闻快讯数据：各页由 fetch_pages 并发拉取，调用频率由接口网关按 news 接口的额度统一控制。
+    news 按时间倒序返回，有缓存时间时拉到包含缓存时间之前数据的那一页即停止。
+    """
+    fields = ["datetime", "content", "channels"]
+    extra = {}
+    if last_datetime:
+        extra["start_time"] = last_datetime.strftime('%Y%m%d%H%M%S')  # 假设 API 支持该参数
 
-        try:
-            df_news = pro.news(**params)
-            api_call_timestamps.append(time.time())  # 记录此次调用的时间
-
-            if df_news.empty:
-                st.info(f"news数据为空，无新数据。（调用次数：{len(api_call_timestamps)}）")
-                break
-
-            if last_datetime:
-                df_news['datetime'] = pd.to_datetime(df_news['datetime'], format='%Y-%m-%d %H:%M:%S')
-                df_news = df_news[df_news['datetime'] > last_datetime]
-                if df_news.empty:
-                    st.info(f"没有比缓存时间更新的数据。（调用次数：{len(api_call_timestamps)}）")
-                    break
-
-            all_data.append(df_news)
-            st.info(f"已拉取到 {len(df_news)} 条news数据（调用次数：{len(api_call_timestamps)}，offset={offset}）。")
-            offset += limit
-        except Exception as e:
-            st.error(f"news 数据拉取失败（调用次数：{len(api_call_timestamps) + 1}，offset={offset}）：{e}")
-            logging.error("news 数据拉取失败", exc_info=True)
-            break
+    def fetch_page(offset):
+        return pro.news(limit=limit, offset=offset, fields=fields, **extra)
 
-    if all_data:
-        try:
-            final_df = pd.concat(all_data, ignore_index=True)
-            st.info(f"共拉取到 {len(final_df)} 条新闻快讯数据。")
+    def reaches_cache(page):
+        if page.empty:
+            return True
+        return pd.to_datetime(page['datetime'], format='%Y-%m-%d %H:%M:%S').min() <= last_datetime
 
-            # 对数据进行去重操作
-            before_dedup = len(final_df)
-            final_df.drop_duplicates(subset=["datetime", "content"], inplace=True)
-            after_dedup = len(final_df)
-            duplicates_removed = before_dedup - after_dedup
-            if duplicates_removed > 0:
-                st.info(f"去除了 {duplicates_removed} 条重复记录。")
+    st.info("开始拉取新闻快讯数据...")
+    try:
+        final_df = fetch_pages(
+            fetch_page, limit,
+            is_last=reaches_cache if last_datetime else None,
+            dedup_subset=["datetime", "content"],
+            on_page=lambda pages, rows: st.info(f"已拉取 {pages} 页，共 {rows} 条news数据。"),
+        )
+    except Exception as e:
+        st.error(f"news 数据拉取失败：{e}")
+        logging.error("news 数据拉取失败", exc_info=True)
+        return pd.DataFrame()
 
-            return final_df
-        except Exception as e:
-            st.error(f"合并news数据失败：{e}")
-            logging.error("合并news数据失败", exc_info=True)
-            return pd.DataFrame()
-    else:
+    if final_df.empty:
         st.info("未拉取到任何news数据。")
-        return pd.DataFrame()
+        return final_df
+
+    if last_datetime:
+        # datetime 保持接口返回的字符串，分段存储按字符串去重
+        published = pd.to_datetime(final_df['datetime'], format='%Y-%m-%d %H:%M:%S')
+        final_df = final_df[published > last_datetime].reset_index(drop=True)
+        if final_df.empty:
+            st.info("没有比缓存时间更新的数据。")
+            return final_df
+
+    st.info(f"共拉取到 {len(final_df)} 条新闻快讯数据（已去除页边界上的重复记录）。")
+    return final_df
 
 
 def main():
     st.title("新闻数据拉取与保存")
 
-    try:
-        pro = ts.pro_api(tushare_token)
-        st.success("成功初始化")
-    except Exception as e:
-        st.error(f"初始化失败: {e}")
-        logging.error("初始化失败", exc_info=True)
-        return
-
     # 读取缓存中的最新 datetime
     last_datetime = read_last_datetime(CACHE_FILE)
 
@@ -190,13 +138,12 @@ def main():
     news_df = fetch_news_data(
         pro,
         last_datetime=last_datetime,
-        limit=1000,
-        calls_per_minute=8  # 限制每分钟最多调用 10 次接口
+        limit=1000
     )
 
     if not news_df.empty:
         # 保存新数据并合并
-        save_data_update(news_df, NEWS_FILE)
+        save_data_update(news_df)
 
         # 更新缓存中的最新 datetime
         latest_datetime = news_df['datetime'].max()
@@ -1,15 +1,12 @@
 import os
-import time
-import tushare as ts
 import pandas as pd
 import streamlit as st
-from tqdm import tqdm
-from ratelimit import limits, sleep_and_retry
 
-# 从 secrets.toml 中读取 Tushare API Token
-tushare_token = st.secrets.get("api_keys", {}).get("tushare_token", "your_default_token_here")
-ts.set_token(tushare_token)
-pro = ts.pro_api()
+# 所有 Tushare 调用统一经过接口网关（进程内共享限流）
+from 接口网关 import pro
+from 并发执行 import fan_out
+from 限流器 import BULK, priority
+from 股票池 import pools
 # =============== 2. 获取所有正常上市 A 股股票列表并过滤 ST ===============
 stock_list = pro.stock_basic(
     exchange='',
@@ -22,12 +19,7 @@ common_stocks = stock_list[~stock_list['name'].str.contains('ST', na=False)].cop
 common_stocks.reset_index(drop=True, inplace=True)
 st.write(f"过滤 ST 后股票数量: {len(common_stocks)}")
 
-# =============== 3. 定义受限的 API 调用函数 ===============
-ONE_MINUTE = 60
-CALLS_PER_MINUTE = 480  # 每分钟最多480次调用（可根据自身权限调整）
-
-@sleep_and_retry
-@limits(calls=CALLS_PER_MINUTE, period=ONE_MINUTE)
+# =============== 3. 定义 API 调用函数（限流由接口网关统一处理） ===============
 def get_fina_indicator(ts_code):
     """
     获取指定股票最近 30 条财务指标数据。
@@ -55,31 +47,29 @@ def get_fina_indicator(ts_code):
     )
     return df
 
-# =============== 4. 获取财务指标数据（增加无限重试） ===============
+# =============== 4. 获取财务指标数据（重试、空结果与熔断由接口网关统一处理） ===============
+def fetch_fina_one(ts_code):
+    # 新股、停牌股等确实没有财务数据，返回空结果时直接跳过，不再反复重试
+    try:
+        df_part = get_fina_indicator(ts_code)
+    except Exception as e:
+        st.write(f"\n股票 {ts_code} 调用失败: {e}\n")
+        return None
+    if df_part.empty:
+        return None
+    return df_part
+
+
 def fetch_fina_data():
-    fina_data_list = []
-    total = len(common_stocks)
     st.write("\n开始获取财务数据...")
     progress_bar = st.progress(0)  # 初始化进度条
 
-    for idx, row in tqdm(common_stocks.iterrows(), total=total, desc="获取财务数据"):
-        ts_code = row['ts_code']
-
-        # 使用“无限重试”，直到取到非空 DataFrame 为止
-        while True:
-            try:
-                df_part = get_fina_indicator(ts_code)
-                if not df_part.empty:
-                    fina_data_list.append(df_part)
-                    break
-                else:
-                    st.write(f"\n股票 {ts_code} 返回空数据，再次重试...\n")
-                    time.sleep(3)  # 等 3 秒再试
-            except Exception as e:
-                st.write(f"\n股票 {ts_code} 调用失败: {e}\n")
-                time.sleep(3)  # 等 3 秒再试
-
-        progress_bar.progress((idx + 1) / total)  # 更新进度条
+    # 并发获取各股票的财务指标，调用频率由接口网关按 fina_indicator 的额度控制；
+    # 以批量优先级运行，页面上的即时查询可以插队
+    with priority(BULK):
+        outcome = fan_out(fetch_fina_one, common_stocks['ts_code'].tolist(),
+                          on_progress=lambda done, total: progress_bar.progress(done / total))
+    fina_data_list = [df_part for df_part in outcome.results if df_part is not None]
 
     st.write("财务数据获取完成。")
     return fina_data_list
@@ -174,10 +164,8 @@ def save_top_100(df_top200):
     output_file = os.path.join("date", "扣非.txt")
     top_100_codes = df_top200.head(200)['股票代码'].tolist()
 
-    # 打开文件，默认会自动覆盖同名文件
-    with open(output_file, "w", encoding="utf-8") as f:
-        for code in top_100_codes:
-            f.write(f"{code}\n")
+    # 覆盖同名文件，并保存当天的股票池快照
+    pools.save("扣非", top_100_codes)
 
     st.write(f"\n前 100 股票代码已保存到: {output_file}")
 
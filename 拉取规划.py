@@ -0,0 +1,106 @@
+import logging
+import math
+
+import pandas as pd
+
+from 交易日历 import calendar
+from 并发执行 import fan_out
+from 接口网关 import pro
+from 请求批处理 import BATCH_ENDPOINTS
+
+# ------------------------------------------------------
+# 拉取规划：行情、两融、资金流、游资等接口既可以按股票拉一段日期（ts_code + start/end），
+# 也可以按交易日拉全市场（trade_date）。给定股票集合与日期窗口，分别估算两种方式的
+# 调用次数与返回行数，选代价小的一种执行：
+#   20 只股票 × 120 天  按股票拉（合批后只需 1 次调用）
+#   800 只股票 × 5 天   按日期拉（5 次调用，每次返回全市场）
+# 代价 = 调用次数 + 返回行数 / ROWS_PER_CALL（解码与传输 ROWS_PER_CALL 行约相当于一次调用的开销）
+# ------------------------------------------------------
+
+ROWS_PER_CALL = 10000
+DEFAULT_ROW_CAP = 6000   # 未在 BATCH_ENDPOINTS 中配置的接口的单次返回行数上限
+
+# 接口 -> 按交易日拉取时全市场每天大约的行数
+MARKET_ROWS_PER_DAY = {
+    "daily": 5400,
+    "limit_list_d": 150,
+    "margin_detail": 4000,
+    "moneyflow_ths": 5200,
+    "hm_detail": 600,
+}
+
+
+class FetchPlan:
+    """axis 为 "code"（按股票）或 "date"（按交易日）；calls、rows 为该方式的估算值"""
+
+    def __init__(self, api_name, axis, calls, rows, alternative):
+        self.api_name = api_name
+        self.axis = axis
+        self.calls = calls
+        self.rows = rows
+        self.alternative = alternative
+
+    def __repr__(self):
+        return f"FetchPlan({self.api_name}, {self.axis}, calls={self.calls}, rows={self.rows})"
+
+
+def _codes_per_call(api_name, n_days):
+    """按股票拉取时一次调用可以带的代码数：受接口的多代码上限与返回行数上限共同约束"""
+    max_codes, row_cap = BATCH_ENDPOINTS.get(api_name, (1, DEFAULT_ROW_CAP))
+    return max(1, min(max_codes, (row_cap or DEFAULT_ROW_CAP) // max(1, n_days)))
+
+
+def plan(api_name, n_codes, n_days):
+    """估算两种方式的代价，返回较优的 FetchPlan（alternative 为另一种方式的 (调用次数, 行数)）"""
+    market_rows = MARKET_ROWS_PER_DAY[api_name]
+    _, row_cap = BATCH_ENDPOINTS.get(api_name, (1, DEFAULT_ROW_CAP))
+    by_code = (math.ceil(n_codes / _codes_per_call(api_name, n_days)), n_codes * n_days)
+    by_date = (n_days * math.ceil(market_rows / (row_cap or DEFAULT_ROW_CAP)), n_days * market_rows)
+
+    def cost(estimate):
+        calls, rows = estimate
+        return calls + rows / ROWS_PER_CALL
+
+    if cost(by_code) <= cost(by_date):
+        return FetchPlan(api_name, "code", by_code[0], by_code[1], by_date)
+    return FetchPlan(api_name, "date", by_date[0], by_date[1], by_code)
+
+
+def fetch_window(api_name, codes, start_date, end_date=None, fields=None):
+    """
+    拉取 codes 在 [start_date, end_date] 内的数据，返回合并后的 DataFrame（只含 codes 中的股票）。
+    fields 为列表或逗号分隔字符串，会自动补上 ts_code、trade_date。
+    """
+    codes = list(dict.fromkeys(codes))
+    days = calendar.window(start_date, end_date)
+    if not codes or not days:
+        return pd.DataFrame()
+    if fields:
+        names = fields.split(",") if isinstance(fields, str) else list(fields)
+        fields = ",".join(dict.fromkeys(["ts_code", "trade_date"] + names))
+    else:
+        fields = ""
+
+    chosen = plan(api_name, len(codes), len(days))
+    logging.info(f"{api_name} 拉取 {len(codes)} 只股票 × {len(days)} 个交易日: {chosen}，"
+                 f"另一种方式约 {chosen.alternative[0]} 次调用")
+    if chosen.axis == "code":
+        size = _codes_per_call(api_name, len(days))
+        chunks = [codes[i:i + size] for i in range(0, len(codes), size)]
+        outcome = fan_out(
+            lambda chunk: pro.query(api_name, ts_code=",".join(chunk),
+                                    start_date=days[0], end_date=days[-1], fields=fields),
+            chunks,
+        )
+    else:
+        outcome = fan_out(lambda day: pro.query(api_name, trade_date=day, fields=fields), days)
+    for index, e in outcome.errors.items():
+        logging.error(f"{api_name} 第 {index + 1} 次分段拉取失败: {e}")
+
+    frames = [df for df in outcome.results if df is not None and not df.empty]
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True)
+    if chosen.axis == "date":
+        df = df[df["ts_code"].isin(codes)].reset_index(drop=True)
+    return df
@@ -0,0 +1,151 @@
+import json
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+import urllib3
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from 容错策略 import ServerError
+from 接口解码 import decode_items
+
+# ------------------------------------------------------
+# Tushare HTTP 传输层：替代 tushare SDK 每次调用都新建请求的做法，
+# 使用 urllib3 连接池保持长连接，进程内所有线程、所有账号共用（urllib3 连接池本身线程安全）。
+# 每次调用分别统计建连耗时与服务端耗时，便于衡量连接复用的收益。
+# 环境变量：
+#   TUSHARE_TRANSPORT  pooled（默认，连接池）或 sdk（原 tushare SDK，用于对比）
+#   TUSHARE_BASE_URL   接口地址，默认 http://api.waditu.com/dataapi，可指向本地替身服务做基准测试
+# ------------------------------------------------------
+
+DEFAULT_BASE_URL = "http://api.waditu.com/dataapi"
+DEFAULT_TIMEOUT = 30
+DEFAULT_POOL_SIZE = 16   # 每个主机保持的长连接数，不小于并发执行的在途请求数
+
+_timing = threading.local()
+
+
+class _ConnectTimer:
+    """记录当前线程本次调用中新建连接的次数与耗时"""
+
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        _timing.connect_seconds = getattr(_timing, "connect_seconds", 0.0) + time.perf_counter() - started
+        _timing.connects = getattr(_timing, "connects", 0) + 1
+
+
+class _TimedHTTPConnection(_ConnectTimer, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_ConnectTimer, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class HttpTransport:
+    """
+    长连接传输：post(api_name, payload) 发送一次请求并返回解析后的 JSON。
+    stats() 返回按接口汇总的调用次数、新建连接数、建连耗时与服务端耗时。
+    """
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, timeout=DEFAULT_TIMEOUT, pool_size=DEFAULT_POOL_SIZE):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self._pool = urllib3.PoolManager(num_pools=4, maxsize=pool_size, block=False,
+                                         retries=False, timeout=urllib3.Timeout(total=timeout))
+        self._pool.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def post(self, api_name, payload):
+        _timing.connect_seconds = 0.0
+        _timing.connects = 0
+        started = time.perf_counter()
+        try:
+            response = self._pool.request(
+                "POST", f"{self.base_url}/{api_name}",
+                body=json.dumps(payload).encode("utf-8"),
+                headers={"Content-Type": "application/json"},
+            )
+        except urllib3.exceptions.TimeoutError as e:
+            # 统一为内置的连接错误类型，熔断器据此区分接口不可用与调用方自身的错误
+            raise TimeoutError(f"Tushare 接口 {api_name} 请求超时: {e}") from e
+        except urllib3.exceptions.HTTPError as e:
+            raise ConnectionError(f"Tushare 接口 {api_name} 连接失败: {e}") from e
+        finally:
+            elapsed = time.perf_counter() - started
+            self._record(api_name, elapsed, _timing.connect_seconds, _timing.connects)
+        if response.status >= 500:
+            raise ServerError(f"Tushare 接口 {api_name} 返回 HTTP {response.status}")
+        if response.status != 200:
+            raise Exception(f"Tushare 接口 {api_name} 返回 HTTP {response.status}")
+        return json.loads(response.data.decode("utf-8"))
+
+    def _record(self, api_name, elapsed, connect_seconds, connects):
+        with self._lock:
+            entry = self._stats.setdefault(api_name, [0, 0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += connects
+            entry[2] += connect_seconds
+            entry[3] += elapsed - connect_seconds
+
+    def stats(self):
+        with self._lock:
+            rows = [
+                {
+                    "接口": api_name,
+                    "调用次数": calls,
+                    "新建连接": connects,
+                    "平均建连(ms)": round(connect_seconds / calls * 1000, 1),
+                    "平均服务端(ms)": round(server_seconds / calls * 1000, 1),
+                }
+                for api_name, (calls, connects, connect_seconds, server_seconds) in sorted(self._stats.items())
+            ]
+        return pd.DataFrame(rows, columns=["接口", "调用次数", "新建连接", "平均建连(ms)", "平均服务端(ms)"])
+
+
+class TushareClient:
+    """与 tushare DataApi 相同的请求/响应格式，通过共享的 HttpTransport 发送；响应按接口模式逐列解码"""
+
+    def __init__(self, token, transport):
+        self._token = token
+        self.transport = transport
+
+    def query(self, api_name, fields='', **kwargs):
+        kwargs.setdefault('ts_type_name', self.transport.base_url)
+        payload = {
+            'api_name': api_name,
+            'token': self._token,
+            'params': kwargs,
+            'fields': fields,
+        }
+        result = self.transport.post(api_name, payload)
+        if result['code'] != 0:
+            raise Exception(result['msg'])
+        data = result['data']
+        return decode_items(api_name, data['fields'], data['items'])
+
+
+def transport_from_env():
+    """按环境变量构造传输层；TUSHARE_TRANSPORT=sdk 时返回 None，表示使用原 tushare SDK"""
+    backend = os.environ.get("TUSHARE_TRANSPORT", "pooled").strip().lower()
+    if backend == "sdk":
+        return None
+    if backend != "pooled":
+        logging.error(f"未知的 TUSHARE_TRANSPORT={backend}，使用连接池传输")
+    return HttpTransport(os.environ.get("TUSHARE_BASE_URL", DEFAULT_BASE_URL))
@@ -0,0 +1,190 @@
+import collections
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from 接口缓存 import cache_key, normalize_params
+
+# ------------------------------------------------------
+# Tushare 接口的录制/回放替身，用于离线复现各页面流程、做性能测量与回归测试。
+# 通过环境变量切换接口网关的后端：
+#   TUSHARE_MODE=live     默认，直接调用 Tushare
+#   TUSHARE_MODE=record   调用 Tushare，同时把每次响应录制为夹具文件
+#   TUSHARE_MODE=replay   不联网，从夹具文件回放响应
+#   TUSHARE_FIXTURES      夹具目录，默认 fixtures/tushare
+#   TUSHARE_REPLAY_LATENCY  回放时每次调用的延迟：秒数，或 recorded 表示按录制时的实际耗时
+#   TUSHARE_REPLAY_QUOTA    回放时模拟的每分钟调用上限：
+#                           数字表示所有接口统一上限，gateway 表示沿用网关的各接口限额，默认不限制
+# 也可以把夹具作为本地 HTTP 替身服务运行，用于测量传输层（见 接口传输.py）：
+#   python 接口回放.py --port 8765
+#   TUSHARE_MODE=live TUSHARE_BASE_URL=http://127.0.0.1:8765/dataapi streamlit run 选股_app.py
+# ------------------------------------------------------
+
+DEFAULT_FIXTURE_DIR = os.path.join("fixtures", "tushare")
+
+
+class FixtureNotFound(LookupError):
+    """回放时找不到对应请求的夹具"""
+
+
+def fixture_path(fixture_dir, api_name, fields, params):
+    return os.path.join(fixture_dir, api_name, f"{cache_key(api_name, fields, params)}.pkl")
+
+
+class RecordingClient:
+    """
+    包装真实的 Tushare 客户端：照常发出请求，并把请求参数、响应与耗时写入夹具文件。
+    """
+
+    def __init__(self, api, fixture_dir=DEFAULT_FIXTURE_DIR):
+        self._api = api
+        self.fixture_dir = fixture_dir
+
+    def query(self, api_name, fields='', **kwargs):
+        started = time.perf_counter()
+        df = self._api.query(api_name, fields=fields, **kwargs)
+        elapsed = time.perf_counter() - started
+
+        norm_fields, norm_params = normalize_params(fields, kwargs)
+        fixture = {
+            "api_name": api_name,
+            "fields": norm_fields,
+            "params": norm_params,
+            "elapsed": elapsed,
+            "recorded_at": time.time(),
+            "df": df,
+        }
+        path = fixture_path(self.fixture_dir, api_name, fields, kwargs)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(fixture, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logging.error(f"录制夹具 {path} 失败: {e}")
+        return df
+
+
+class ReplayClient:
+    """
+    从夹具文件回放响应，不需要 token 和网络。
+    latency 为每次调用的模拟延迟（秒），取 "recorded" 时按录制时的实际耗时；
+    quotas 为 {接口名: 每分钟上限}，default_quota 为其余接口的上限，超出时
+    与真实服务端一样抛出异常。
+    """
+
+    def __init__(self, fixture_dir=DEFAULT_FIXTURE_DIR, latency=0.0, quotas=None, default_quota=None):
+        self.fixture_dir = fixture_dir
+        self.latency = latency
+        self.quotas = dict(quotas or {})
+        self.default_quota = default_quota
+        self._calls = collections.defaultdict(collections.deque)
+        self._lock = threading.Lock()
+
+    def _check_quota(self, api_name):
+        quota = self.quotas.get(api_name, self.default_quota)
+        if not quota:
+            return
+        now = time.monotonic()
+        with self._lock:
+            calls = self._calls[api_name]
+            while calls and now - calls[0] >= 60:
+                calls.popleft()
+            if len(calls) >= quota:
+                raise Exception(f"抱歉，您每分钟最多访问该接口{quota}次（{api_name}，回放模拟）")
+            calls.append(now)
+
+    def query(self, api_name, fields='', **kwargs):
+        self._check_quota(api_name)
+        path = fixture_path(self.fixture_dir, api_name, fields, kwargs)
+        if not os.path.exists(path):
+            norm_fields, norm_params = normalize_params(fields, kwargs)
+            raise FixtureNotFound(f"没有 {api_name} 的夹具: fields={norm_fields} params={norm_params}")
+        with open(path, "rb") as f:
+            fixture = pickle.load(f)
+
+        delay = fixture.get("elapsed", 0.0) if self.latency == "recorded" else float(self.latency or 0.0)
+        if delay > 0:
+            time.sleep(delay)
+        return fixture["df"].copy()
+
+
+def replay_mode():
+    """当前的接口后端模式：live / record / replay"""
+    return os.environ.get("TUSHARE_MODE", "live").strip().lower()
+
+
+def fixture_dir_from_env():
+    return os.environ.get("TUSHARE_FIXTURES", DEFAULT_FIXTURE_DIR)
+
+
+def replay_client_from_env(gateway_limits=None):
+    """
+    按环境变量构造回放客户端。gateway_limits 为 (默认上限, {接口: 上限})，
+    TUSHARE_REPLAY_QUOTA=gateway 时用它模拟服务端的各接口限额。
+    """
+    latency = os.environ.get("TUSHARE_REPLAY_LATENCY", "0").strip().lower()
+    if latency != "recorded":
+        latency = float(latency or 0)
+
+    quota = os.environ.get("TUSHARE_REPLAY_QUOTA", "").strip().lower()
+    quotas, default_quota = {}, None
+    if quota == "gateway" and gateway_limits is not None:
+        default_quota, quotas = gateway_limits
+    elif quota:
+        default_quota = int(quota)
+
+    return ReplayClient(fixture_dir_from_env(), latency=latency, quotas=quotas, default_quota=default_quota)
+
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    """按 Tushare HTTP 接口的格式应答：POST /dataapi/<api_name>，返回 code/msg/data"""
+
+    protocol_version = "HTTP/1.1"   # 保持长连接
+    disable_nagle_algorithm = True  # 响应头与响应体分开写出，避免与延迟确认叠加出 40ms 的等待
+    client = None
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request = json.loads(self.rfile.read(length).decode("utf-8"))
+            params = dict(request.get("params") or {})
+            params.pop("ts_type_name", None)
+            df = self.client.query(request["api_name"], fields=request.get("fields", ""), **params)
+            items = df.astype(object).where(df.notna(), None).values.tolist()
+            result = {"code": 0, "msg": "", "data": {"fields": list(df.columns), "items": items}}
+        except Exception as e:
+            result = {"code": -1, "msg": str(e), "data": None}
+        body = json.dumps(result, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_fixtures(client, host="127.0.0.1", port=8765):
+    """以 client（通常为 ReplayClient）的数据启动本地替身服务，返回 server，调用 serve_forever() 运行"""
+    handler = type("FixtureHandler", (_FixtureHandler,), {"client": client})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="把录制的夹具作为本地 Tushare 替身服务运行")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server = serve_fixtures(replay_client_from_env(), args.host, args.port)
+    print(f"替身服务已启动: http://{args.host}:{args.port}/dataapi （夹具目录 {fixture_dir_from_env()}）")
+    server.serve_forever()
@@ -0,0 +1,278 @@
+import datetime as dt
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+
+import pandas as pd
+
+# ------------------------------------------------------
+# Tushare 接口响应的本地磁盘缓存。
+# 缓存键 = 接口名 + 规范化后的参数；重启后仍然有效。
+# 有效期按数据类别区分：
+#   reference  交易日历、证券列表等基础数据，到下一个交易日切换时刻失效
+#   financial  财报类数据，直到该股票出现新的公告日期（ann_date）才失效；
+#              披露日期表中没有该股票时按 FINANCIAL_MAX_AGE_DAYS 失效
+#   intraday   盘中会变化的数据，只缓存很短时间
+# ------------------------------------------------------
+
+CACHE_DIR = os.path.join("date", "cache", "tushare")
+
+ENDPOINT_KINDS = {
+    "trade_cal": "reference",
+    "stock_basic": "reference",
+    "ths_member": "reference",
+    "disclosure_date": "reference",
+    "top10_holders": "financial",
+    "fina_indicator": "financial",
+    "news": "intraday",
+    "limit_step": "intraday",
+    "limit_cpt_list": "intraday",
+    "ths_hot": "intraday",
+    "irm_qa_sz": "intraday",
+    "irm_qa_sh": "intraday",
+}
+
+ROLLOVER_HOUR = 9            # 每个交易日 9:00 视为切换时刻，基础数据在此之后重新拉取
+INTRADAY_TTL_SECONDS = 120   # 盘中数据的缓存时长
+FINANCIAL_MAX_AGE_DAYS = 7   # 无法获取披露日期（或披露日期表中没有该股票）时，财报类缓存的最长保留天数
+STATS_FLUSH_SECONDS = 5      # 命中统计写盘的最小间隔
+EMPTY_TTL_SECONDS = 60       # 未分类接口的空结果缓存时长
+
+
+def normalize_params(fields, params):
+    """
+    规范化请求参数：fields 统一为逗号分隔字符串，去掉空值参数，参数值统一转为字符串。
+    这样 limit=1000 与 limit='1000'、fields 传列表或字符串都会得到同一个缓存键。
+    """
+    if isinstance(fields, (list, tuple)):
+        fields = ",".join(str(f).strip() for f in fields)
+    fields = ",".join(f.strip() for f in str(fields or "").split(",") if f.strip())
+    normalized = {k: str(v) for k, v in params.items() if v is not None and v != ""}
+    return fields, dict(sorted(normalized.items()))
+
+
+def cache_key(api_name, fields, params):
+    fields, params = normalize_params(fields, params)
+    raw = json.dumps([api_name, fields, params], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def next_rollover(stored_at):
+    """
+    返回 stored_at 之后的第一个交易日切换时刻，按交易日历跳过周末和节假日。
+    只使用交易日历已加载的数据，不为此触发加载；日历尚未加载（如正在加载交易日历本身）或超出范围时只跳过周末。
+    """
+    # 交易日历经由接口网关依赖本模块，延迟导入
+    from 交易日历 import calendar
+
+    moment = dt.datetime.fromtimestamp(stored_at)
+    rollover = moment.replace(hour=ROLLOVER_HOUR, minute=0, second=0, microsecond=0)
+    if rollover <= moment:
+        rollover += dt.timedelta(days=1)
+    following = calendar.next((rollover - dt.timedelta(days=1)).strftime("%Y%m%d"), refresh=False)
+    if following is not None:
+        return dt.datetime.combine(dt.datetime.strptime(following, "%Y%m%d").date(), rollover.time()).timestamp()
+    while rollover.weekday() >= 5:
+        rollover += dt.timedelta(days=1)
+    return rollover.timestamp()
+
+
+def empty_result_expiry(api_name, stored_at):
+    """
+    空结果（新股无财报、停牌无行情等）的失效时刻：基础数据与财报类到下一个交易日切换时刻，
+    盘中数据与未分类接口只保留很短时间。
+    """
+    kind = ENDPOINT_KINDS.get(api_name)
+    if kind in ("reference", "financial"):
+        return next_rollover(stored_at)
+    if kind == "intraday":
+        return stored_at + INTRADAY_TTL_SECONDS
+    return stored_at + EMPTY_TTL_SECONDS
+
+
+def recent_report_periods(today=None, n=2):
+    """返回最近 n 个已结束的报告期（季度末），如 ['20250930', '20250630']"""
+    today = today or dt.date.today()
+    quarter_ends = []
+    year = today.year
+    while len(quarter_ends) < n:
+        for month, day in ((12, 31), (9, 30), (6, 30), (3, 31)):
+            end = dt.date(year, month, day)
+            if end < today and len(quarter_ends) < n:
+                quarter_ends.append(end.strftime("%Y%m%d"))
+        year -= 1
+    return quarter_ends
+
+
+class ResponseCache:
+    """
+    磁盘缓存：每个条目一个 pickle 文件，内容为元数据与 DataFrame。
+    disclosure_loader(period) 用于查询某报告期各股票的实际披露日期，
+    以判断财报类缓存是否已过期。enabled=False 时不读不写（录制模式下使用）。
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, disclosure_loader=None, enabled=True):
+        self.cache_dir = cache_dir
+        self.stats_file = os.path.join(cache_dir, "stats.json")
+        self.disclosure_loader = disclosure_loader
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._disclosure_lock = threading.Lock()
+        self._stats = self._load_stats()
+        self._stats_dirty = False
+        self._stats_flushed = 0.0
+        self._disclosures = None
+        self._disclosures_expire = 0.0
+
+    # ---------------- 读写 ----------------
+    def _path(self, api_name, key):
+        return os.path.join(self.cache_dir, api_name, f"{key}.pkl")
+
+    def get(self, api_name, fields, params, count=True):
+        """count=False 时不计入命中统计（同一次调用内的重复检查）"""
+        kind = ENDPOINT_KINDS.get(api_name)
+        if kind is None or not self.enabled:
+            return None
+        path = self._path(api_name, cache_key(api_name, fields, params))
+        entry = None
+        if os.path.exists(path):
+            try:
+                with open(path, "rb") as f:
+                    entry = pickle.load(f)
+            except Exception as e:
+                logging.error(f"读取接口缓存 {path} 失败: {e}")
+        if entry is not None and self._is_fresh(kind, entry, params):
+            if count:
+                self._count(api_name, "hits")
+            return entry["df"]
+        if count:
+            self._count(api_name, "misses")
+        return None
+
+    def put(self, api_name, fields, params, df):
+        kind = ENDPOINT_KINDS.get(api_name)
+        if kind is None or not self.enabled or df is None or df.empty:
+            return
+        entry = {"stored_at": time.time(), "df": df}
+        if kind == "financial" and "ann_date" in df.columns:
+            ann_dates = df["ann_date"].dropna().astype(str)
+            entry["ann_date"] = ann_dates.max() if not ann_dates.empty else None
+        path = self._path(api_name, cache_key(api_name, fields, params))
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logging.error(f"写入接口缓存 {path} 失败: {e}")
+
+    # ---------------- 有效期 ----------------
+    def _is_fresh(self, kind, entry, params):
+        now = time.time()
+        stored_at = entry["stored_at"]
+        if kind == "reference":
+            return now < next_rollover(stored_at)
+        if kind == "intraday":
+            return now - stored_at < INTRADAY_TTL_SECONDS
+        if kind == "financial":
+            disclosures = self._load_disclosures()
+            if disclosures is None:
+                return now - stored_at < FINANCIAL_MAX_AGE_DAYS * 86400
+            watermark = entry.get("ann_date")
+            if not watermark:
+                stored_day = dt.date.fromtimestamp(stored_at) - dt.timedelta(days=1)
+                watermark = stored_day.strftime("%Y%m%d")
+            ts_code = params.get("ts_code")
+            if ts_code:
+                codes = str(ts_code).split(",")
+                known = [disclosures[code] for code in codes if code in disclosures]
+                if len(known) < len(codes) and now - stored_at >= FINANCIAL_MAX_AGE_DAYS * 86400:
+                    # 披露日期表中没有的股票无法判断是否有新公告，按最长保留天数失效
+                    return False
+                latest = max(known, default="")
+            else:
+                latest = max(disclosures.values(), default="")
+            return latest <= watermark
+        return False
+
+    def _load_disclosures(self):
+        """
+        返回 {ts_code: 最近一次实际披露财报的日期}，获取失败时返回 None。
+        披露日期表每个交易日只拉取一次（disclosure_date 本身按 reference 类缓存）。
+        """
+        if self.disclosure_loader is None:
+            return None
+        with self._disclosure_lock:
+            if time.time() >= self._disclosures_expire:
+                latest = {}
+                try:
+                    for period in recent_report_periods():
+                        df = self.disclosure_loader(period)
+                        if df is None or df.empty:
+                            continue
+                        df = df.dropna(subset=["actual_date"])
+                        for code, actual in zip(df["ts_code"], df["actual_date"].astype(str)):
+                            if actual > latest.get(code, ""):
+                                latest[code] = actual
+                except Exception as e:
+                    logging.error(f"获取财报披露日期失败: {e}")
+                    latest = None
+                self._disclosures = latest
+                self._disclosures_expire = next_rollover(time.time())
+            return self._disclosures
+
+    # ---------------- 命中统计 ----------------
+    def _load_stats(self):
+        if not os.path.exists(self.stats_file):
+            return {}
+        try:
+            with open(self.stats_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logging.error(f"读取缓存统计失败: {e}")
+            return {}
+
+    def _count(self, api_name, field):
+        today = dt.date.today().strftime("%Y%m%d")
+        with self._lock:
+            day = self._stats.setdefault(today, {})
+            counters = day.setdefault(api_name, {"hits": 0, "misses": 0})
+            counters[field] += 1
+            self._stats_dirty = True
+            if time.time() - self._stats_flushed >= STATS_FLUSH_SECONDS:
+                self._flush_stats()
+
+    def _flush_stats(self):
+        try:
+            os.makedirs(os.path.dirname(self.stats_file), exist_ok=True)
+            tmp_path = f"{self.stats_file}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._stats, f, ensure_ascii=False)
+            os.replace(tmp_path, self.stats_file)
+            self._stats_dirty = False
+            self._stats_flushed = time.time()
+        except Exception as e:
+            logging.error(f"写入缓存统计失败: {e}")
+
+    def stats(self):
+        """
+        返回按日期、接口汇总的命中统计 DataFrame：
+        日期、接口、命中次数、未命中次数、命中率(%)；命中次数即节省的接口调用次数。
+        """
+        with self._lock:
+            if self._stats_dirty:
+                self._flush_stats()
+            rows = [
+                {"日期": day, "接口": api_name, "命中次数": c["hits"], "未命中次数": c["misses"]}
+                for day, apis in self._stats.items()
+                for api_name, c in apis.items()
+            ]
+        df = pd.DataFrame(rows, columns=["日期", "接口", "命中次数", "未命中次数"])
+        total = df["命中次数"] + df["未命中次数"]
+        df["命中率(%)"] = (df["命中次数"] / total.where(total > 0) * 100).round(1).fillna(0.0)
+        return df.sort_values(by=["日期", "命中次数"], ascending=[False, False]).reset_index(drop=True)
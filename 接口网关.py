@@ -0,0 +1,305 @@
+import logging
+import os
+import threading
+import time
+from functools import partial
+
+import streamlit as st
+import tushare as ts
+
+from 接口传输 import TushareClient, transport_from_env
+from 接口解码 import apply_schema
+from 接口回放 import RecordingClient, fixture_dir_from_env, replay_client_from_env, replay_mode
+from 并发执行 import fetch_pages
+from 字段审计 import audit_mode, call_site, field_audit
+from 容错策略 import BreakerRegistry, NegativeCache, QuotaExceededError, RetryPolicy, is_service_failure
+from 接口缓存 import CACHE_DIR, ResponseCache, cache_key, empty_result_expiry
+from 请求合并 import SingleFlight
+from 请求对冲 import HedgePolicy
+from 请求批处理 import CodeBatcher
+from 限流器 import PooledRateLimiter, RateLimiter
+from 额度账本 import QuotaLedger, token_id
+
+# ------------------------------------------------------
+# Tushare 统一接口网关：进程内唯一实例，所有页面、所有会话与线程共用，
+# 每个接口按各自的每分钟额度限流；基础数据、财报等响应先查本地磁盘缓存；
+# 多个会话同时发出的相同请求只向 Tushare 发送一次；失败按退避策略重试，空结果与熔断见 容错策略.py。
+# 用法：from 接口网关 import pro，然后照常调用 pro.daily(...) 等接口。
+# 设置环境变量 TUSHARE_MODE=record/replay 可切换为录制/离线回放后端（见 接口回放.py）。
+# secrets.toml 的 [api_keys] 中配置 tushare_tokens 列表时，调用分摊到多个账号，各账号的额度分别计算。
+# 各账号、各接口的调用记入本地 SQLite 额度账本（见 额度账本.py），多个进程共用同一份每分钟与每日额度。
+# HTTP 请求经由 接口传输.py 的长连接池发出，所有账号与线程共用；响应按 接口解码.py 的字段模式解码为带类型的列。
+# 本地数据仓库（见 本地仓库.py、夜间同步.py）已有对应分区的请求直接读本地，不发出调用；TUSHARE_LOCAL=off 关闭。
+# 交互页面可用 with hedged(): 为慢请求发出对冲请求（见 请求对冲.py）。
+# 逐只股票并发发出的单代码请求，对支持多代码的接口自动合并为批量调用（见 请求批处理.py）。
+# 未传 fields 的调用按 字段审计.py 学到的字段表自动裁剪为调用点实际读取的列。
+# ------------------------------------------------------
+
+# 未单独配置的接口的每分钟调用上限
+DEFAULT_CALLS_PER_MINUTE = 500
+
+# 各接口每分钟调用上限（次/分钟），可在 secrets.toml 的 [tushare_rate_limits] 中覆盖
+ENDPOINT_CALLS_PER_MINUTE = {
+    "top10_holders": 390,
+    "fina_indicator": 480,
+    "news": 8,
+    "cctv_news": 60,
+}
+
+# disclosure_date 单次最多返回约 3000 行，按此分页拉取全市场的披露日期
+DISCLOSURE_PAGE_LIMIT = 3000
+
+
+def load_rate_limits():
+    """
+    读取限流配置，secrets.toml 示例：
+        [tushare_rate_limits]
+        default = 500
+        top10_holders = 400
+    """
+    default = DEFAULT_CALLS_PER_MINUTE
+    limits = dict(ENDPOINT_CALLS_PER_MINUTE)
+    try:
+        overrides = dict(st.secrets.get("tushare_rate_limits", {}))
+    except Exception as e:
+        logging.error(f"读取 tushare_rate_limits 配置失败: {e}")
+        overrides = {}
+    default = int(overrides.pop("default", default))
+    limits.update({name: int(value) for name, value in overrides.items()})
+    return default, limits
+
+
+def load_daily_quotas():
+    """
+    读取各接口每个账号的每日调用上限，未配置的接口不限制，secrets.toml 示例：
+        [tushare_daily_quotas]
+        stk_surv = 2000
+    """
+    try:
+        quotas = dict(st.secrets.get("tushare_daily_quotas", {}))
+    except Exception as e:
+        logging.error(f"读取 tushare_daily_quotas 配置失败: {e}")
+        quotas = {}
+    return {name: int(value) for name, value in quotas.items()}
+
+
+def load_tokens():
+    """
+    读取 Tushare token 列表，secrets.toml 示例：
+        [api_keys]
+        tushare_token = "主账号"
+        tushare_tokens = ["账号1", "账号2"]
+    两者合并去重，主账号排在最前。
+    """
+    try:
+        keys = st.secrets["api_keys"]
+    except Exception as e:
+        logging.error(f"读取 api_keys 配置失败: {e}")
+        return []
+    tokens = [keys.get("tushare_token")] + list(keys.get("tushare_tokens", []))
+    return list(dict.fromkeys(token for token in tokens if token))
+
+
+class TushareGateway:
+    """
+    Tushare 接口网关：每次 pro.xxx(...) 调用先查磁盘缓存，未命中时
+    向对应接口的令牌桶申请额度，再发出请求并写回缓存。
+    若相同请求（接口、字段、参数都相同）已在途，则等待那一次的响应而不重复发出。
+    失败的请求按 retry 策略退避重试；返回空结果的请求记入空结果缓存；
+    每个接口连续失败时熔断，冷却期内直接抛出 CircuitOpenError。
+    配置多个 token 时，每个 token 一个客户端和一套令牌桶，每次调用选用该接口最早可用的账号。
+    """
+
+    def __init__(self, token=None, limiter=None, cache=None, retry=None):
+        # token 可以是单个字符串或列表；limiter 可以是 RateLimiter 或 PooledRateLimiter
+        self._tokens = [token] if isinstance(token, str) else list(token or [])
+        self._limiter = PooledRateLimiter([limiter]) if isinstance(limiter, RateLimiter) else limiter
+        self._cache = cache
+        self._apis = None
+        self._transport = None
+        self._flight = SingleFlight()
+        self._batcher = CodeBatcher()
+        self._hedge = HedgePolicy()
+        self._ledger = QuotaLedger()
+        self._accounts = None
+        self._daily_quotas = {}
+        self._warehouse = None
+        self._retry = retry if retry is not None else RetryPolicy()
+        self._empty = NegativeCache()
+        self._breakers = BreakerRegistry()
+        self._lock = threading.Lock()
+
+    def _client(self):
+        with self._lock:
+            mode = replay_mode()
+            if self._apis is None:
+                tokens = self._tokens or load_tokens()
+                if not tokens and mode != "replay":
+                    raise RuntimeError("未配置 Tushare token，请在 secrets.toml 的 [api_keys] 中设置 tushare_token")
+                if self._limiter is None:
+                    default, limits = load_rate_limits()
+                    self._limiter = PooledRateLimiter([RateLimiter(default, limits) for _ in tokens or [None]])
+                if mode == "replay":
+                    # 回放时每个账号一个回放客户端，各自模拟服务端额度
+                    limits = (self._limiter.default_calls_per_minute, self._limiter.endpoint_limits)
+                    self._apis = [replay_client_from_env(limits) for _ in range(len(self._limiter))]
+                else:
+                    self._transport = transport_from_env()
+                    if self._transport is None:
+                        self._apis = [ts.pro_api(token) for token in tokens]
+                    else:
+                        self._apis = [TushareClient(token, self._transport) for token in tokens]
+                    if mode == "record":
+                        self._apis = [RecordingClient(api, fixture_dir_from_env()) for api in self._apis]
+                    # 回放不消耗真实额度，只有真实账号记账
+                    self._accounts = [token_id(token) for token in tokens]
+                    self._daily_quotas = load_daily_quotas()
+                if len(self._apis) != len(self._limiter):
+                    raise ValueError("token 数量与限流器数量不一致")
+            if self._cache is None:
+                # 录制时不走缓存，保证每次调用都被录下；回放时使用夹具目录下独立的缓存
+                if mode == "replay":
+                    cache_dir = os.path.join(fixture_dir_from_env(), ".cache")
+                else:
+                    cache_dir = CACHE_DIR
+                self._cache = ResponseCache(cache_dir, disclosure_loader=self._load_disclosures,
+                                            enabled=(mode != "record"))
+            return self._apis, self._limiter, self._cache
+
+    def _load_disclosures(self, period):
+        # 单次返回有行数上限，全市场的披露日期需要分页拉取
+        return fetch_pages(
+            lambda offset: self.query("disclosure_date", end_date=period, fields="ts_code,actual_date",
+                                      limit=DISCLOSURE_PAGE_LIMIT, offset=offset),
+            DISCLOSURE_PAGE_LIMIT,
+        )
+
+    def _send(self, apis, limiter, api_name, fields, kwargs):
+        """发出一次请求：先过熔断器，再从额度池中选一个账号申请额度"""
+        breaker = self._breakers.get(api_name)
+        breaker.allow()
+        index = limiter.acquire(api_name)
+        if self._accounts is not None:
+            per_minute = limiter.endpoint_limits.get(api_name, limiter.default_calls_per_minute)
+            try:
+                self._ledger.acquire(self._accounts[index], api_name, per_minute,
+                                     self._daily_quotas.get(api_name))
+            except QuotaExceededError:
+                breaker.cancel()
+                raise
+        started = time.perf_counter()
+        try:
+            result = apis[index].query(api_name, fields=fields, **kwargs)
+        except Exception as e:
+            if is_service_failure(e):
+                breaker.record_failure()
+            else:
+                breaker.cancel()
+            raise
+        breaker.record_success()
+        self._hedge.record(api_name, time.perf_counter() - started)
+        return result
+
+    def query(self, api_name, fields='', **kwargs):
+        apis, limiter, cache = self._client()
+        site = None
+        mode = audit_mode()
+        if not fields and mode != "off":
+            site = call_site(api_name)
+            if mode == "apply":
+                # 按字段表补上 fields，只取该调用点实际读取的列
+                fields = field_audit.project(site) or ''
+        df = self._local(api_name, fields, kwargs)
+        if df is None:
+            # 合批后的请求参数取决于到达时机，录制、回放时不合批，夹具键保持确定
+            if replay_mode() == "live" and self._batcher.accepts(api_name, kwargs):
+                df = self._fetch_batched(apis, limiter, cache, api_name, fields, kwargs)
+            else:
+                df = self._fetch(apis, limiter, cache, api_name, fields, kwargs)
+        if mode == "record" and site is not None:
+            return field_audit.wrap(site, df)
+        return df
+
+    def _local(self, api_name, fields, kwargs):
+        """本地仓库能回答时返回结果，否则返回 None；录制、回放时不使用本地仓库"""
+        if replay_mode() != "live" or os.environ.get("TUSHARE_LOCAL", "on").strip().lower() == "off":
+            return None
+        if self._warehouse is None:
+            # 本地仓库依赖交易日历，交易日历又依赖网关，这里延迟导入
+            from 本地仓库 import warehouse
+            self._warehouse = warehouse
+        return self._warehouse.lookup(api_name, fields, kwargs)
+
+    def _fetch_batched(self, apis, limiter, cache, api_name, fields, kwargs):
+        """单代码请求：未命中缓存时加入合批，拿到拆分后的结果后按单代码请求写回缓存"""
+        key = cache_key(api_name, fields, kwargs)
+        df = cache.get(api_name, fields, kwargs)
+        if df is None:
+            df = self._empty.get(key)
+        if df is not None:
+            return df
+        df, batched = self._batcher.submit(
+            api_name, fields, kwargs,
+            lambda batch_fields, params: self._fetch(apis, limiter, cache, api_name, batch_fields, params),
+        )
+        if batched:
+            if df.empty:
+                self._empty.put(key, df, empty_result_expiry(api_name, time.time()))
+            else:
+                cache.put(api_name, fields, kwargs, df)
+        return df
+
+    def _fetch(self, apis, limiter, cache, api_name, fields, kwargs):
+        key = cache_key(api_name, fields, kwargs)
+        df = cache.get(api_name, fields, kwargs)
+        if df is None:
+            df = self._empty.get(key)
+        if df is not None:
+            return df
+
+        def fetch():
+            # 上一个相同请求可能刚刚写完缓存，再查一次
+            cached = cache.get(api_name, fields, kwargs, count=False)
+            if cached is None:
+                cached = self._empty.get(key)
+            if cached is not None:
+                return cached
+            send = partial(self._send, apis, limiter, api_name, fields, kwargs)
+            result = self._retry.call(partial(self._hedge.call, api_name, send), api_name)
+            # 连接池传输已按模式解码；SDK、回放等后端返回的 DataFrame 在这里补做类型转换
+            result = apply_schema(api_name, result)
+            if result.empty:
+                self._empty.put(key, result, empty_result_expiry(api_name, time.time()))
+            else:
+                cache.put(api_name, fields, kwargs, result)
+            return result
+
+        df, shared = self._flight.do(key, fetch)
+        # 多个调用方拿到的是同一个 DataFrame，各自复制一份，避免页面原地修改时互相影响
+        return df.copy() if shared else df
+
+    def cache_stats(self):
+        """按日期、接口汇总的缓存命中统计"""
+        return self._client()[2].stats()
+
+    def quota_usage(self):
+        """额度账本中今天各账号、各接口的调用次数（所有进程合计）"""
+        return self._ledger.usage()
+
+    def hedge_stats(self):
+        """对冲请求的发出次数与胜出次数"""
+        return self._hedge.stats()
+
+    def transport_stats(self):
+        """按接口汇总的建连/服务端耗时；未使用连接池传输时返回 None"""
+        self._client()
+        return self._transport.stats() if self._transport is not None else None
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return partial(self.query, name)
+
+
+# 进程级共享实例
+pro = TushareGateway()
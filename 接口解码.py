@@ -0,0 +1,116 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+# ------------------------------------------------------
+# 接口响应解码：按接口的字段模式把 Tushare 返回的 fields/items 逐列直接解码为带类型的 DataFrame，
+# 调用方无需再反复 pd.to_numeric / astype(str)。
+# 字段类型：
+#   float   浮点数（金额、比例、价格等），缺失为 NaN
+#   number  计数类数值，完整时为 int64，有缺失时为 float64
+#   date    YYYYMMDD 日期，解码为可空的 Int32（如 20250109，缺失为 <NA>），无论有无缺失 dtype 都相同，
+#           需要日期类型时用 to_datetime() 转换
+#   code    股票代码、名称等重复度高的字符串，解码为 category
+# 未列出的字段按 pandas 默认规则推断。
+# ------------------------------------------------------
+
+SCHEMAS = {
+    "hm_detail": {
+        "trade_date": "date", "ts_code": "code", "ts_name": "code", "hm_name": "code",
+        "buy_amount": "float", "sell_amount": "float", "net_amount": "float",
+    },
+    "limit_step": {"trade_date": "date", "ts_code": "code", "name": "code", "nums": "number"},
+    "margin_detail": {
+        "trade_date": "date", "rzye": "float", "rqye": "float", "rzmre": "float", "rqyl": "float",
+        "rzche": "float", "rqchl": "float", "rqmcl": "float", "rzrqye": "float",
+    },
+    "daily": {
+        "open": "float", "high": "float", "low": "float", "close": "float", "pre_close": "float",
+        "change": "float", "pct_chg": "float", "vol": "float", "amount": "float",
+    },
+    "daily_basic": {
+        "close": "float", "turnover_rate": "float", "turnover_rate_f": "float", "volume_ratio": "float",
+        "pe": "float", "pe_ttm": "float", "pb": "float", "ps": "float", "ps_ttm": "float",
+        "dv_ratio": "float", "dv_ttm": "float", "total_share": "float", "float_share": "float",
+        "free_share": "float", "total_mv": "float", "circ_mv": "float",
+    },
+    "moneyflow_ths": {
+        "pct_change": "float", "latest": "float", "net_amount": "float", "net_d5_amount": "float",
+        "buy_lg_amount": "float", "buy_lg_amount_rate": "float", "buy_md_amount": "float",
+        "buy_md_amount_rate": "float", "buy_sm_amount": "float", "buy_sm_amount_rate": "float",
+    },
+    "ccass_hold": {"shareholding": "float", "hold_nums": "float", "hold_ratio": "float"},
+    "hk_hold": {"vol": "float", "ratio": "float"},
+    "fina_indicator": {
+        "netprofit_yoy": "float", "dt_netprofit_yoy": "float",
+        "q_netprofit_yoy": "float", "q_netprofit_qoq": "float",
+    },
+    "stk_factor": {"rsi_6": "float", "rsi_12": "float", "rsi_24": "float"},
+    "limit_list_d": {"pct_chg": "float", "limit_times": "number"},
+    "kpl_concept": {"z_t_num": "number", "up_num": "number"},
+    "kpl_concept_cons": {"hot_num": "number"},
+}
+
+
+def _decode_column(values, kind):
+    """values 为一列的原始值（列表或 Series），按 kind 解码为 Series"""
+    if kind == "float":
+        try:
+            return pd.Series(np.asarray(values, dtype=np.float64))
+        except (TypeError, ValueError):
+            return pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").astype(np.float64)
+    if kind == "number":
+        return pd.to_numeric(pd.Series(values, dtype=object), errors="coerce")
+    if kind == "date":
+        # 缺失或无法解析的日期为 <NA>，不会变成 0，也不会让整列退回字符串
+        return pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").astype("Int32")
+    if kind == "code":
+        return pd.Series(values, dtype="category")
+    return pd.Series(values)
+
+
+def decode_items(api_name, fields, items):
+    """把接口原始的 fields/items 逐列解码为 DataFrame"""
+    schema = SCHEMAS.get(api_name, {})
+    if not items:
+        return pd.DataFrame(columns=fields)
+    columns = list(zip(*items))
+    data = {}
+    for name, values in zip(fields, columns):
+        kind = schema.get(name)
+        data[name] = _decode_column(values, kind) if kind else pd.Series(values)
+    return pd.DataFrame(data, columns=fields)
+
+
+def apply_schema(api_name, df):
+    """
+    对已经是 DataFrame 的结果（tushare SDK、回放夹具等）按模式转换列类型；
+    已经是目标类型的列不做处理。
+    """
+    schema = SCHEMAS.get(api_name)
+    if not schema or df is None or df.empty:
+        return df
+    target = {
+        "float": lambda dtype: dtype == np.float64,
+        "number": lambda dtype: pd.api.types.is_numeric_dtype(dtype),
+        "date": lambda dtype: dtype == "Int32",
+        "code": lambda dtype: isinstance(dtype, pd.CategoricalDtype),
+    }
+    for name, kind in schema.items():
+        if name in df.columns and not target[kind](df[name].dtype):
+            try:
+                df[name] = _decode_column(df[name].tolist(), kind).values
+            except Exception as e:
+                logging.error(f"{api_name}.{name} 按 {kind} 解码失败: {e}")
+    return df
+
+
+def to_datetime(series):
+    """把 Int32 的 YYYYMMDD 日期列（或字符串日期列）转换为 datetime64，缺失为 NaT"""
+    if pd.api.types.is_integer_dtype(series.dtype):
+        series = series.astype(np.float64)
+        return pd.to_datetime(pd.DataFrame({
+            "year": series // 10000, "month": series // 100 % 100, "day": series % 100,
+        }))
+    return pd.to_datetime(series.astype(str), format="%Y%m%d")
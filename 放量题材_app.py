@@ -1,12 +1,10 @@
 import streamlit as st
-import tushare as ts
 import pandas as pd
 import talib
 import datetime as dt
 import os
 import logging
 import ast  # 用于解析字符串表示的列表
-import time
 import json
 
 
@@ -17,56 +15,25 @@ import json
 logging.basicConfig(filename='error.log', level=logging.ERROR,
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
-# 从 secrets.toml 文件中读取 Tushare API Token
-tushare_token = st.secrets["api_keys"]["tushare_token"]
-
-# 设置 Tushare API Token
-ts.set_token(tushare_token)
-pro = ts.pro_api()
+# 所有 Tushare 调用统一经过接口网关（进程内共享限流）
+from 接口网关 import pro
+from 交易日历 import calendar
+from 并发执行 import fan_out
+from 拉取规划 import fetch_window
+from 本地仓库 import daily_bars
+from 行情面板 import panels
+from 证券索引 import securities, intersect
+from 股票池 import pool_name, pools
+from 评分特征 import fetch_score_features
 
 
 # -------------------------- 各功能函数 --------------------------
 def save_selected_stocks(selected_stocks, file_name):
     """
-    保存筛选后的股票代码到指定文件。
+    保存筛选后的股票代码为股票池快照，并写出 date/ 下的同名文件（见 股票池.py）。
     """
-    # 设置文件路径为相对路径的 'date' 文件夹
-    file_path = os.path.join("date", file_name)
-
-    # 确保 'date' 文件夹存在
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-
-    # 写入文件
-    with open(file_path, "w", encoding='utf-8') as file:
-        for stock_code in selected_stocks:
-            file.write(f"{stock_code}\n")
-
+    file_path = pools.save(pool_name(file_name), selected_stocks)
     st.success(f"股票列表已保存到: {file_path}")
-def get_trade_calendar():
-    """获取近两年的交易日历，并过滤至今日之前"""
-    today = dt.datetime.today()
-    today_str = today.strftime('%Y%m%d')
-
-    two_years_ago = today.replace(year=today.year - 2)
-    start_date_str = two_years_ago.strftime('%Y%m%d')
-
-    try:
-        df = pro.trade_cal(exchange='SSE', start_date=start_date_str, end_date=today_str, fields='cal_date,is_open')
-        df = df[df['cal_date'] <= today_str]
-        df = df.sort_values(by='cal_date')
-        return df
-    except Exception as e:
-        logging.error(f"获取交易日历出错: {e}")
-        st.error("获取交易日历时出错，请查看 error.log。")
-        return pd.DataFrame()
-
-def get_latest_trade_days(trade_cal_df, max_tries=10):
-    """获取最近的交易日列表，最多回溯 max_tries 天"""
-    open_days = trade_cal_df[trade_cal_df['is_open'] == 1]['cal_date'].tolist()
-    if not open_days:
-        return []
-    return open_days[-max_tries:]
-
 def get_component_stocks(concept_code, trade_date):
     """根据题材代码和交易日期获取成分股 (已改为 con_code)"""
     try:
@@ -80,50 +47,50 @@ def get_component_stocks(concept_code, trade_date):
         st.error(f"题材代码 {concept_code} 获取成分股时出错，请查看 error.log。")
         return set()
 
-def load_stock_pool(file_path):
-    """从单个文件加载股票池"""
-    if not os.path.exists(file_path):
-        st.warning(f"文件 {file_path} 不存在，跳过。")
-        return set()
-    try:
-        with open(file_path, "r", encoding='utf-8') as file:
-            stock_codes = {line.strip() for line in file if line.strip()}
-        st.info(f"从本地文件 {file_path} 加载了 {len(stock_codes)} 只股票。")
-        return stock_codes
-    except Exception as e:
-        logging.error(f"加载本地股票池文件 {file_path} 失败: {e}")
-        st.error(f"加载本地股票池文件 {file_path} 时出错，请查看 error.log。")
-        return set()
+def quote_pool(token):
+    """把输入框中的股票池名或路径加上引号，路径中的 -、括号等不会被当作运算符"""
+    return f'"{token}"'
 
-def get_union_stock_pools(file_paths):
+def evaluate_stock_pools(expression):
     """
-    从多个本地文件加载股票池，并计算它们的并集。
+    按股票池表达式组合本地股票池（见 股票池.py），返回证券编号数组；表达式有误或股票池不存在时返回 None。
     """
-    union_set = set()
-    for idx, file_path in enumerate(file_paths, start=1):
-        stocks = load_stock_pool(file_path)
-        if stocks:
-            union_set.update(stocks)
-    st.info(f"所有输入文件的股票池并集总数: {len(union_set)}")
-    return union_set
-
-def get_intersection_with_shareholder(stock_pool, shareholder_pool):
+    try:
+        pool_ids = pools.evaluate(expression)
+    except ValueError as e:
+        st.warning(f"股票池表达式无法计算：{e}")
+        return None
+    st.info(f"股票池 {expression} 的股票总数: {len(pool_ids)}")
+    return pool_ids
+
+def load_daily_panel(codes, start_date, end_date):
     """
-    计算股票池与股东股票池的交集
+    返回窗口内各股票的 close、vol 长表。优先从内存映射面板展开（各会话共享同一份页缓存），
+    面板在窗口内的交易日与仓库中已有的分区不完全一致（仓库中间缺分区、面板尚未追加）时退回逐分区读取。
+    两条路径的 close、vol 取值精度一致（float32 精度，以 float64 返回）。
     """
-    intersection = stock_pool & shareholder_pool
-    st.info(f"股票池与股东股票池交集后的股票总数: {len(intersection)}")
-    return intersection
+    daily_bars.sync(start_date, end_date)
+    panels.sync()
+    stored = [day for day in calendar.window(start_date, end_date) if daily_bars.has(day)]
+    panel = panels.open('close')
+    if stored and panel is not None and list(panel.dates[panel.window(start_date, end_date)]) == stored:
+        df = panels.frame(['close', 'vol'], codes, start_date, end_date)
+    else:
+        df = daily_bars.read(start_date, end_date, codes=codes, columns=['close', 'vol'])
+    # 面板存的是 float32：两条路径都按 float32 取值后再转 float64，同一天的均线、阈值比较结果与来源无关
+    return df.astype({'close': 'float32', 'vol': 'float32'}).astype({'close': 'float64', 'vol': 'float64'})
+
 
-def technical_stock_selection(stock_code, start_date, end_date):
-    """进行技术面筛选，返回符合条件的股票代码"""
+def technical_stock_selection(stock_code, df, limit_df):
+    """
+    进行技术面筛选，返回符合条件的股票代码。
+    df 为该股票窗口内的日线（trade_date, close, vol），来自本地行情仓库；
+    limit_df 为窗口内的涨停记录（trade_date, limit_times），由 fetch_window 按股票集合一次性拉取。
+    """
     try:
-        df = pro.daily(ts_code=stock_code, start_date=start_date, end_date=end_date)
-        if df.empty or not all(col in df.columns for col in ['close', 'vol']):
+        if df is None or df.empty or not all(col in df.columns for col in ['close', 'vol']):
             return None
 
-        df['close'] = pd.to_numeric(df['close'], errors='coerce')
-        df['vol'] = pd.to_numeric(df['vol'], errors='coerce')
         if df['close'].isnull().any() or df['vol'].isnull().any():
             return None
 
@@ -155,7 +122,9 @@ def technical_stock_selection(stock_code, start_date, end_date):
 
         limit_data_start = df['trade_date'].iloc[0]
         limit_data_end = df['trade_date'].iloc[-1]
-        limit_df = pro.limit_list_d(start_date=limit_data_start, end_date=limit_data_end, ts_code=stock_code)
+        if limit_df is None or limit_df.empty:
+            return None
+        limit_df = limit_df[limit_df['trade_date'].between(limit_data_start, limit_data_end)].copy()
         if limit_df.empty:
             return None
 
@@ -170,37 +139,10 @@ def technical_stock_selection(stock_code, start_date, end_date):
         logging.error(f"{stock_code} 筛选出错: {e}")
         return None
 
-def fetch_moneyflow_data(stock_code):
-    """
-    获取当日净值(net_amount)、5日主力净值(net_d5_amount)、大单占比(buy_lg_amount_rate)
-    单位分别是 万、万、%。
-    """
-    try:
-        df = pro.moneyflow_ths(ts_code=stock_code, limit=1,
-                               fields=["net_amount", "net_d5_amount", "buy_lg_amount_rate"])
-        if df.empty:
-            st.info(f"没有找到 {stock_code} 的资金流数据。")
-            return None, None, None
-
-        net_d5_amount = pd.to_numeric(df['net_d5_amount'].iloc[0], errors='coerce')
-        net_amount = pd.to_numeric(df['net_amount'].iloc[0], errors='coerce')
-        buy_lg_amount_rate = pd.to_numeric(df['buy_lg_amount_rate'].iloc[0], errors='coerce')
-
-        net_d5_amount = net_d5_amount if net_d5_amount is not None else 0.0
-        net_amount = net_amount if net_amount is not None else 0.0
-        buy_lg_amount_rate = buy_lg_amount_rate if buy_lg_amount_rate is not None else 0.0
-
-        return net_d5_amount, net_amount, buy_lg_amount_rate
-    except Exception as e:
-        logging.error(f"{stock_code} 获取资金流数据出错: {e}")
-        st.error(f"获取 {stock_code} 的资金流数据时出错，请查看 error.log。")
-        return None, None, None
-
 def fetch_stock_basic():
     """获取所有股票的基本信息，并返回 ts_code -> ts_name 的映射字典"""
     try:
-        df_basic = pro.stock_basic(exchange='', list_status='L',
-                                   fields='ts_code,symbol,name,area,industry,fullname,enname,market,exchange,list_date')
+        df_basic = pro.stock_basic(exchange='', list_status='L', fields='ts_code,name')
         stock_basic_mapping = pd.Series(df_basic.name.values, index=df_basic.ts_code).to_dict()
         return stock_basic_mapping
     except Exception as e:
@@ -229,80 +171,22 @@ def get_stock_concepts(stock_code):
         logging.error(f"获取 {stock_code} 的 concept 失败: {e}")
         return "获取失败"
 
-def fetch_institution_data(stock_code):
-    """
-    获取机构总占比(hold_ratio)
-    """
-    try:
-        df = pro.ccass_hold(ts_code=stock_code, limit=1, fields=["hold_ratio", "ts_code", "name"])
-        if df.empty:
-            st.info(f"没有找到 {stock_code} 的机构持仓数据。")
-            return 0.0
-        hold_ratio = pd.to_numeric(df['hold_ratio'].iloc[0], errors='coerce')
-        hold_ratio = hold_ratio if hold_ratio is not None else 0.0
-        return hold_ratio
-    except Exception as e:
-        logging.error(f"{stock_code} 获取机构持仓数据出错: {e}")
-        st.error(f"获取 {stock_code} 的机构持仓数据时出错，请查看 error.log。")
-        return 0.0
-
-def fetch_northbound_ratio(stock_code):
-    """获取北向持股比例 ratio（%）"""
-    try:
-        df = pro.hk_hold(ts_code=stock_code, limit=1, fields=["ratio"])
-        if df.empty:
-            return 0.0
-        ratio = pd.to_numeric(df['ratio'].iloc[0], errors='coerce')
-        return ratio if ratio is not None else 0.0
-    except Exception as e:
-        logging.error(f"{stock_code} 获取北向占比出错: {e}")
-        st.error(f"获取 {stock_code} 的北向占比数据时出错，请查看 error.log。")
-        return 0.0
-
-def fetch_circ_mv_and_volume_ratio(stock_code):
-    """
-    获取股票的流通市值(circ_mv, 单位: 万) 和 量比(volume_ratio)
-    若没数据则返回 (0.0, 0.0)
-    """
-    try:
-        df = pro.daily_basic(ts_code=stock_code, limit=1, fields=["circ_mv", "volume_ratio"])
-        if df.empty:
-            return 0.0, 0.0
-        circ_mv = pd.to_numeric(df['circ_mv'].iloc[0], errors='coerce')
-        volume_ratio = pd.to_numeric(df['volume_ratio'].iloc[0], errors='coerce')
-        circ_mv = circ_mv if circ_mv is not None else 0.0
-        volume_ratio = volume_ratio if volume_ratio is not None else 0.0
-        return circ_mv, volume_ratio
-    except Exception as e:
-        logging.error(f"{stock_code} 获取 daily_basic 出错: {e}")
-        st.error(f"获取 {stock_code} 的 daily_basic 数据时出错，请查看 error.log。")
-        return 0.0, 0.0
-
-def fetch_hm_detail_5days(stock_code, trade_cal_df):
+def fetch_hm_detail_5days(stock_code):
     """
     获取近5个交易日的游资数据（hm_detail），包含 buy_amount(万), sell_amount(万), net_amount(万)
     返回 (df_merged, yz_5d_sum, True/False)
     """
-    open_days = trade_cal_df[trade_cal_df['is_open'] == 1]['cal_date'].tolist()
-    if not open_days:
+    last_day = calendar.latest()
+    if last_day is None:
         return None, 0.0, False
 
-    last_day = open_days[-1]
-    df_test = pro.hm_detail(ts_code=stock_code, trade_date=last_day)
+    df_test = pro.hm_detail(ts_code=stock_code, trade_date=last_day, fields='ts_code')
     if df_test.empty:
-        if len(open_days) >= 2:
-            last_day = open_days[-2]
-        else:
+        last_day = calendar.prev(last_day)
+        if last_day is None:
             return None, 0.0, False
 
-    if last_day not in open_days:
-        return None, 0.0, False
-
-    idx = open_days.index(last_day)
-    if idx - 4 < 0:
-        five_days = open_days[0: idx + 1]
-    else:
-        five_days = open_days[idx - 4: idx + 1]
+    five_days = calendar.last_n(5, end=last_day)
 
     frames = []
     for d in five_days:
@@ -313,10 +197,9 @@ def fetch_hm_detail_5days(stock_code, trade_cal_df):
         )
         if not df_hm.empty:
             for col in ["buy_amount", "sell_amount", "net_amount"]:
-                df_hm[col] = pd.to_numeric(df_hm[col], errors='coerce').fillna(0) / 10000.0
+                df_hm[col] = df_hm[col].fillna(0) / 10000.0
             df_hm["trade_date"] = df_hm["trade_date"].astype(str)
             frames.append(df_hm)
-        time.sleep(0.05)
 
     if not frames:
         return None, 0.0, False
@@ -325,15 +208,11 @@ def fetch_hm_detail_5days(stock_code, trade_cal_df):
     yz_5d_sum = df_merged["net_amount"].sum()
     return df_merged, yz_5d_sum, True
 
-def get_recent_kpl_concept_cons(trade_cal_df, max_tries=10):
+def get_recent_kpl_concept_cons(max_tries=10):
     """
     从最近的 max_tries 个交易日内，获取最近成功的 kpl_concept_cons 数据 (已改为 con_code)。
     """
-    open_days = trade_cal_df[trade_cal_df['is_open'] == 1]['cal_date'].tolist()
-    if not open_days:
-        return pd.DataFrame(columns=['name', 'con_code', 'hot_num', 'desc'])
-
-    recent_days = open_days[-max_tries:]
+    recent_days = calendar.last_n(max_tries)
     for trade_date in reversed(recent_days):
         try:
             df_kpl = pro.kpl_concept_cons(
@@ -349,7 +228,6 @@ def get_recent_kpl_concept_cons(trade_cal_df, max_tries=10):
         except Exception as e:
             logging.error(f"获取 kpl_concept_cons 出错, 交易日 {trade_date}: {e}")
             st.error(f"获取 kpl_concept_cons 出错, 交易日 {trade_date}，请查看 error.log。")
-        time.sleep(0.2)
     return pd.DataFrame(columns=['name', 'con_code', 'hot_num', 'desc'])
 
 def aggregate_concept_info(df_kpl):
@@ -359,7 +237,7 @@ def aggregate_concept_info(df_kpl):
     if df_kpl.empty:
         return pd.DataFrame(columns=['con_code', 'total_hot_num', 'combined_name', 'combined_desc'])
 
-    df_kpl['hot_num'] = pd.to_numeric(df_kpl['hot_num'], errors='coerce').fillna(0)
+    df_kpl['hot_num'] = df_kpl['hot_num'].fillna(0)
 
     grouped = df_kpl.groupby('con_code').agg({
         'name': lambda x: ';'.join(sorted(set(x.dropna()))),
@@ -418,7 +296,7 @@ def display_5days_hm_detail(stock_code, stock_name, df_5days):
     st.dataframe(df_display, use_container_width=True, hide_index=True)
 
 
-def fetch_margin_6d_ratio(stock_code, circ_mv, trade_cal_df):
+def fetch_margin_6d_ratio(stock_code, circ_mv):
     """
     计算近6日的融资融券净流入占比(%)。
     """
@@ -427,8 +305,8 @@ def fetch_margin_6d_ratio(stock_code, circ_mv, trade_cal_df):
         if df.empty or len(df) < 6:
             return 0.0
 
-        df['rzye'] = pd.to_numeric(df['rzye'], errors='coerce').fillna(0.0) / 10000.0
-        df['rqye'] = pd.to_numeric(df['rqye'], errors='coerce').fillna(0.0) / 10000.0
+        df['rzye'] = df['rzye'].fillna(0.0) / 10000.0
+        df['rqye'] = df['rqye'].fillna(0.0) / 10000.0
 
         df = df.sort_values(by='trade_date').reset_index(drop=True)
         df['net_inflow'] = (df['rzye'].diff()) - (df['rqye'].diff())
@@ -463,6 +341,7 @@ def main():
     default_shareholder_pool = st.text_input("香港中央结算股东池", "date/游资.txt")
     extra_pools_input = st.text_input("股票池可多，间隔空格：date/涨停板.txt date/游资.txt date/RSI选股.txt "
                                       "date/机构调研.txt date/扣非.txt date/成分股.txt","date/RSI选股.txt")
+    pool_expression = st.text_input("股票池表达式（选填，填写后代替上面两项），如：(成分股 | 涨停板 | RSI选股) & 股东 - 扣非", "")
     concept_codes_input = st.text_input("题材代码（多个代码用空格分隔，留空则不使用）", "")
     run_button = st.button("开始筛选")
 
@@ -470,6 +349,7 @@ def main():
     current_params = {
         "default_shareholder_pool": default_shareholder_pool,
         "extra_pools_input": extra_pools_input,
+        "pool_expression": pool_expression,
         "concept_codes_input": concept_codes_input
     }
     cache_key = get_cache_key(current_params)
@@ -532,27 +412,36 @@ def main():
             st.error("无法获取股票基本信息，程序终止。")
             return
 
-        # 2) 加载股东股票池
-        progress_text.text("加载股东股票池文件……")
-        shareholder_stock_pool = load_stock_pool(default_shareholder_pool)
-        if not shareholder_stock_pool:
-            st.error("股东股票池为空，程序终止。")
-            return
-
-        # 3) 额外股票池
-        if extra_pools_input.strip():
-            extra_file_paths = extra_pools_input.strip().split()
-            st.info("加载额外股票池文件并计算并集……")
-            extra_stock_pool = get_union_stock_pools(extra_file_paths)
-            if not extra_stock_pool:
+        # 2)-3) 组合股票池：额外股票池的并集与股东股票池取交集，或直接按股票池表达式组合
+        progress_text.text("计算股票池……")
+        if pool_expression.strip():
+            expression = pool_expression.strip()
+        elif extra_pools_input.strip():
+            # 与逐个加载文件时一致：不存在的额外股票池给出提示后跳过
+            extra_pools = []
+            for token in extra_pools_input.split():
+                if pools.exists(token):
+                    extra_pools.append(token)
+                else:
+                    st.warning(f"股票池 {token} 不存在，跳过。")
+            if not pools.exists(default_shareholder_pool.strip()):
+                st.error("股东股票池为空，程序终止。")
+                return
+            if not extra_pools:
                 st.error("额外股票池并集为空，无法与股东股票池计算交集。程序终止。")
                 return
-            selected_stocks_intersection = get_intersection_with_shareholder(extra_stock_pool, shareholder_stock_pool)
+            expression = " & ".join([
+                "(" + " | ".join(quote_pool(token) for token in extra_pools) + ")",
+                quote_pool(default_shareholder_pool.strip()),
+            ])
         else:
             st.info("未输入额外股票池文件，程序终止。")
             return
+        selected_stocks_intersection = evaluate_stock_pools(expression)
+        if selected_stocks_intersection is None:
+            return
 
-        if not selected_stocks_intersection:
+        if not len(selected_stocks_intersection):
             st.error("最终股票池为空，程序终止。")
             return
 
@@ -561,14 +450,9 @@ def main():
         if concept_codes_input.strip():
             concept_codes = [code.strip() for code in concept_codes_input.split() if code.strip()]
             if concept_codes:
-                trade_cal_df = get_trade_calendar()
-                if trade_cal_df.empty:
-                    st.error("交易日历获取失败，程序终止。")
-                    return
-
-                recent_trade_days = get_latest_trade_days(trade_cal_df, max_tries=10)
+                recent_trade_days = calendar.last_n(10)
                 if not recent_trade_days:
-                    st.error("未找到有效的交易日，程序终止。")
+                    st.error("交易日历获取失败或未找到有效的交易日，程序终止。")
                     return
 
                 all_concept_stocks = set()
@@ -589,16 +473,16 @@ def main():
                         break
                     else:
                         st.info(f"{trade_date} 的成分股数据为空，尝试回退到上一个交易日。")
-                    time.sleep(0.1)
                 if all_concept_stocks:
-                    selected_stocks_intersection = selected_stocks_intersection & all_concept_stocks
+                    selected_stocks_intersection = intersect(selected_stocks_intersection,
+                                                             securities.to_ids(all_concept_stocks))
                     st.info(f"题材代码与股票池交集后的股票池总数: {len(selected_stocks_intersection)}")
             else:
                 st.info("未检测到有效的题材代码输入。")
         else:
             st.info("未输入题材代码，使用现有股票池进行筛选。")
 
-        if not selected_stocks_intersection:
+        if not len(selected_stocks_intersection):
             st.error("最终股票池为空，程序终止。")
             return
 
@@ -611,33 +495,34 @@ def main():
         end_date = concept_date if concept_date else dt.datetime.today().strftime('%Y%m%d')
 
         st.info("开始进行技术面筛选……")
-        final_selected_stocks = []
         progress_bar = st.progress(0)
-        selected_list = list(selected_stocks_intersection)
-        total = len(selected_list)
-        for idx, stock_code in enumerate(selected_list):
-            result = technical_stock_selection(stock_code, start_date, end_date)
+        selected_list = list(securities.codes(selected_stocks_intersection))
+        # 日线读本地行情仓库（缺少的交易日先补齐）并追加进内存映射面板；涨停记录按股票集合与日期窗口选择拉取方式
+        daily_panel = load_daily_panel(selected_list, start_date, end_date)
+        limit_panel = fetch_window('limit_list_d', selected_list, start_date, end_date,
+                                   fields='trade_date,limit_times')
+        daily_by_code = dict(tuple(daily_panel.groupby('ts_code'))) if not daily_panel.empty else {}
+        limit_by_code = dict(tuple(limit_panel.groupby('ts_code'))) if not limit_panel.empty else {}
+        # 数据已全部在内存中，筛选是纯计算，逐只循环即可（多线程在 GIL 下只增加开销）
+        final_selected_stocks = []
+        for index, stock_code in enumerate(selected_list, start=1):
+            result = technical_stock_selection(
+                stock_code, daily_by_code.get(stock_code), limit_by_code.get(stock_code))
             if result:
                 final_selected_stocks.append(result)
-            progress_bar.progress((idx + 1) / total)
-            time.sleep(0.05)
+            progress_bar.progress(index / len(selected_list))
         progress_bar.empty()
         if not final_selected_stocks:
             st.error("没有符合技术面条件的股票。程序终止。")
             return
 
         # 6) 获取概念/人气值数据
-        trade_cal_df = get_trade_calendar()
-        if trade_cal_df.empty:
-            st.error("交易日历获取失败，跳过 kpl_concept_cons 数据获取。")
+        df_kpl = get_recent_kpl_concept_cons(max_tries=10)
+        if df_kpl.empty:
+            st.info("在最近的交易日范围内，kpl_concept_cons 数据均为空。")
             df_kpl_final = pd.DataFrame()
         else:
-            df_kpl = get_recent_kpl_concept_cons(trade_cal_df, max_tries=10)
-            if df_kpl.empty:
-                st.info("在最近的交易日范围内，kpl_concept_cons 数据均为空。")
-                df_kpl_final = pd.DataFrame()
-            else:
-                df_kpl_final = aggregate_concept_info(df_kpl)
+            df_kpl_final = aggregate_concept_info(df_kpl)
 
         concept_info_dict = {}
         if not df_kpl_final.empty:
@@ -657,29 +542,36 @@ def main():
         hm_detail_map = {}
 
         st.info("开始获取资金流、北向、流通市值、量比、近5日游资数据及融资融券数据……")
+        # 流通市值/量比、资金流、机构、北向按交易日一次拉取全市场快照，缺失的股票再逐只补查
+        feature_dates = list(reversed(calendar.last_n(3)))
+        features = fetch_score_features(final_selected_stocks, feature_dates).fillna(0.0)
+        # 近5日游资数据逐只请求，并发执行时同一交易日的单代码请求由网关合批（见 请求批处理.py）
+        hm_outcome = fan_out(fetch_hm_detail_5days, final_selected_stocks, default=(None, 0.0, False))
+        hm_results = dict(zip(final_selected_stocks, hm_outcome.results))
+
         for stock_code in final_selected_stocks:
             stock_name = stock_basic_mapping.get(stock_code, '未知')
+            feature = features.loc[stock_code]
 
             # (1) 流通市值 & 量比
-            circ_mv, volume_ratio = fetch_circ_mv_and_volume_ratio(stock_code)
+            circ_mv, volume_ratio = feature['circ_mv'], feature['volume_ratio']
             if circ_mv <= 0:
                 continue
 
             # (2) 资金流数据
-            net_d5_amount, net_amount, buy_lg_amount_rate = fetch_moneyflow_data(stock_code)
-            net_d5_amount = net_d5_amount if net_d5_amount else 0.0
-            net_amount = net_amount if net_amount else 0.0
-            buy_lg_amount_rate = buy_lg_amount_rate if buy_lg_amount_rate else 0.0
+            net_d5_amount = feature['net_d5_amount']
+            net_amount = feature['net_amount']
+            buy_lg_amount_rate = feature['buy_lg_amount_rate']
 
             ratio_today = (net_amount / circ_mv) * 100
             ratio_5day = (net_d5_amount / circ_mv) * 100
 
             # (3) 机构 & 北向数据
-            hold_ratio = fetch_institution_data(stock_code)
-            northbound_ratio = fetch_northbound_ratio(stock_code)
+            hold_ratio = feature['hold_ratio']
+            northbound_ratio = feature['ratio']
 
             # (4) 近5日游资数据 —— 这里返回 (df_5days, yz_5d_sum, has_data_5d)
-            df_5days, yz_5d_sum, has_data_5d = fetch_hm_detail_5days(stock_code, trade_cal_df)
+            df_5days, yz_5d_sum, has_data_5d = hm_results[stock_code]
             if not has_data_5d:
                 continue
             yz_5d_ratio = (yz_5d_sum / circ_mv) * 100
@@ -701,7 +593,7 @@ def main():
                 concepts = concepts[:27] + '...'
 
             # (7) 融资融券净流入占比
-            margin_ratio = fetch_margin_6d_ratio(stock_code, circ_mv, trade_cal_df)
+            margin_ratio = fetch_margin_6d_ratio(stock_code, circ_mv)
 
             final_data.append({
                 '股票代码': stock_code,
@@ -4,11 +4,12 @@ import re
 import os
 from datetime import datetime
 
+from 分段存储 import cctv_store, news_store
+
 # -----------------------------
 # 全局变量定义
 # -----------------------------
-NEWS_FILE = os.path.join("date", 'news_data.csv')
-CCTV_NEWS_FILE = os.path.join("date", 'cctv_news_data.csv')
+NEWS_FILE = os.path.join("date", 'news_data.csv')  # 旧版整文件存储，首次读取时导入分段存储
 
 DEFAULT_KEYWORDS = [
     "航天", "军工", "卫星", "半导体", "量子", "AI", "华为", "电池", "航运", "白酒",
@@ -43,38 +44,34 @@ DEFAULT_QUERY_KEYWORDS = [
 # -----------------------------
 def load_and_filter_data(user_date):
     """
-    从 CSV 文件加载新闻数据并过滤指定日期及以后的数据
+    从分段存储加载指定日期及以后的新闻数据
     """
     data = {}
-    if os.path.exists(NEWS_FILE):
-        try:
-            data['news'] = pd.read_csv(NEWS_FILE, encoding='utf-8-sig')
+    try:
+        # 快讯按日期分段存储，只读取指定日期及以后的分段
+        news_store.import_legacy(NEWS_FILE, encoding='utf-8-sig')
+        if news_store.partitions():
+            data['news'] = news_store.read(start=user_date or None)
             st.info(f"已加载新闻快讯数据，共 {len(data['news'])} 条。")
-        except Exception as e:
-            st.error(f"加载新闻快讯数据失败: {e}")
+        else:
+            st.warning("新闻快讯数据不存在。")
             data['news'] = pd.DataFrame()
-    else:
-        st.warning("新闻快讯数据文件不存在。")
+    except Exception as e:
+        st.error(f"加载新闻快讯数据失败: {e}")
         data['news'] = pd.DataFrame()
 
-    if os.path.exists(CCTV_NEWS_FILE):
-        try:
-            data['cctv_news'] = pd.read_csv(CCTV_NEWS_FILE, encoding='utf-8-sig')
+    try:
+        # 新闻联播存档入库时已清洗，同样只读取指定日期及以后的分段
+        if cctv_store.partitions():
+            data['cctv_news'] = cctv_store.read(start=user_date or None)
             st.info(f"已加载新闻联播数据，共 {len(data['cctv_news'])} 条。")
-        except Exception as e:
-            st.error(f"加载新闻联播数据失败: {e}")
+        else:
+            st.warning("新闻联播数据不存在，请先在“更新新闻联播”中拉取。")
             data['cctv_news'] = pd.DataFrame()
-    else:
-        st.warning("新闻联播数据文件不存在。")
+    except Exception as e:
+        st.error(f"加载新闻联播数据失败: {e}")
         data['cctv_news'] = pd.DataFrame()
 
-    # 日期过滤：仅保留指定日期及以后的数据
-    if user_date:
-        if not data['news'].empty and 'datetime' in data['news'].columns:
-            data['news']['date_str'] = pd.to_datetime(data['news']['datetime'], errors='coerce').dt.strftime('%Y%m%d')
-            data['news'] = data['news'][data['news']['date_str'] >= user_date]
-        if not data['cctv_news'].empty and 'date' in data['cctv_news'].columns:
-            data['cctv_news'] = data['cctv_news'][data['cctv_news']['date'].astype(str) >= user_date]
     st.success("数据加载和日期过滤完成。")
     return data
 
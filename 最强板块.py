@@ -1,15 +1,13 @@
 import streamlit as st
-import tushare as ts
 import pandas as pd
 import datetime as dt
 
+# 所有 Tushare 调用统一经过接口网关（进程内共享限流）
+from 接口网关 import pro
+from 请求对冲 import hedged
 
-def main():
-    # ------------------ 初始化 Tushare 接口 ------------------
-    tushare_token = st.secrets["api_keys"]["tushare_token"]
-    ts.set_token(tushare_token)
-    pro = ts.pro_api()
 
+def main():
     # ------------------ 页面标题 ------------------
     st.title("板块查询")
 
@@ -27,24 +25,25 @@ def main():
         if st.button("查询涨停题材列表", key="btn_limit_cpt_list"):
             try:
                 # 拉取数据
-                df = pro.limit_cpt_list(
-                    trade_date=trade_date_str,
-                    ts_code="",
-                    start_date="",
-                    end_date="",
-                    limit="",
-                    offset="",
-                    fields=[
-                        "ts_code",
-                        "name",
-                        "trade_date",
-                        "days",
-                        "up_stat",
-                        "cons_nums",
-                        "up_nums",
-                        "rank"
-                    ]
-                )
+                with hedged():
+                    df = pro.limit_cpt_list(
+                        trade_date=trade_date_str,
+                        ts_code="",
+                        start_date="",
+                        end_date="",
+                        limit="",
+                        offset="",
+                        fields=[
+                            "ts_code",
+                            "name",
+                            "trade_date",
+                            "days",
+                            "up_stat",
+                            "cons_nums",
+                            "up_nums",
+                            "rank"
+                        ]
+                    )
                 if df.empty:
                     st.info("未查询到数据")
                 else:
@@ -79,14 +78,15 @@ def main():
                 st.info("请先输入题材代码再进行查询。")
             else:
                 try:
-                    df = pro.ths_member(
-                        ts_code=ts_code_input,
-                        fields=[
-                            "ts_code",
-                            "con_code",
-                            "con_name"
-                        ]
-                    )
+                    with hedged():
+                        df = pro.ths_member(
+                            ts_code=ts_code_input,
+                            fields=[
+                                "ts_code",
+                                "con_code",
+                                "con_name"
+                            ]
+                        )
                     if df.empty:
                         st.info("未查询到数据")
                     else:
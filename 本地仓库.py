@@ -0,0 +1,245 @@
+import datetime as dt
+import json
+import logging
+import os
+import threading
+
+import pandas as pd
+
+from 交易日历 import calendar
+from 并发执行 import fan_out, fetch_pages
+
+# ------------------------------------------------------
+# 本地数据仓库：按交易日提供全市场快照的接口（日线、每日指标、资金流、涨停、游资等），
+# 每个数据集按交易日分区存为 Parquet（每个交易日一个文件），每个交易日只需按 trade_date 拉取一次，
+# 之后增量补齐缺少的交易日。批量补齐见 夜间同步.py。
+# 接口网关对能由本地分区回答的请求直接读本地文件，不发出接口调用（见 PartitionStore.lookup）。
+# 较早的交易日返回空结果时也写入空分区（该日确实无数据）；最近 RECENT_EMPTY_DAYS 个交易日返回空则不写，
+# 部分数据集（资金流、游资等）要晚一两天才发布，之后同步时再补。
+# ------------------------------------------------------
+
+WAREHOUSE_DIR = os.path.join("date", "warehouse")
+
+PAGE_LIMIT = 5000          # 按交易日拉取时的分页大小，全市场快照超过单页上限时分页拉取
+LATEST_SCAN_DAYS = 30      # 按代码取最近 N 条时读取的最近分区数
+RECENT_EMPTY_DAYS = 5      # 最近几个交易日返回空结果时不写空分区，以免发布较晚的数据被永久记为空
+
+DAILY_FIELDS = ["ts_code", "trade_date", "open", "high", "low", "close", "pre_close",
+                "change", "pct_chg", "vol", "amount"]
+
+# 数据集（接口名）-> 拉取字段；空字符串表示接口的默认字段
+DATASETS = {
+    "daily": ",".join(DAILY_FIELDS),
+    "daily_basic": "",
+    "moneyflow_ths": "",
+    "limit_list_d": "",
+    "limit_step": "",
+    "hm_detail": "",
+    "kpl_concept": "",
+    "kpl_concept_cons": "",
+    "kpl_list": "",
+    "stk_factor": "",
+    "margin_detail": "",
+    "hk_hold": "",
+}
+
+# 本地分区能够回答的请求参数
+_LOCAL_PARAMS = {"trade_date", "start_date", "end_date", "ts_code", "limit", "offset"}
+
+
+def _field_list(fields):
+    if isinstance(fields, (list, tuple)):
+        return [str(f).strip() for f in fields if str(f).strip()]
+    return [f.strip() for f in str(fields or "").split(",") if f.strip()]
+
+
+class PartitionStore:
+    """
+    单个数据集的按交易日分区存储：
+    read(start, end, codes, columns)  读取窗口内的数据，缺少的交易日先从接口补齐；
+    day(trade_date, columns)          读取单个交易日的全市场数据；
+    sync(start, end)                  只补齐缺少的分区，返回本次新写入的交易日。
+    """
+
+    def __init__(self, dataset, fields="", root=WAREHOUSE_DIR):
+        self.dataset = dataset
+        self.fields = fields
+        self.root = os.path.join(root, dataset)
+
+    def _path(self, trade_date):
+        return os.path.join(self.root, f"{trade_date}.parquet")
+
+    def has(self, trade_date):
+        return os.path.exists(self._path(trade_date))
+
+    def _fetch_day(self, trade_date):
+        # 网关会查本地仓库，延迟导入以免循环引用
+        from 接口网关 import pro
+
+        df = fetch_pages(
+            lambda offset: pro.query(self.dataset, trade_date=trade_date, limit=PAGE_LIMIT,
+                                     offset=offset, fields=self.fields),
+            PAGE_LIMIT,
+            max_in_flight=1,
+        )
+        if df.empty:
+            recent = calendar.last_n(RECENT_EMPTY_DAYS)
+            if not recent or trade_date >= recent[0]:
+                # 最近几天的数据可能尚未发布
+                return False
+        if "ts_code" in df.columns:
+            df = df.sort_values("ts_code").reset_index(drop=True)
+        path = self._path(trade_date)
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        return True
+
+    def sync(self, start, end=None, on_progress=None):
+        missing = [day for day in calendar.window(start, end) if not self.has(day)]
+        if not missing:
+            return []
+        outcome = fan_out(self._fetch_day, missing, default=False, on_progress=on_progress)
+        for index, e in outcome.errors.items():
+            logging.error(f"{self.dataset} 分区 {missing[index]} 拉取失败: {e}")
+        return [day for day, written in zip(missing, outcome.results) if written]
+
+    def _read_paths(self, paths, codes=None, columns=None):
+        """读取多个分区并合并；任一分区读取失败时返回 None"""
+        filters = [("ts_code", "in", list(codes))] if codes is not None else None
+        frames = []
+        for path in paths:
+            try:
+                frames.append(pd.read_parquet(path, columns=columns, filters=filters))
+            except Exception as e:
+                logging.error(f"读取 {self.dataset} 分区 {path} 失败: {e}")
+                return None
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(frames, ignore_index=True)
+
+    def read(self, start, end=None, codes=None, columns=None):
+        """返回窗口内的数据；codes 为空表示全市场，columns 为空表示全部字段"""
+        self.sync(start, end)
+        if columns is not None:
+            columns = list(dict.fromkeys(["ts_code", "trade_date"] + list(columns)))
+        paths = [self._path(day) for day in calendar.window(start, end) if self.has(day)]
+        df = self._read_paths(paths, codes, columns) if paths else None
+        return df if df is not None else pd.DataFrame(columns=columns or _field_list(self.fields))
+
+    def day(self, trade_date, columns=None):
+        return self.read(trade_date, trade_date, columns=columns)
+
+    def stored_columns(self, trade_date):
+        try:
+            import pyarrow.parquet as pq
+            return pq.read_schema(self._path(trade_date)).names
+        except Exception:
+            return None
+
+    def lookup(self, fields, params):
+        """
+        用本地分区回答一次接口请求，分区不全或字段不够时返回 None（由网关照常调用接口）：
+          trade_date=D [ts_code=...]               该交易日的分区已存在
+          start_date=S end_date=E [ts_code=...]    窗口内所有交易日的分区都已存在
+          ts_code=C limit=N                        最近 LATEST_SCAN_DAYS 个交易日的分区都已存在且能找到 N 条
+        带 offset 的分页请求都从同一张排好序的本地表中截取，各页之间不重不漏。
+        """
+        params = {k: v for k, v in params.items() if v is not None and v != ""}
+        if not set(params) <= _LOCAL_PARAMS:
+            return None
+        latest = calendar.latest()
+        if latest is None:
+            return None
+        codes = str(params["ts_code"]).split(",") if "ts_code" in params else None
+        limit = int(params["limit"]) if "limit" in params else None
+        offset = int(params.get("offset") or 0)
+
+        exact = True
+        if "trade_date" in params:
+            days = [str(params["trade_date"])]
+        elif "start_date" in params or "end_date" in params:
+            end = str(params.get("end_date") or latest)
+            if end > latest:
+                return None
+            days = calendar.window(str(params.get("start_date") or end), end)
+        elif codes is not None and len(codes) == 1 and limit is not None:
+            # 按代码取最近 N 条：窗口里找不到 N 条时不能确定更早的数据，交给接口
+            days = calendar.last_n(LATEST_SCAN_DAYS, end=latest)
+            exact = False
+        else:
+            return None
+        if not days or not all(self.has(day) for day in days):
+            return None
+
+        stored = self.stored_columns(days[-1])
+        requested = _field_list(fields)
+        if stored is None or not set(requested) <= set(stored):
+            return None
+        columns = requested or stored
+        read_columns = list(dict.fromkeys(columns + [c for c in ("ts_code", "trade_date") if c in stored]))
+        df = self._read_paths([self._path(day) for day in days], codes, read_columns)
+        if df is None:
+            return None
+        if len(days) > 1 and "trade_date" in df.columns:
+            # 与接口一致：按交易日从新到旧
+            df = df.sort_values("trade_date", ascending=False, kind="stable")
+        if limit is not None:
+            if not exact and len(df) < offset + limit:
+                return None
+            df = df.iloc[offset: offset + limit]
+        elif offset:
+            df = df.iloc[offset:]
+        return df[columns].reset_index(drop=True)
+
+
+class Warehouse:
+    """所有数据集的分区存储，以及各数据集的同步水位（最后一个已完整同步的交易日）"""
+
+    def __init__(self, root=WAREHOUSE_DIR, datasets=None):
+        self.root = root
+        self.stores = {name: PartitionStore(name, fields, root)
+                       for name, fields in (DATASETS if datasets is None else datasets).items()}
+        self.watermark_file = os.path.join(root, "watermarks.json")
+        self._lock = threading.Lock()
+
+    def get(self, dataset):
+        return self.stores[dataset]
+
+    def lookup(self, api_name, fields, params):
+        store = self.stores.get(api_name)
+        if store is None:
+            return None
+        try:
+            return store.lookup(fields, params)
+        except Exception as e:
+            logging.error(f"本地仓库读取 {api_name} 失败，改为调用接口: {e}")
+            return None
+
+    def watermarks(self):
+        try:
+            with open(self.watermark_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logging.error(f"读取同步水位失败: {e}")
+            return {}
+
+    def set_watermark(self, dataset, trade_date):
+        with self._lock:
+            marks = self.watermarks()
+            marks[dataset] = {"watermark": trade_date,
+                              "synced_at": dt.datetime.now().isoformat(timespec="seconds")}
+            os.makedirs(self.root, exist_ok=True)
+            tmp_path = f"{self.watermark_file}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(marks, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.watermark_file)
+
+
+# 进程级共享实例
+warehouse = Warehouse()
+daily_bars = warehouse.get("daily")
@@ -1,29 +1,26 @@
-import tushare as ts
 import pandas as pd
 import streamlit as st
 
 # 设置 Pandas 显示选项，确保完整显示内容
 pd.set_option('display.max_colwidth', None)
 
-# 从 secrets.toml 文件中读取 Tushare API Token
-tushare_token = st.secrets["api_keys"]["tushare_token"]
-
-# 设置 Tushare API Token
-ts.set_token(tushare_token)
-pro = ts.pro_api()
+# 所有 Tushare 调用统一经过接口网关（进程内共享限流）
+from 接口网关 import pro
+from 请求对冲 import hedged
 
 
 # 拉取数据，只使用日期范围查询
 def fetch_data(ts_code, hm_name, start_date, end_date, limit, offset=0):
-    df = pro.hm_detail(
-        ts_code=ts_code,
-        hm_name=hm_name,
-        start_date=start_date,
-        end_date=end_date,
-        limit=limit,
-        offset=offset,
-        fields=["trade_date", "ts_code", "ts_name", "buy_amount", "sell_amount", "net_amount", "hm_name"]
-    )
+    with hedged():
+        df = pro.hm_detail(
+            ts_code=ts_code,
+            hm_name=hm_name,
+            start_date=start_date,
+            end_date=end_date,
+            limit=limit,
+            offset=offset,
+            fields=["trade_date", "ts_code", "ts_name", "buy_amount", "sell_amount", "net_amount", "hm_name"]
+        )
     return df
 
 
@@ -1,20 +1,13 @@
-import tushare as ts
 import pandas as pd
-import datetime as dt
 import os
 import logging
-import sys
-import time
-from tqdm import tqdm  # tqdm 在后台调用，界面上使用 Streamlit 的进度条
 import streamlit as st
 
 # ------------------- 全局设置 -------------------
-# 从 secrets.toml 文件中读取 Tushare API Token
-tushare_token = st.secrets["api_keys"]["tushare_token"]
-
-# 设置 Tushare API Token
-ts.set_token(tushare_token)
-pro = ts.pro_api()
+# 所有 Tushare 调用统一经过接口网关（进程内共享限流）
+from 接口网关 import pro
+from 交易日历 import calendar
+from 股票池 import pool_name, pools
 
 # 配置日志（错误信息写入 error.log）
 logging.basicConfig(filename='error.log', level=logging.ERROR,
@@ -30,87 +23,15 @@ use_institution_filter = False  # 全局变量，是否启用机构过滤
 
 # ------------------- 工具函数 -------------------
 
-def get_latest_trade_date():
-    """获取今天是否为交易日，如果是返回今天，否则返回 None"""
-    today = dt.datetime.today().strftime('%Y%m%d')
-    try:
-        df = pro.trade_cal(start_date=today, end_date=today, fields='cal_date,is_open')
-        if df.empty or df.iloc[0]['is_open'] == 0:
-            return None
-        return today
-    except Exception as e:
-        logging.error(f"获取交易日期失败: {e}")
-        return None
-
-
-def rollback_date(latest_trade_date, max_retries=7):
-    """
-    回溯找前一个交易日，如果最新交易日获取失败，则往前找（最多 max_retries 次）
-    """
-    end_date = dt.datetime.strptime(latest_trade_date, "%Y%m%d")
-    for _ in range(max_retries):
-        end_date -= dt.timedelta(days=1)
-        rollback_date_str = end_date.strftime("%Y%m%d")
-        try:
-            df = pro.trade_cal(start_date=rollback_date_str, end_date=rollback_date_str, fields='cal_date,is_open')
-            if not df.empty and df.iloc[0]['is_open'] == 1:
-                return rollback_date_str
-        except Exception as e:
-            logging.error(f"获取交易日历时出错: {e}")
-    return None
-
-
 def save_selected_stocks(selected_ts_codes, file_name):
-    """将选中的股票代码保存到指定文件中"""
-    # 设置文件路径为相对路径的 'date' 文件夹
-    file_path = os.path.join("date", file_name)
-
-    # 确保 'date' 文件夹存在
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-
+    """将选中的股票代码保存为股票池快照，并写出 date/ 下的同名文件（见 股票池.py）"""
     try:
-        with open(file_path, "w", encoding='utf-8') as file:
-            for ts_code in selected_ts_codes:
-                file.write(f"{ts_code}\n")
+        file_path = pools.save(pool_name(file_name), selected_ts_codes)
         logging.info(f"选定的股票代码已成功保存到: {file_path}")
     except Exception as e:
         logging.error(f"保存选定股票代码时出错: {e}")
 
 
-def get_trade_calendar(required_days):
-    """
-    获取足够的交易日历（跨年度），返回交易日字符串列表
-    """
-    today = dt.datetime.today()
-    today_str = today.strftime('%Y%m%d')
-    all_cal_dates = set()
-    current_year = today.year
-    years_back = 2  # 回溯2年
-    for year in range(current_year, current_year - years_back, -1):
-        start_of_year = dt.datetime(year, 1, 1).strftime('%Y%m%d')
-        try:
-            df = pro.trade_cal(exchange='', start_date=start_of_year, end_date=today_str, fields='cal_date,is_open')
-            df = df[(df['is_open'] == 1) & (df['cal_date'] <= today_str)]
-            all_cal_dates.update(df['cal_date'].tolist())
-        except Exception as e:
-            logging.error(f"获取交易日历 for year {year} 时出错: {e}")
-            sys.exit()
-    all_cal_dates = sorted(all_cal_dates)
-    if len(all_cal_dates) < required_days:
-        logging.error(f"交易日历不足 {required_days} 天。")
-        sys.exit()
-    return all_cal_dates
-
-
-def get_last_n_trading_days(available_days, n=10):
-    """从 available_days 中取出最后 n 个交易日"""
-    if len(available_days) < n:
-        logging.error(f"可用交易日数量不足 {n} 天。")
-        sys.exit()
-    selected_days = available_days[-n:]
-    return selected_days
-
-
 def split_list(lst, n):
     """将列表 lst 按每组 n 个元素分割"""
     for i in range(0, len(lst), n):
@@ -135,7 +56,7 @@ def fetch_hm_detail_by_days(dates, batch_size=500):
                         ts_code_str = ','.join(batch)
                         try:
                             df_batch = pro.hm_detail(start_date=d, end_date=d, ts_code=ts_code_str,
-                                                     fields=["ts_code", "hm_name", "net_amount"])
+                                                     fields=["ts_code", "hm_name", "trade_date", "net_amount"])
                             if df_batch is not None and not df_batch.empty:
                                 all_data = pd.concat([all_data, df_batch], ignore_index=True)
                         except Exception as e:
@@ -198,9 +119,7 @@ def main():
     if st.button("开始分析"):
         # 1. 获取最新交易日期
         with st.spinner("正在获取最新交易日期..."):
-            latest_trade_date = get_latest_trade_date()
-        if not latest_trade_date:
-            latest_trade_date = rollback_date(dt.datetime.today().strftime('%Y%m%d'))
+            latest_trade_date = calendar.latest()
         if not latest_trade_date:
             st.error("无法获取最新的交易日期，程序退出。")
             return
@@ -216,7 +135,7 @@ def main():
                 break
             else:
                 st.warning(f"{current_day} 的数据为空，正在回撤到前一个交易日...")
-                new_day = rollback_date(current_day, max_retries=1)
+                new_day = calendar.prev(current_day)
                 if new_day is None:
                     st.error("无法回撤到有数据的交易日，程序退出。")
                     return
@@ -257,7 +176,7 @@ def main():
         for code in selected_ts_codes_by_institutions:
             ts_name = ts_name_dict.get(code, "未知名称")
             trade_dates = filtered_data[filtered_data['ts_code'] == code]['trade_date'].unique()
-            trade_dates_str = ', '.join(trade_dates) if len(trade_dates) > 0 else '无日期信息'
+            trade_dates_str = ', '.join(map(str, trade_dates)) if len(trade_dates) > 0 else '无日期信息'
             hm_names = filtered_data[filtered_data['ts_code'] == code]['hm_name'].unique()
             hm_names_str = ', '.join(hm_names) if len(hm_names) > 0 else "无游资信息"
             sum_net_amount_all = int(hm_data[hm_data['ts_code'] == code]['net_amount'].sum() / 10_000)
@@ -283,10 +202,7 @@ def main():
         file_path = os.path.join("date", file_name)
         final_ts_codes = results_df['ts_code'].tolist()
         try:
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            with open(file_path, "w", encoding='utf-8') as file:
-                for ts_code in final_ts_codes:
-                    file.write(f"{ts_code}\n")
+            pools.save("游资", final_ts_codes)
             st.success(f"已将筛选结果保存到 {file_path}")
         except Exception as e:
             logging.error(f"保存选定股票代码时出错: {e}")
@@ -0,0 +1,273 @@
+import datetime as dt
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from 本地仓库 import WAREHOUSE_DIR
+from 证券索引 import securities
+
+# ------------------------------------------------------
+# 股票池存储：date/ 下的各个股票池（股东、成分股、涨停板、RSI选股、游资、扣非、机构调研）
+# 每次保存都按日期记一份快照，快照是证券索引（见 证券索引.py）上的位图，np.packbits 后 zlib 压缩存入 SQLite。
+#   save(name, codes, day)     保存快照（同一天重复保存覆盖当天的快照），并照旧写出 date/<name>.txt 供下载、外部使用
+#   bitmap(name, day)          取 day 当天或之前最近一次快照的位图，day 为空取最新；同一进程内按快照缓存解压结果
+#   evaluate(expr, day)        计算股票池表达式，返回按编号升序的证券编号数组，例如：
+#                                (成分股 | 涨停板 | RSI选股) & 股东 - 扣非
+#                              运算符优先级与 Python 集合一致：- 高于 &，& 高于 |；股票池名也可以写成文件路径 date/游资.txt，
+#                              不在 date/ 下的文件（如桌面上的股票池）直接读取文件内容。
+#                              名称中间的 - 属于名称（如 游资-0301.txt），写在名称开头才是差集运算符；
+#                              名称含空格、括号或运算符时用引号括起来："~/Desktop/my pool.txt"
+#   load(token, day)           读取单个股票池（名称或文件路径），不经过表达式解析
+# 文本文件比最新快照新（还没有快照、git pull 或手工修改过）时，读取前先把文件导入为一次快照，快照日期取文件的修改日期。
+# ------------------------------------------------------
+
+POOL_DB_PATH = os.path.join(WAREHOUSE_DIR, "pools.sqlite3")
+POOL_DIR = "date"
+
+BUSY_TIMEOUT_SECONDS = 30
+
+# 依次为：双引号名称、单引号名称、运算符、不加引号的名称（不以 - 开头，中间可以含 -）
+_TOKEN_PATTERN = re.compile(r"""\s*(?:"([^"]*)"|'([^']*)'|([()|&\-])|([^\s()|&\-][^\s()|&]*))""")
+
+
+def pool_name(token):
+    """表达式或输入框中的股票池名：date/游资.txt、游资.txt、游资 都指同一个股票池"""
+    return os.path.splitext(os.path.basename(token.strip()))[0]
+
+
+def _read_text_pool(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def _parse(expr):
+    """把表达式解析为嵌套元组：("pool", 名称) 或 (运算符, 左, 右)"""
+    tokens = []
+    position = 0
+    expr = expr.strip()
+    while position < len(expr):
+        match = _TOKEN_PATTERN.match(expr, position)
+        if match is None or match.end() == position:
+            raise ValueError(f"股票池表达式无法解析：{expr[position:]}")
+        quoted = match.group(1) if match.group(1) is not None else match.group(2)
+        if quoted is not None:
+            tokens.append(("pool", quoted))
+        else:
+            tokens.append(match.group(3) or ("pool", match.group(4)))
+        position = match.end()
+    if not tokens:
+        raise ValueError("股票池表达式为空")
+
+    def binary(level, index):
+        operators = ("|", "&", "-")
+        if level == len(operators):
+            return atom(index)
+        left, index = binary(level + 1, index)
+        while index < len(tokens) and tokens[index] == operators[level]:
+            right, index = binary(level + 1, index + 1)
+            left = (operators[level], left, right)
+        return left, index
+
+    def atom(index):
+        if index >= len(tokens):
+            raise ValueError(f"股票池表达式不完整：{expr}")
+        token = tokens[index]
+        if token == "(":
+            node, index = binary(0, index + 1)
+            if index >= len(tokens) or tokens[index] != ")":
+                raise ValueError(f"股票池表达式缺少右括号：{expr}")
+            return node, index + 1
+        if isinstance(token, tuple):
+            return token, index + 1
+        raise ValueError(f"股票池表达式中多余的运算符“{token}”：{expr}")
+
+    node, index = binary(0, 0)
+    if index != len(tokens):
+        raise ValueError(f"股票池表达式中多余的内容：{expr}")
+    return node
+
+
+class PoolStore:
+    """
+    按日期保存的股票池快照。位图长度为保存时证券索引的大小，读取时按当前大小补齐，
+    不同时间保存的快照可以直接按位运算。
+    """
+
+    def __init__(self, path=POOL_DB_PATH, pool_dir=POOL_DIR):
+        self.path = path
+        self.pool_dir = pool_dir
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._decoded = {}
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    pool TEXT NOT NULL, day TEXT NOT NULL, size INTEGER NOT NULL, n_bits INTEGER NOT NULL,
+                    bitmap BLOB NOT NULL, saved_at REAL NOT NULL, PRIMARY KEY (pool, day))
+            """)
+            self._local.conn = conn
+        return conn
+
+    def text_path(self, name):
+        return os.path.join(self.pool_dir, f"{name}.txt")
+
+    # ---------------- 写入 ----------------
+    def _write_snapshot(self, name, ids, day):
+        n_bits = len(securities)
+        bits = np.zeros(n_bits, dtype=bool)
+        bits[ids] = True
+        blob = zlib.compress(np.packbits(bits).tobytes())
+        self._connect().execute(
+            "INSERT OR REPLACE INTO snapshots (pool, day, size, n_bits, bitmap, saved_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (name, day, int(len(ids)), n_bits, blob, time.time()),
+        )
+
+    def save(self, name, codes, day=None):
+        """保存股票池快照并写出文本文件，返回写出的文件路径"""
+        codes = [str(code).strip() for code in codes if str(code).strip()]
+        day = day or dt.date.today().strftime("%Y%m%d")
+        path = self.text_path(name)
+        os.makedirs(self.pool_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for code in dict.fromkeys(codes):
+                f.write(f"{code}\n")
+        os.replace(tmp_path, path)
+        # 先写文件再记快照，快照的保存时刻不早于文件的修改时刻，读取时不会再重复导入
+        self._write_snapshot(name, securities.to_ids(codes), day)
+        return path
+
+    def _import_text(self, name):
+        """文本文件比最新快照新时（还没有快照或文件在外部被修改过）把文件导入为一次快照"""
+        path = self.text_path(name)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return False
+        latest = self._connect().execute("SELECT MAX(saved_at) FROM snapshots WHERE pool=?", (name,)).fetchone()[0]
+        if latest is not None and mtime <= latest:
+            return False
+        day = dt.date.fromtimestamp(mtime).strftime("%Y%m%d")
+        try:
+            self._write_snapshot(name, securities.to_ids(_read_text_pool(path)), day)
+        except Exception as e:
+            logging.error(f"导入股票池文件 {path} 失败: {e}")
+            return False
+        return True
+
+    # ---------------- 读取 ----------------
+    def _snapshot_key(self, name, day):
+        conn = self._connect()
+        query = "SELECT day, saved_at FROM snapshots WHERE pool=?"
+        params = [name]
+        if day:
+            query += " AND day<=?"
+            params.append(str(day))
+        return conn.execute(query + " ORDER BY day DESC LIMIT 1", params).fetchone()
+
+    def bitmap(self, name, day=None):
+        """返回股票池在 day 当天或之前最近一次快照的位图（长度为当前证券索引大小），没有快照时返回 None"""
+        self._import_text(name)
+        key = self._snapshot_key(name, day)
+        if key is None:
+            return None
+        n_bits = len(securities)
+        with self._lock:
+            cached = self._decoded.get((name, key[0]))
+        if cached is None or cached[0] != key[1]:
+            blob, stored_bits = self._connect().execute(
+                "SELECT bitmap, n_bits FROM snapshots WHERE pool=? AND day=?", (name, key[0])).fetchone()
+            bits = np.unpackbits(np.frombuffer(zlib.decompress(blob), dtype=np.uint8), count=stored_bits).astype(bool)
+            cached = (key[1], bits)
+            with self._lock:
+                self._decoded[(name, key[0])] = cached
+        bits = cached[1]
+        if len(bits) < n_bits:
+            bits = np.concatenate([bits, np.zeros(n_bits - len(bits), dtype=bool)])
+        return bits
+
+    def ids(self, name, day=None):
+        bits = self.bitmap(name, day)
+        return np.empty(0, dtype=np.int32) if bits is None else np.flatnonzero(bits).astype(np.int32)
+
+    def codes(self, name, day=None):
+        return list(securities.codes(self.ids(name, day)))
+
+    def history(self, name):
+        """股票池各次快照的日期与股票数"""
+        rows = self._connect().execute(
+            "SELECT day, size FROM snapshots WHERE pool=? ORDER BY day", (name,)).fetchall()
+        return pd.DataFrame(rows, columns=["日期", "股票数"])
+
+    def _is_snapshot_token(self, token):
+        """不带目录的名称、date/ 下的文件按快照名处理，其他位置的文件按文件读取"""
+        directory = os.path.dirname(token)
+        return not directory or os.path.abspath(directory) == os.path.abspath(self.pool_dir)
+
+    def exists(self, token):
+        """股票池（名称或文件路径）是否存在"""
+        if not self._is_snapshot_token(token):
+            return os.path.isfile(token)
+        name = pool_name(token)
+        return self._snapshot_key(name, None) is not None or os.path.exists(self.text_path(name))
+
+    def _operand(self, token, day):
+        token = token.strip()
+        if not self._is_snapshot_token(token):
+            # 不在 date/ 下的文本文件（如桌面上的股票池）直接读取，不保存快照
+            if not os.path.isfile(token):
+                raise ValueError(f"股票池“{token}”不存在")
+            ids = securities.to_ids(_read_text_pool(token))
+            bits = np.zeros(len(securities), dtype=bool)
+            bits[ids] = True
+            return bits
+        name = pool_name(token)
+        bits = self.bitmap(name, day)
+        if bits is not None:
+            return bits
+        if day and self._snapshot_key(name, None) is not None:
+            # 股票池在 day 之后才第一次保存：当时为空
+            return np.zeros(len(securities), dtype=bool)
+        raise ValueError(f"股票池“{token}”不存在")
+
+    def load(self, token, day=None):
+        """读取单个股票池（名称或文件路径），返回按编号升序的证券编号数组；不存在时抛出 ValueError"""
+        return np.flatnonzero(self._operand(token, day)).astype(np.int32)
+
+    def evaluate(self, expr, day=None):
+        """计算股票池表达式，返回按编号升序的证券编号数组"""
+        operands = {}
+
+        def walk(node):
+            if node[0] == "pool":
+                if node[1] not in operands:
+                    operands[node[1]] = self._operand(node[1], day)
+                return operands[node[1]]
+            left, right = walk(node[1]), walk(node[2])
+            size = max(len(left), len(right))
+            left = np.pad(left, (0, size - len(left)))
+            right = np.pad(right, (0, size - len(right)))
+            if node[0] == "|":
+                return left | right
+            if node[0] == "&":
+                return left & right
+            return left & ~right
+
+        return np.flatnonzero(walk(_parse(expr))).astype(np.int32)
+
+
+# 进程级共享实例
+pools = PoolStore()
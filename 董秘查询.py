@@ -1,13 +1,9 @@
 import streamlit as st
-import tushare as ts
 import pandas as pd
 
-# 从 secrets.toml 文件中读取 Tushare API Token
-tushare_token = st.secrets["api_keys"]["tushare_token"]
-
-# 设置 Tushare API Token
-ts.set_token(tushare_token)
-pro = ts.pro_api()
+# 所有 Tushare 调用统一经过接口网关（进程内共享限流）
+from 接口网关 import pro
+from 请求对冲 import hedged
 
 
 def get_qa_sz(ts_code, trade_date):
@@ -15,11 +11,12 @@ def get_qa_sz(ts_code, trade_date):
     调用接口获取深圳数据，字段包括：ts_code, name, q, a, pub_time
     """
     try:
-        df = pro.irm_qa_sz(
-            ts_code=ts_code,
-            trade_date=trade_date,
-            fields="ts_code,name,q,a,pub_time"
-        )
+        with hedged():
+            df = pro.irm_qa_sz(
+                ts_code=ts_code,
+                trade_date=trade_date,
+                fields="ts_code,name,q,a,pub_time"
+            )
         df.rename(columns={
             'ts_code': '股票代码',
             'name': '股票名称',
@@ -38,11 +35,12 @@ def get_qa_sh(ts_code, trade_date):
     调用接口获取上海数据，字段包括：ts_code, name, q, a, pub_time
     """
     try:
-        df = pro.irm_qa_sh(
-            ts_code=ts_code,
-            trade_date=trade_date,
-            fields="ts_code,name,q,a,pub_time"
-        )
+        with hedged():
+            df = pro.irm_qa_sh(
+                ts_code=ts_code,
+                trade_date=trade_date,
+                fields="ts_code,name,q,a,pub_time"
+            )
         df.rename(columns={
             'ts_code': '股票代码',
             'name': '股票名称',
@@ -0,0 +1,245 @@
+import contextlib
+import json
+import logging
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，只做进程内互斥
+    fcntl = None
+
+import numpy as np
+import pandas as pd
+
+from 交易日历 import calendar
+from 本地仓库 import WAREHOUSE_DIR, daily_bars
+from 证券索引 import MISSING, securities
+
+# ------------------------------------------------------
+# 行情面板：收盘价、成交量、涨跌幅等按 股票 × 交易日 存成稠密的 float32 文件，通过 np.memmap 访问。
+# 所有会话、所有进程映射同一份文件，操作系统页缓存共享，不各自构建 DataFrame。
+#   meta.json    行数、交易日列表（列号，升序）、行容量；行号即证券索引中的编号（见 证券索引.py），只增不改
+#   <字段>.f32   按交易日连续存放：每个交易日一段 capacity 个 float32，缺失为 NaN
+# 追加一个交易日只在文件末尾写入一段；面板视图是 (交易日 × 容量) 数组转置后的 (股票 × 交易日) 视图，不复制。
+# 新上市股票在证券索引中追加编号即追加行；行数超过容量时按两倍容量重写一次文件（很少发生）。
+# 数据来自本地数据仓库的日线分区，sync() 把仓库中比面板更新的交易日依次追加进来。
+# 夜间同步和各个 Streamlit 进程都会调用 sync()，写入期间持有 panels.lock 文件锁，拿到锁后重新读取 meta。
+# ------------------------------------------------------
+
+PANEL_DIR = os.path.join(WAREHOUSE_DIR, "panels")
+PANEL_FIELDS = ["close", "vol", "pct_chg", "amount"]
+INITIAL_CAPACITY = 8192
+LAYOUT = "security_id"     # 行号的含义；与磁盘上的面板不一致时重建
+
+
+class Panel:
+    """
+    只读面板：values 为 (证券编号 × 交易日) 的 float32 视图，dates 为列标签。
+    rows(codes) 返回各代码的行号数组（不在面板内为 -1），row(ts_code)、column(trade_date) 返回单个行号、列号（不存在时为 None）。
+    """
+
+    def __init__(self, field, n_rows, dates, data):
+        self.field = field
+        self.n_rows = n_rows
+        self.dates = np.asarray(dates)
+        self._cols = {date: index for index, date in enumerate(dates)}
+        self.values = data[:, :n_rows].T
+
+    def rows(self, codes):
+        ids = securities.ids(codes, assign=False)
+        ids[ids >= self.n_rows] = MISSING
+        return ids
+
+    def row(self, ts_code):
+        index = int(self.rows([ts_code])[0])
+        return None if index == MISSING else index
+
+    def column(self, trade_date):
+        return self._cols.get(trade_date)
+
+    def window(self, start, end=None):
+        """返回 [start, end] 内交易日的列号切片"""
+        lo = int(np.searchsorted(self.dates, start, side="left"))
+        hi = int(np.searchsorted(self.dates, end, side="right")) if end else len(self.dates)
+        return slice(lo, hi)
+
+
+class PanelStore:
+    """
+    open(field)：映射某个字段的面板（同一进程内按 meta 的修改时间复用映射）；
+    frame(fields, codes, start, end)：按股票、交易日展开为长表，便于沿用按 DataFrame 的筛选逻辑；
+    sync()：把本地数据仓库中比面板更新的日线分区追加进来，返回追加的交易日。
+    """
+
+    def __init__(self, root=PANEL_DIR, fields=PANEL_FIELDS, source=daily_bars):
+        self.root = root
+        self.fields = list(fields)
+        self.source = source
+        self.meta_file = os.path.join(root, "meta.json")
+        self.lock_file = os.path.join(root, "panels.lock")
+        self._opened = {}
+        self._lock = threading.Lock()
+
+    # ---------------- 读取 ----------------
+    def _path(self, field):
+        return os.path.join(self.root, f"{field}.f32")
+
+    def _load_meta(self):
+        try:
+            with open(self.meta_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return self._empty_meta()
+
+    @staticmethod
+    def _empty_meta():
+        return {"layout": LAYOUT, "rows": 0, "dates": [], "capacity": INITIAL_CAPACITY}
+
+    def open(self, field):
+        try:
+            stamp = os.stat(self.meta_file).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            cached = self._opened.get(field)
+            if cached is not None and cached[0] == stamp:
+                return cached[1]
+            meta = self._load_meta()
+            if not meta["dates"] or meta.get("layout") != LAYOUT:
+                return None
+            data = np.memmap(self._path(field), dtype=np.float32, mode="r",
+                             shape=(len(meta["dates"]), meta["capacity"]))
+            panel = Panel(field, meta["rows"], meta["dates"], data)
+            self._opened[field] = (stamp, panel)
+            return panel
+
+    def frame(self, fields, codes, start, end=None):
+        """返回 ts_code、trade_date 与各字段组成的长表；第一个字段为 NaN 的行（停牌、未上市）不返回"""
+        panels = [self.open(field) for field in fields]
+        if any(panel is None for panel in panels):
+            return pd.DataFrame(columns=["ts_code", "trade_date"] + list(fields))
+        base = panels[0]
+        cols = base.window(start, end)
+        codes = np.asarray(list(codes), dtype=object)
+        rows = base.rows(codes)
+        found = rows != MISSING
+        if not found.any() or cols.start >= cols.stop:
+            return pd.DataFrame(columns=["ts_code", "trade_date"] + list(fields))
+        rows = rows[found]
+        dates = np.asarray(base.dates[cols])
+        data = {
+            "ts_code": np.repeat(codes[found], len(dates)),
+            "trade_date": np.tile(dates, len(rows)),
+        }
+        for field, panel in zip(fields, panels):
+            data[field] = panel.values[rows, cols].reshape(-1)
+        df = pd.DataFrame(data)
+        return df[df[fields[0]].notna()].reset_index(drop=True)
+
+    # ---------------- 写入 ----------------
+    def _write_meta(self, meta):
+        tmp_path = f"{self.meta_file}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, self.meta_file)
+
+    def _grow(self, meta, capacity):
+        """行容量不够时按新容量重写所有字段文件"""
+        n_dates = len(meta["dates"])
+        for field in self.fields:
+            path = self._path(field)
+            old = np.fromfile(path, dtype=np.float32).reshape(n_dates, meta["capacity"]) if n_dates else None
+            new = np.full((n_dates, capacity), np.nan, dtype=np.float32)
+            if old is not None:
+                new[:, :meta["capacity"]] = old
+            tmp_path = f"{path}.tmp"
+            new.tofile(tmp_path)
+            os.replace(tmp_path, path)
+        meta["capacity"] = capacity
+
+    def append_day(self, trade_date, df, meta):
+        """把一个交易日的日线追加为各字段文件的最后一段；meta 在全部写完后由调用方落盘"""
+        if meta["dates"] and trade_date <= meta["dates"][-1]:
+            return False
+        rows = securities.ids(df["ts_code"])
+        valid = rows != MISSING
+        rows = rows[valid].astype(np.int64)
+        n_rows = max(meta["rows"], int(rows.max()) + 1 if len(rows) else 0)
+        if n_rows > meta["capacity"]:
+            capacity = meta["capacity"]
+            while n_rows > capacity:
+                capacity *= 2
+            self._grow(meta, capacity)
+        meta["rows"] = n_rows
+        for field in self.fields:
+            column = np.full(meta["capacity"], np.nan, dtype=np.float32)
+            if field in df.columns:
+                values = pd.to_numeric(df[field], errors="coerce").to_numpy(dtype=np.float32)
+                column[rows] = values[valid]
+            path = self._path(field)
+            # 上次追加中途失败时文件末尾可能多出半截数据，先截回 meta 记录的长度
+            with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+                f.truncate(len(meta["dates"]) * meta["capacity"] * 4)
+                f.seek(0, os.SEEK_END)
+                column.tofile(f)
+        meta["dates"].append(trade_date)
+        return True
+
+    @contextlib.contextmanager
+    def _exclusive(self):
+        """跨进程互斥：进程内用线程锁，进程间用 panels.lock 上的 flock"""
+        os.makedirs(self.root, exist_ok=True)
+        with self._lock, open(self.lock_file, "a") as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def sync(self):
+        """从面板最后一个交易日的下一个交易日起，按交易日连续追加本地数据仓库中的日线分区"""
+        with self._exclusive():
+            # 其他进程可能刚追加过，拿到锁后重新读取 meta
+            meta = self._load_meta()
+            if meta.get("layout") != LAYOUT:
+                # 旧版面板按各自的代码列表编行号，改为证券编号后从头重建
+                meta = self._empty_meta()
+                for field in self.fields:
+                    if os.path.exists(self._path(field)):
+                        os.remove(self._path(field))
+            last = meta["dates"][-1] if meta["dates"] else ""
+            stored = sorted(
+                name[:-len(".parquet")] for name in os.listdir(self.source.root)
+                if name.endswith(".parquet") and name[:-len(".parquet")] > last
+            ) if os.path.isdir(self.source.root) else []
+            if not stored:
+                return []
+            # 只追加连续的交易日：从面板最后一个交易日的下一个交易日开始，缺分区时停在缺口之前，等补齐后再继续
+            first = calendar.next(last) if last else stored[0]
+            if first is None or first > stored[-1]:
+                return []
+            stored_set = set(stored)
+            days = []
+            for day in calendar.window(first, stored[-1]):
+                if day not in stored_set:
+                    break
+                days.append(day)
+            appended = []
+            for day in days:
+                try:
+                    df = pd.read_parquet(self.source._path(day), columns=["ts_code"] + self.fields)
+                except Exception as e:
+                    logging.error(f"读取日线分区 {day} 失败，面板停在 {last}: {e}")
+                    break
+                if self.append_day(day, df, meta):
+                    appended.append(day)
+            if appended:
+                self._write_meta(meta)
+            return appended
+
+
+# 进程级共享实例
+panels = PanelStore()
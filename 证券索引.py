@@ -0,0 +1,157 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+from functools import reduce
+
+import numpy as np
+
+from 本地仓库 import WAREHOUSE_DIR
+
+# ------------------------------------------------------
+# 证券索引：ts_code ↔ int32 编号的持久化映射，所有进程共用同一份 SQLite 文件。
+# 编号按首次出现的顺序从 0 开始分配，只增不改，退市的代码也保留编号，编号永不复用；
+# 行情面板的行号、股票池、成分矩阵等都以编号为键，集合运算和关联变成整数数组运算：
+#   股票池    按编号升序去重的 int32 数组（to_ids），并、交用 union / intersect（np.union1d / np.intersect1d）
+#   过滤      np.isin(securities.ids(df["ts_code"]), pool)
+# refresh() 按 stock_basic 的全部代码（上市、退市、暂停上市）预先分配编号；
+# 其他来源出现的新代码（指数、板块等）在首次查询时追加编号。不像证券代码的字符串（如表头）不分配编号，返回 -1。
+# 其他进程追加的编号在查询时按需读入：遇到内存中没有的编号或代码时先从 SQLite 重新读取再回答。
+# ------------------------------------------------------
+
+SECURITY_INDEX_PATH = os.path.join(WAREHOUSE_DIR, "security_index.sqlite3")
+
+BUSY_TIMEOUT_SECONDS = 30
+MISSING = -1
+
+_CODE_PATTERN = re.compile(r"^[0-9A-Z]{4,}\.[A-Z]{2,}$")
+
+
+class SecurityIndex:
+    """
+    ids(codes, assign=True)  代码 -> int32 编号数组，未知代码按需追加编号（assign=False 时为 -1）；
+    codes(ids)               编号 -> 代码数组（-1 为 None，重新读取后仍不存在的编号抛出 ValueError）；
+    to_ids(codes)            代码集合 -> 按编号升序去重的 int32 数组，作为股票池的标准表示。
+    """
+
+    def __init__(self, path=SECURITY_INDEX_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._codes = []
+        self._ids = {}
+        self._ready = False
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS securities (id INTEGER PRIMARY KEY, ts_code TEXT NOT NULL UNIQUE)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def _load(self, conn):
+        """读入比内存中更新的编号（其他进程可能已追加）；调用方持有 self._lock"""
+        rows = conn.execute("SELECT id, ts_code FROM securities WHERE id >= ? ORDER BY id",
+                            (len(self._codes),)).fetchall()
+        for sid, code in rows:
+            self._codes.append(code)
+            self._ids[code] = sid
+
+    def _assign(self, new_codes):
+        """在 BEGIN IMMEDIATE 事务内给新代码追加编号，多进程之间互斥"""
+        conn = self._connect()
+        with self._lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._load(conn)
+                next_id = len(self._codes)
+                for code in new_codes:
+                    if code not in self._ids:
+                        conn.execute("INSERT INTO securities (id, ts_code) VALUES (?, ?)", (next_id, code))
+                        next_id += 1
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            self._load(conn)
+
+    def _ensure_loaded(self):
+        if not self._ready:
+            conn = self._connect()
+            with self._lock:
+                self._load(conn)
+                self._ready = True
+
+    def _reload(self):
+        """读入其他进程追加的编号"""
+        conn = self._connect()
+        with self._lock:
+            self._load(conn)
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self._codes)
+
+    def ids(self, codes, assign=True):
+        self._ensure_loaded()
+        codes = [str(code).strip() for code in codes]
+        if assign:
+            new_codes = [code for code in dict.fromkeys(codes)
+                         if code not in self._ids and _CODE_PATTERN.match(code)]
+            if new_codes:
+                try:
+                    self._assign(new_codes)
+                except Exception as e:
+                    logging.error(f"证券索引分配编号失败: {e}")
+        elif any(code not in self._ids and _CODE_PATTERN.match(code) for code in codes):
+            # 可能是其他进程刚分配的编号
+            self._reload()
+        get = self._ids.get
+        return np.fromiter((get(code, MISSING) for code in codes), dtype=np.int32, count=len(codes))
+
+    def codes(self, ids):
+        self._ensure_loaded()
+        ids = np.asarray(ids).tolist()
+        if any(i >= len(self._codes) for i in ids):
+            self._reload()
+        known = self._codes
+        unresolved = [i for i in ids if i != MISSING and not 0 <= i < len(known)]
+        if unresolved:
+            raise ValueError(f"证券编号 {unresolved[:5]} 不在证券索引中")
+        return np.array([None if i == MISSING else known[i] for i in ids], dtype=object)
+
+    def to_ids(self, codes):
+        ids = self.ids(codes)
+        return np.unique(ids[ids != MISSING])
+
+    def refresh(self):
+        """按 stock_basic 的全部代码预先分配编号，首次建立索引时按代码排序，编号与代码顺序一致"""
+        from 接口网关 import pro
+
+        frames = [pro.stock_basic(exchange='', list_status=status, fields='ts_code')
+                  for status in ("L", "D", "P")]
+        codes = sorted({code for df in frames if df is not None for code in df["ts_code"]})
+        self.ids(codes)
+        return len(self)
+
+
+def union(*pools):
+    """多个股票池（编号数组）的并集"""
+    return reduce(np.union1d, pools, np.empty(0, dtype=np.int32)).astype(np.int32)
+
+
+def intersect(*pools):
+    """多个股票池（编号数组）的交集；没有传入股票池时为空"""
+    if not pools:
+        return np.empty(0, dtype=np.int32)
+    return reduce(np.intersect1d, pools).astype(np.int32)
+
+
+# 进程级共享实例
+securities = SecurityIndex()
@@ -0,0 +1,78 @@
+import logging
+
+import pandas as pd
+
+from 并发执行 import fan_out
+from 接口网关 import pro
+
+# ------------------------------------------------------
+# 评分系统所需的截面特征：流通市值/量比、资金流、机构持仓、北向持股。
+# 每个接口按 trade_date 一次拉取全市场快照，再与候选股票合并；
+# 快照里缺失的股票才退回逐只 limit=1 查询。
+# ------------------------------------------------------
+
+# 接口 -> 需要的字段（不含 ts_code）
+FEATURE_SOURCES = {
+    "daily_basic": ["circ_mv", "volume_ratio"],
+    "moneyflow_ths": ["net_amount", "net_d5_amount", "buy_lg_amount_rate"],
+    "ccass_hold": ["hold_ratio"],
+    "hk_hold": ["ratio"],
+}
+
+FEATURE_COLUMNS = [col for cols in FEATURE_SOURCES.values() for col in cols]
+
+
+def fetch_snapshot(api_name, columns, trade_dates):
+    """
+    按 trade_dates 的顺序（从新到旧）尝试拉取全市场快照，返回第一个非空结果及其日期。
+    """
+    for trade_date in trade_dates:
+        try:
+            df = pro.query(api_name, trade_date=trade_date, fields=["ts_code"] + columns)
+        except Exception as e:
+            logging.error(f"{trade_date} 拉取 {api_name} 全市场快照出错: {e}")
+            continue
+        if not df.empty:
+            return df.drop_duplicates(subset="ts_code").set_index("ts_code")[columns], trade_date
+    return pd.DataFrame(columns=columns), None
+
+
+def fetch_latest_row(api_name, columns, stock_code):
+    """逐只查询：取该股票最近一条记录，无数据时返回 None"""
+    try:
+        df = pro.query(api_name, ts_code=stock_code, limit=1, fields=columns)
+        if df.empty:
+            return None
+        return df.iloc[0][columns]
+    except Exception as e:
+        logging.error(f"{stock_code} 获取 {api_name} 出错: {e}")
+        return None
+
+
+def fetch_score_features(stock_codes, trade_dates):
+    """
+    获取候选股票的评分特征，返回以 ts_code 为索引的 DataFrame，列见 FEATURE_COLUMNS，
+    数值已转为 float，无数据的位置为 NaN。
+    trade_dates 为候选交易日列表（从新到旧），用于当日数据尚未发布时回退。
+    """
+    stock_codes = list(dict.fromkeys(stock_codes))
+    features = pd.DataFrame(index=pd.Index(stock_codes, name="ts_code"), columns=FEATURE_COLUMNS, dtype=float)
+    if not stock_codes:
+        return features
+
+    for api_name, columns in FEATURE_SOURCES.items():
+        snapshot, snapshot_date = fetch_snapshot(api_name, columns, trade_dates)
+        hit_codes = [code for code in stock_codes if code in snapshot.index]
+        if hit_codes:
+            features.loc[hit_codes, columns] = snapshot.loc[hit_codes, columns].apply(
+                pd.to_numeric, errors="coerce").values
+
+        missing_codes = [code for code in stock_codes if code not in snapshot.index]
+        logging.info(f"{api_name} 快照日期 {snapshot_date}，命中 {len(hit_codes)} 只，逐只补查 {len(missing_codes)} 只")
+        # 逐只补查带 limit=1，不能合批，只并发执行
+        rows = fan_out(lambda code: fetch_latest_row(api_name, columns, code), missing_codes)
+        for code, row in zip(missing_codes, rows.results):
+            if row is not None:
+                features.loc[code, columns] = pd.to_numeric(row, errors="coerce").values
+
+    return features
@@ -1,21 +1,21 @@
-import tushare as ts
 import pandas as pd
 import datetime as dt
 from tqdm import tqdm
 import os
 import logging
 import ast  # 用于解析字符串表示的列表
-import time  # 用于控制API调用频率
 
 # 设置日志记录
 logging.basicConfig(filename='error.log', level=logging.ERROR,
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
-tushare_token = st.secrets["api_keys"]["tushare_token"]
-
-# 设置 Tushare API Token
-ts.set_token(tushare_token)
-pro = ts.pro_api()
+# 所有 Tushare 调用统一经过接口网关（进程内共享限流）
+from 接口网关 import pro
+from 交易日历 import calendar
+from 并发执行 import fan_out
+from 评分特征 import fetch_score_features
+from 证券索引 import securities, union
+from 股票池 import pools
 
 
 def save_selected_stocks(selected_stocks, file_path):
@@ -29,34 +29,6 @@ def save_selected_stocks(selected_stocks, file_path):
     print(f"股票列表已保存到: {file_path}")
 
 
-def get_trade_calendar():
-    """获取近两年的交易日历，并过滤至今日之前"""
-    today = dt.datetime.today()
-    today_str = today.strftime('%Y%m%d')
-
-    # 计算两年前的日期
-    two_years_ago = today.replace(year=today.year - 2)
-    start_date_str = two_years_ago.strftime('%Y%m%d')
-
-    try:
-        df = pro.trade_cal(exchange='SSE', start_date=start_date_str, end_date=today_str, fields='cal_date,is_open')
-        df = df[df['cal_date'] <= today_str]
-        df = df.sort_values(by='cal_date')
-        return df
-    except Exception as e:
-        logging.error(f"获取交易日历出错: {e}")
-        print("获取交易日历时出错，请查看 error.log。")
-        return pd.DataFrame()
-
-
-def get_latest_trade_days(trade_cal_df, max_tries=10):
-    """获取最近的交易日列表，最多回溯 max_tries 天"""
-    open_days = trade_cal_df[trade_cal_df['is_open'] == 1]['cal_date'].tolist()
-    if not open_days:
-        return []
-    return open_days[-max_tries:]
-
-
 def get_component_stocks(concept_code, trade_date):
     """根据题材代码和交易日期获取成分股"""
     try:
@@ -71,67 +43,32 @@ def get_component_stocks(concept_code, trade_date):
         return set()
 
 
-def load_stock_pool(file_path):
-    """从单个文件加载股票池"""
-    if not os.path.exists(file_path):
-        print(f"文件 {file_path} 不存在，跳过。")
-        return set()
-    try:
-        with open(file_path, "r", encoding='utf-8') as file:
-            stock_codes = {line.strip() for line in file if line.strip()}
-        print(f"从本地文件 {file_path} 加载了 {len(stock_codes)} 只股票。")
-        return stock_codes
-    except Exception as e:
-        logging.error(f"加载本地股票池文件 {file_path} 失败: {e}")
-        print(f"加载本地股票池文件 {file_path} 时出错，请查看 error.log。")
-        return set()
-
-
 def get_union_stock_pools(file_paths):
     """
-    从多个本地文件加载股票池，并计算它们的并集。
+    从多个本地股票池（见 股票池.py）计算并集；文件路径按文件名对应到 date/ 下的股票池，其他位置的文件直接读取。
     """
-    union_set = set()
-    for idx, file_path in enumerate(file_paths, start=1):
-        stocks = load_stock_pool(file_path)
-        if stocks:
-            union_set.update(stocks)
+    union_ids = []
+    for file_path in file_paths:
+        if not pools.exists(file_path):
+            print(f"文件 {file_path} 不存在，跳过。")
+            continue
+        try:
+            pool_ids = pools.load(file_path)
+        except Exception as e:
+            logging.error(f"加载本地股票池文件 {file_path} 失败: {e}")
+            print(f"加载本地股票池文件 {file_path} 时出错，请查看 error.log。")
+            continue
+        print(f"从股票池 {file_path} 加载了 {len(pool_ids)} 只股票。")
+        union_ids.append(pool_ids)
+    union_set = set(securities.codes(union(*union_ids)))
     print(f"所有输入文件的股票池并集总数: {len(union_set)}")
     return union_set
 
 
-def fetch_moneyflow_data(stock_code):
-    """
-    获取当日净值(net_amount)、5日主力净值(net_d5_amount)、大单占比(buy_lg_amount_rate)
-    单位分别是 万、万、%。
-    """
-    try:
-        df = pro.moneyflow_ths(ts_code=stock_code, limit=1,
-                               fields=["net_amount", "net_d5_amount", "buy_lg_amount_rate"])
-        if df.empty:
-            print(f"没有找到 {stock_code} 的资金流数据。")
-            return None, None, None
-
-        net_d5_amount = pd.to_numeric(df['net_d5_amount'].iloc[0], errors='coerce')  # 万
-        net_amount = pd.to_numeric(df['net_amount'].iloc[0], errors='coerce')  # 万
-        buy_lg_amount_rate = pd.to_numeric(df['buy_lg_amount_rate'].iloc[0], errors='coerce')  # %
-
-        net_d5_amount = net_d5_amount if net_d5_amount is not None else 0.0
-        net_amount = net_amount if net_amount is not None else 0.0
-        buy_lg_amount_rate = buy_lg_amount_rate if buy_lg_amount_rate is not None else 0.0
-
-        return net_d5_amount, net_amount, buy_lg_amount_rate
-    except Exception as e:
-        logging.error(f"{stock_code} 获取资金流数据出错: {e}")
-        print(f"获取 {stock_code} 的资金流数据时出错，请查看 error.log。")
-        return None, None, None
-
-
 def fetch_stock_basic():
     """获取所有股票的基本信息，并返回 ts_code -> ts_name 的映射字典"""
     try:
-        df_basic = pro.stock_basic(exchange='', list_status='L',
-                                   fields='ts_code,symbol,name,area,industry,fullname,enname,market,exchange,list_date')
+        df_basic = pro.stock_basic(exchange='', list_status='L', fields='ts_code,name')
         stock_basic_mapping = pd.Series(df_basic.name.values, index=df_basic.ts_code).to_dict()
         return stock_basic_mapping
     except Exception as e:
@@ -162,59 +99,7 @@ def get_stock_concepts(stock_code):
         return "获取失败"
 
 
-def fetch_institution_data(stock_code):
-    """
-    获取机构总占比(hold_ratio)
-    """
-    try:
-        df = pro.ccass_hold(ts_code=stock_code, limit=1, fields=["hold_ratio", "ts_code", "name"])
-        if df.empty:
-            print(f"没有找到 {stock_code} 的机构持仓数据。")
-            return 0.0
-        hold_ratio = pd.to_numeric(df['hold_ratio'].iloc[0], errors='coerce')
-        hold_ratio = hold_ratio if hold_ratio is not None else 0.0  # %
-        return hold_ratio
-    except Exception as e:
-        logging.error(f"{stock_code} 获取机构持仓数据出错: {e}")
-        print(f"获取 {stock_code} 的机构持仓数据时出错，请查看 error.log。")
-        return 0.0
-
-
-def fetch_northbound_ratio(stock_code):
-    """获取北向持股比例 ratio（%）"""
-    try:
-        df = pro.hk_hold(ts_code=stock_code, limit=1, fields=["ratio"])
-        if df.empty:
-            return 0.0
-        ratio = pd.to_numeric(df['ratio'].iloc[0], errors='coerce')
-        return ratio if ratio is not None else 0.0
-    except Exception as e:
-        logging.error(f"{stock_code} 获取北向占比出错: {e}")
-        print(f"获取 {stock_code} 的北向占比数据时出错，请查看 error.log。")
-        return 0.0
-
-
-def fetch_circ_mv_and_volume_ratio(stock_code):
-    """
-    获取股票的流通市值(circ_mv, 单位: 万) 和 量比(volume_ratio)
-    若没数据则返回 (0.0, 0.0)
-    """
-    try:
-        df = pro.daily_basic(ts_code=stock_code, limit=1, fields=["circ_mv", "volume_ratio"])
-        if df.empty:
-            return 0.0, 0.0
-        circ_mv = pd.to_numeric(df['circ_mv'].iloc[0], errors='coerce')
-        volume_ratio = pd.to_numeric(df['volume_ratio'].iloc[0], errors='coerce')
-        circ_mv = circ_mv if circ_mv is not None else 0.0
-        volume_ratio = volume_ratio if volume_ratio is not None else 0.0
-        return circ_mv, volume_ratio
-    except Exception as e:
-        logging.error(f"{stock_code} 获取 daily_basic 出错: {e}")
-        print(f"获取 {stock_code} 的 daily_basic 数据时出错，请查看 error.log。")
-        return 0.0, 0.0
-
-
-def fetch_hm_detail_5days(stock_code, trade_cal_df):
+def fetch_hm_detail_5days(stock_code):
     """
     获取近5个交易日的游资数据（hm_detail），包含 buy_amount(万), sell_amount(万), net_amount(万)
     返回 (df_merged, yz_5d_sum, True/False)
@@ -222,27 +107,18 @@ def fetch_hm_detail_5days(stock_code, trade_cal_df):
       - yz_5d_sum：5日净买入总和
       - True/False：是否有有效数据
     """
-    open_days = trade_cal_df[trade_cal_df['is_open'] == 1]['cal_date'].tolist()
-    if not open_days:
+    last_day = calendar.latest()
+    if last_day is None:
         return None, 0.0, False
 
-    last_day = open_days[-1]
-    df_test = pro.hm_detail(ts_code=stock_code, trade_date=last_day)
+    df_test = pro.hm_detail(ts_code=stock_code, trade_date=last_day, fields='ts_code')
     if df_test.empty:
         # 回退1日
-        if len(open_days) >= 2:
-            last_day = open_days[-2]
-        else:
+        last_day = calendar.prev(last_day)
+        if last_day is None:
             return None, 0.0, False
 
-    if last_day not in open_days:
-        return None, 0.0, False
-
-    idx = open_days.index(last_day)
-    if idx - 4 < 0:
-        five_days = open_days[0: idx + 1]
-    else:
-        five_days = open_days[idx - 4: idx + 1]
+    five_days = calendar.last_n(5, end=last_day)
 
     frames = []
     for d in five_days:
@@ -254,10 +130,9 @@ def fetch_hm_detail_5days(stock_code, trade_cal_df):
         if not df_hm.empty:
             # 转为万
             for col in ["buy_amount", "sell_amount", "net_amount"]:
-                df_hm[col] = pd.to_numeric(df_hm[col], errors='coerce').fillna(0) / 10000.0
+                df_hm[col] = df_hm[col].fillna(0) / 10000.0
             df_hm["trade_date"] = df_hm["trade_date"].astype(str)
             frames.append(df_hm)
-        time.sleep(0.2)
 
     if not frames:
         return None, 0.0, False
@@ -267,13 +142,9 @@ def fetch_hm_detail_5days(stock_code, trade_cal_df):
     return df_merged, yz_5d_sum, True
 
 
-def get_recent_kpl_concept_cons(trade_cal_df, max_tries=10):
+def get_recent_kpl_concept_cons(max_tries=10):
     """获取最近 max_tries 个交易日内可用的 kpl_concept_cons 数据（题材名称、人气值等）"""
-    open_days = trade_cal_df[trade_cal_df['is_open'] == 1]['cal_date'].tolist()
-    if not open_days:
-        return pd.DataFrame(columns=['name', 'con_code', 'hot_num', 'desc'])
-
-    recent_days = open_days[-max_tries:]
+    recent_days = calendar.last_n(max_tries)
     for trade_date in reversed(recent_days):
         try:
             df_kpl = pro.kpl_concept_cons(
@@ -290,7 +161,6 @@ def get_recent_kpl_concept_cons(trade_cal_df, max_tries=10):
             logging.error(f"获取 kpl_concept_cons 出错, 交易日 {trade_date}: {e}")
             print(f"获取 kpl_concept_cons 出错, 交易日 {trade_date}，请查看 error.log。")
 
-        time.sleep(0.2)
     return pd.DataFrame(columns=['name', 'con_code', 'hot_num', 'desc'])
 
 
@@ -299,7 +169,7 @@ def aggregate_concept_info(df_kpl):
     if df_kpl.empty:
         return pd.DataFrame(columns=['cons_code', 'total_hot_num', 'combined_name', 'combined_desc'])
 
-    df_kpl['hot_num'] = pd.to_numeric(df_kpl['hot_num'], errors='coerce').fillna(0)
+    df_kpl['hot_num'] = df_kpl['hot_num'].fillna(0)
 
     # 注意这里改为按 'con_code' 分组，然后重命名为 'cons_code'
     grouped = df_kpl.groupby('con_code').agg({
@@ -369,7 +239,7 @@ def print_5days_hm_detail(stock_code, stock_name, df_5days):
         )
 
 
-def fetch_margin_6d_ratio(stock_code, circ_mv, trade_cal_df):
+def fetch_margin_6d_ratio(stock_code, circ_mv):
     """
     计算近5日的融资融券净流入占比(%)。
 
@@ -381,8 +251,8 @@ def fetch_margin_6d_ratio(stock_code, circ_mv, trade_cal_df):
         if df.empty or len(df) < 6:
             return 0.0
 
-        df['rzye'] = pd.to_numeric(df['rzye'], errors='coerce').fillna(0.0) / 10000.0
-        df['rqye'] = pd.to_numeric(df['rqye'], errors='coerce').fillna(0.0) / 10000.0
+        df['rzye'] = df['rzye'].fillna(0.0) / 10000.0
+        df['rqye'] = df['rqye'].fillna(0.0) / 10000.0
 
         # 升序排序（最早的在前）
         df = df.sort_values(by='trade_date').reset_index(drop=True)
@@ -432,14 +302,9 @@ def main():
     if concept_codes_input:
         concept_codes = [code.strip() for code in concept_codes_input.split() if code.strip()]
         if concept_codes:
-            trade_cal_df = get_trade_calendar()
-            if trade_cal_df.empty:
-                print("交易日历获取失败，程序终止。")
-                return
-
-            recent_trade_days = get_latest_trade_days(trade_cal_df, max_tries=10)
+            recent_trade_days = calendar.last_n(10)
             if not recent_trade_days:
-                print("未找到有效的交易日，程序终止。")
+                print("交易日历获取失败或未找到有效的交易日，程序终止。")
                 return
 
             all_concept_stocks = set()
@@ -461,7 +326,6 @@ def main():
                     break
                 else:
                     print(f"{trade_date} 的成分股数据为空，尝试回退到上一个交易日。")
-                time.sleep(0.1)
 
             if all_concept_stocks:
                 # 可根据需求决定合并方式：并集 or 交集
@@ -484,15 +348,19 @@ def main():
 
     # ========== 第一步：先通过游资数据进行筛选 ==========
     print("\n第一步：根据游资数据筛选股票...")
-    trade_cal_df = get_trade_calendar()
-    if trade_cal_df.empty:
+    if calendar.latest() is None:
         print("交易日历获取失败，程序终止。")
         return
 
     filtered_stocks = []
     hm_detail_map = {}  # 在此阶段就把游资明细保存起来，以免二次获取
-    for stock_code in tqdm(selected_stocks, desc="游资筛选"):
-        df_5days, yz_5d_sum, has_data_5d = fetch_hm_detail_5days(stock_code, trade_cal_df)
+    # 逐只请求并发执行，同一交易日的单代码请求由网关合批（见 请求批处理.py）
+    candidates = sorted(selected_stocks)
+    progress = tqdm(total=len(candidates), desc="游资筛选")
+    outcome = fan_out(fetch_hm_detail_5days, candidates, default=(None, 0.0, False),
+                      on_progress=lambda done, total: progress.update(done - progress.n))
+    progress.close()
+    for stock_code, (df_5days, yz_5d_sum, has_data_5d) in zip(candidates, outcome.results):
         # 如果近5日游资数据不为空 (has_data_5d=True)，则保留；否则剔除
         if has_data_5d:
             filtered_stocks.append(stock_code)
@@ -510,7 +378,7 @@ def main():
     print("\n第二步：对通过游资筛选的股票，获取资金流、北向、流通市值、融资融券等数据，并进行AI评分...")
 
     # 获取 kpl_concept_cons 数据
-    df_kpl_final = get_recent_kpl_concept_cons(trade_cal_df, max_tries=10)
+    df_kpl_final = get_recent_kpl_concept_cons(max_tries=10)
     if df_kpl_final.empty:
         print("在最近的交易日范围内，kpl_concept_cons 数据均为空。")
         df_kpl_agg = pd.DataFrame()
@@ -527,30 +395,34 @@ def main():
                 'desc': row['combined_desc']
             }
 
+    # 流通市值/量比、资金流、机构、北向按交易日一次拉取全市场快照，缺失的股票再逐只补查
+    feature_dates = list(reversed(calendar.last_n(3)))
+    features = fetch_score_features(filtered_stocks, feature_dates).fillna(0.0)
+
     # 收集评分所需数据
     for stock_code in tqdm(filtered_stocks, desc="数据采集"):
         stock_name = stock_basic_mapping.get(stock_code, '未知')
+        feature = features.loc[stock_code]
 
         # (1) 直接拿前面保存的游资明细
         df_5days, yz_5d_sum = hm_detail_map[stock_code]
 
         # (2) 流通市值 & 量比
-        circ_mv, volume_ratio = fetch_circ_mv_and_volume_ratio(stock_code)
+        circ_mv, volume_ratio = feature['circ_mv'], feature['volume_ratio']
         if circ_mv <= 0:
             continue
 
         # (3) 资金流
-        net_d5_amount, net_amount, buy_lg_amount_rate = fetch_moneyflow_data(stock_code)
-        net_d5_amount = net_d5_amount if net_d5_amount else 0.0
-        net_amount = net_amount if net_amount else 0.0
-        buy_lg_amount_rate = buy_lg_amount_rate if buy_lg_amount_rate else 0.0
+        net_d5_amount = feature['net_d5_amount']
+        net_amount = feature['net_amount']
+        buy_lg_amount_rate = feature['buy_lg_amount_rate']
 
         ratio_today = (net_amount / circ_mv) * 100
         ratio_5day = (net_d5_amount / circ_mv) * 100
 
         # (4) 机构 & 北向
-        hold_ratio = fetch_institution_data(stock_code)
-        northbound_ratio = fetch_northbound_ratio(stock_code)
+        hold_ratio = feature['hold_ratio']
+        northbound_ratio = feature['ratio']
 
         # (5) 游资净额占比
         yz_5d_ratio = (yz_5d_sum / circ_mv) * 100
@@ -570,7 +442,7 @@ def main():
             concepts = concepts[:27] + '...'
 
         # (8) 近6日融资融券净流入占比
-        margin_ratio = fetch_margin_6d_ratio(stock_code, circ_mv, trade_cal_df)
+        margin_ratio = fetch_margin_6d_ratio(stock_code, circ_mv)
 
         # 整理到 final_data
         final_data.append({
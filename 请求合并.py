@@ -0,0 +1,53 @@
+import threading
+
+# ------------------------------------------------------
+# 相同请求合并（single-flight）：同一时刻完全相同的请求只发出一次，
+# 其余并发调用方等待这一次的结果，不重复消耗接口额度。
+# ------------------------------------------------------
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    do(key, func)：若 key 对应的请求已在途，则等待其结果；否则由当前线程执行 func()。
+    返回 (结果, 是否被多个调用方共享)。func 抛出的异常会同样抛给所有等待方。
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                shared = call.waiters > 0
+            call.done.set()
+        return call.result, shared
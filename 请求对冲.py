@@ -0,0 +1,121 @@
+import collections
+import contextlib
+import contextvars
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from 容错策略 import RetryBudget
+from 限流器 import INTERACTIVE, current_priority
+
+# ------------------------------------------------------
+# 对冲请求：交互页面的一两次阻塞调用遇到上游慢响应时整页卡住。
+# 在 with hedged(): 块内、交互优先级下发出的调用，若超过该接口近期耗时的 p95 仍未返回，
+# 再发出一次相同请求，先返回的结果生效，另一次的结果丢弃。
+# 对冲请求同样经过限流器申请额度，并受对冲预算约束：每次请求为预算积累 HEDGE_BUDGET_RATIO 次，
+# 因此对冲调用最多约占总调用的 5%，不会把额度耗在重复请求上。
+# ------------------------------------------------------
+
+LATENCY_WINDOW = 200          # 每个接口保留最近多少次成功调用的耗时
+MIN_SAMPLES = 20              # 样本数不足时不对冲
+HEDGE_BUDGET_RATIO = 0.05
+HEDGE_BUDGET_RESERVE = 10
+HEDGE_WORKERS = 8
+
+_hedging = contextvars.ContextVar("tushare_hedging", default=False)
+
+
+@contextlib.contextmanager
+def hedged():
+    """
+    在 with 块内发出的交互调用启用对冲，例如：
+        with hedged():
+            df = pro.irm_qa_sz(...)
+    """
+    token = _hedging.set(True)
+    try:
+        yield
+    finally:
+        _hedging.reset(token)
+
+
+class LatencyTracker:
+    """按接口记录最近的调用耗时，p95(api_name) 样本不足时返回 None"""
+
+    def __init__(self, window=LATENCY_WINDOW, min_samples=MIN_SAMPLES):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, api_name, seconds):
+        with self._lock:
+            samples = self._samples.get(api_name)
+            if samples is None:
+                samples = self._samples[api_name] = collections.deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def p95(self, api_name):
+        with self._lock:
+            samples = sorted(self._samples.get(api_name, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+
+class HedgePolicy:
+    """
+    call(api_name, func)：func 发出一次完整的请求（含限流与熔断）。
+    未启用对冲、非交互优先级或耗时样本不足时直接执行 func()。
+    """
+
+    def __init__(self, tracker=None, budget=None, workers=HEDGE_WORKERS):
+        self.tracker = tracker if tracker is not None else LatencyTracker()
+        self.budget = budget if budget is not None else RetryBudget(HEDGE_BUDGET_RATIO, HEDGE_BUDGET_RESERVE)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tushare-hedge")
+        self.hedges = 0
+        self.wins = 0
+        self._lock = threading.Lock()
+
+    def record(self, api_name, seconds):
+        self.tracker.record(api_name, seconds)
+
+    def _submit(self, func):
+        # 复制上下文，使优先级等上下文变量在线程内同样生效
+        return self._executor.submit(contextvars.copy_context().run, func)
+
+    def call(self, api_name, func):
+        if not _hedging.get() or current_priority() != INTERACTIVE:
+            return func()
+        delay = self.tracker.p95(api_name)
+        if delay is None:
+            return func()
+        self.budget.deposit()
+
+        primary = self._submit(func)
+        done, _ = wait([primary], timeout=delay)
+        if done or not self.budget.withdraw():
+            return primary.result()
+
+        logging.info(f"{api_name} 超过 p95 耗时 {delay:.2f} 秒未返回，发出对冲请求")
+        hedge = self._submit(func)
+        with self._lock:
+            self.hedges += 1
+        pending = {primary, hedge}
+        first_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        with self._lock:
+                            self.wins += 1
+                    return future.result()
+                first_error = first_error or future.exception()
+        raise first_error
+
+    def stats(self):
+        """发出的对冲请求数与对冲请求先返回的次数"""
+        with self._lock:
+            return {"对冲次数": self.hedges, "对冲胜出": self.wins}
+
@@ -0,0 +1,132 @@
+import json
+import threading
+
+from 并发执行 import fan_out
+from 接口缓存 import normalize_params
+
+# ------------------------------------------------------
+# 多代码请求自动合批：部分接口的 ts_code 参数接受逗号分隔的多个代码。
+# 逐只股票的并发调用（fan_out 中的 pro.daily(ts_code=...) 等）在很短的时间窗口内到达时，
+# 把除 ts_code 外参数相同的请求合并为一次批量调用，再按 ts_code 拆回各调用方。
+# 调用方代码无需改动；带 limit/offset 的请求（行数限制作用于整批）不合批。
+# 同一接口没有其他请求在途时（交互页面的单次查询）不等待时间窗口，直接发出。
+# ------------------------------------------------------
+
+# 接口 -> (每批最多代码数, 单次调用返回行数上限)
+# 批量结果达到行数上限时可能被截断，此时改为逐个代码请求
+BATCH_ENDPOINTS = {
+    "hm_detail": (500, 2000),
+    "daily": (50, 6000),
+    "daily_basic": (500, 6000),
+    "stock_basic": (500, 6000),
+}
+
+BATCH_WINDOW_SECONDS = 0.02   # 第一个请求到达后等待同批请求的时长（同一接口有其他请求在途时）
+
+_UNBATCHABLE_PARAMS = ("limit", "offset")
+
+
+class _Batch:
+    def __init__(self):
+        self.codes = []
+        self.results = {}
+        self.errors = {}
+        self.error = None
+        self.full = threading.Event()
+        self.done = threading.Event()
+
+
+class CodeBatcher:
+    """
+    submit(api_name, fields, params, fetch)：把单代码请求加入同组的批次。
+    批次的第一个调用方等待 window 秒（或批次满）后用 fetch(fields, params) 发出批量请求，
+    其余调用方等待拆分结果；同一接口没有其他请求在途时不等待。返回 (DataFrame, 是否经过合批)。
+    """
+
+    def __init__(self, window=BATCH_WINDOW_SECONDS, endpoints=None):
+        self.window = window
+        self.endpoints = dict(BATCH_ENDPOINTS if endpoints is None else endpoints)
+        self._pending = {}
+        self._active = {}      # 接口 -> 正在 submit 中的请求数
+        self._lock = threading.Lock()
+
+    def accepts(self, api_name, params):
+        code = params.get("ts_code")
+        return (
+            api_name in self.endpoints
+            and isinstance(code, str) and code != "" and "," not in code
+            and not any(params.get(name) not in (None, "") for name in _UNBATCHABLE_PARAMS)
+        )
+
+    def submit(self, api_name, fields, params, fetch):
+        max_codes, _ = self.endpoints[api_name]
+        code = params["ts_code"]
+        rest = {k: v for k, v in params.items() if k != "ts_code"}
+        norm_fields, norm_rest = normalize_params(fields, rest)
+        group = (api_name, norm_fields, json.dumps(norm_rest, sort_keys=True))
+
+        with self._lock:
+            self._active[api_name] = self._active.get(api_name, 0) + 1
+            batch = self._pending.get(group)
+            leader = batch is None
+            if leader:
+                batch = self._pending[group] = _Batch()
+            if code not in batch.codes:
+                batch.codes.append(code)
+            if len(batch.codes) >= max_codes:
+                # 批次已满，后来的请求另起一批
+                del self._pending[group]
+                batch.full.set()
+
+        try:
+            if leader:
+                with self._lock:
+                    alone = self._active[api_name] == 1
+                if not alone:
+                    batch.full.wait(self.window)
+                with self._lock:
+                    if self._pending.get(group) is batch:
+                        del self._pending[group]
+                self._run(batch, api_name, norm_fields, rest, fetch)
+            else:
+                batch.done.wait()
+        finally:
+            with self._lock:
+                self._active[api_name] -= 1
+
+        error = batch.errors.get(code, batch.error)
+        if error is not None:
+            raise error
+        return batch.results[code], len(batch.codes) > 1
+
+    def _run(self, batch, api_name, fields, rest, fetch):
+        try:
+            if len(batch.codes) == 1:
+                code = batch.codes[0]
+                batch.results[code] = fetch(fields, dict(rest, ts_code=code))
+                return
+            # 拆分结果需要 ts_code 列；调用方没要这一列时拆分后再去掉
+            extra = bool(fields) and "ts_code" not in fields.split(",")
+            batch_fields = f"{fields},ts_code" if extra else fields
+            df = fetch(batch_fields, dict(rest, ts_code=",".join(batch.codes)))
+            _, row_cap = self.endpoints[api_name]
+            if row_cap and len(df) >= row_cap:
+                # 可能被截断：改为逐个代码并发请求，各代码的错误分别交给对应的调用方
+                outcome = fan_out(lambda code: fetch(fields, dict(rest, ts_code=code)), batch.codes)
+                for index, code in enumerate(batch.codes):
+                    if index in outcome.errors:
+                        batch.errors[code] = outcome.errors[index]
+                    else:
+                        batch.results[code] = outcome.results[index]
+                return
+            parts = {}
+            if not df.empty:
+                parts = {str(code): part for code, part in df.groupby("ts_code", observed=True, sort=False)}
+            for code in batch.codes:
+                part = parts.get(code, df.iloc[0:0])
+                part = part.drop(columns="ts_code", errors="ignore") if extra else part.copy()
+                batch.results[code] = part.reset_index(drop=True)
+        except Exception as e:
+            batch.error = e
+        finally:
+            batch.done.set()
@@ -1,28 +1,30 @@
-import tushare as ts
 import pandas as pd
-import os
+import datetime as dt
 import streamlit as st
 
 # 设置 Pandas 显示选项，确保 '接受机构' 列完全显示
 pd.set_option('display.max_colwidth', None)
 
-# 从 secrets.toml 文件中读取 Tushare API Token
-tushare_token = st.secrets["api_keys"]["tushare_token"]
+# 所有 Tushare 调用统一经过接口网关（进程内共享限流）
+from 接口网关 import pro
+from 并发执行 import fetch_pages
+from 股票池 import pools
 
-# 设置 Tushare API Token
-ts.set_token(tushare_token)
-pro = ts.pro_api()
+# 最近多少天的调研记录；单页上限 1000 条，超出的部分分页拉取
+SURVEY_DAYS = 30
+PAGE_LIMIT = 1000
 
 # 拉取数据
 def fetch_data():
-    df = pro.stk_surv(
-        ts_code="",
-        trade_date="",
-        start_date="",
-        end_date="",
-        limit="1000",  # 设置限制最大返回数量
-        offset="0",
-        fields=["ts_code", "name", "rece_org"]
+    start_date = (dt.date.today() - dt.timedelta(days=SURVEY_DAYS)).strftime('%Y%m%d')
+    df = fetch_pages(
+        lambda offset: pro.stk_surv(
+            start_date=start_date,
+            limit=PAGE_LIMIT,
+            offset=offset,
+            fields=["ts_code", "name", "rece_org", "surv_date"]
+        ),
+        PAGE_LIMIT,
     )
     return df
 
@@ -53,19 +55,8 @@ def main():
         st.subheader("机构调研数据表")
         st.dataframe(df_grouped)
 
-        # 保存文件到相对路径的 'date' 文件夹
-        if not os.path.exists("date"):
-            os.makedirs("date")
-        output_file = os.path.join("date", "机构调研.txt")
-
-        # 如果文件存在，读取现有数据并去重；否则直接写入新的数据
-        if os.path.exists(output_file):
-            with open(output_file, "r", encoding="utf-8") as file:
-                existing_data = file.readlines()
-            # 获取文件中已保存的股票代码（去除重复）
-            existing_codes = set(line.strip() for line in existing_data)
-        else:
-            existing_codes = set()
+        # 读取已保存的机构调研股票池（最新快照），与新数据合并
+        existing_codes = set(pools.codes("机构调研"))
 
         # 获取新的股票数据（去重）
         new_data = set(df_grouped['ts_code'].tolist())
@@ -73,10 +64,8 @@ def main():
         # 合并现有和新的数据，并去重
         all_codes = existing_codes.union(new_data)
 
-        # 将去重后的数据保存到文件
-        with open(output_file, "w", encoding="utf-8") as file:
-            for code in sorted(all_codes):
-                file.write(f"{code}\n")
+        # 将去重后的数据保存到文件，并保存当天的股票池快照
+        output_file = pools.save("机构调研", sorted(all_codes))
 
         st.success(f"股票数据已成功保存到文件：{output_file}")
 
@@ -1,42 +1,21 @@
 import streamlit as st
-import tushare as ts
+import numpy as np
 import pandas as pd
-import os
 import ast
 import logging
-from datetime import datetime, timedelta
 
 # 配置日志
 logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
 
 pd.set_option('display.max_colwidth', None)
 
-# 从 secrets.toml 中读取 Tushare API Token
-tushare_token = st.secrets.get("api_keys", {}).get("tushare_token", "your_default_token_here")
-ts.set_token(tushare_token)
-pro = ts.pro_api()
-
-def get_recent_trading_days(n, days_back=60):
-    """
-    从 Tushare 获取最近 days_back 天的交易日历，
-    返回最新 n 个交易日（升序排列）。
-    """
-    today = datetime.today()
-    end_date = today.strftime("%Y%m%d")
-    start_date = (today - timedelta(days=days_back)).strftime("%Y%m%d")
-    df_cal = pro.trade_cal(
-        exchange='SSE',
-        start_date=start_date,
-        end_date=end_date,
-        fields="cal_date,is_open"
-    )
-    df_open = df_cal[df_cal["is_open"] == 1].sort_values("cal_date")
-    trading_days = df_open["cal_date"].tolist()
-    if len(trading_days) >= n:
-        return trading_days[-n:]
-    else:
-        return trading_days
-
+# 所有 Tushare 调用统一经过接口网关（进程内共享限流）
+from 接口网关 import pro
+from 交易日历 import calendar
+from 并发执行 import fan_out
+from 限流器 import BULK, priority
+from 证券索引 import securities, intersect
+from 股票池 import pools
 
 def get_stock_concepts(stock_code):
     """获取指定股票的 concept 标签，并去重返回字符串"""
@@ -65,7 +44,7 @@ def main():
     st.write("选出短期持续超买股票，可沿5日均线顺势交易")
 
     # 一次性获取更多交易日，这里取最近7个（也可改成10、15等）
-    all_days = get_recent_trading_days(n=7, days_back=60)
+    all_days = calendar.last_n(7)
     if len(all_days) < 3:
         st.error("无法获取足够的交易日数据。")
         return
@@ -115,20 +94,18 @@ def main():
         return
 
     st.write(f"筛选出 {len(df_selected)} 支股票，获取标签中......")
-    rsi_codes = set(df_selected["ts_code"].unique())
-
-    # 加载本地股票池文件（默认路径：date/股东.txt，每行一个股票代码）
-    local_stock_pool_path = "date/股东.txt"
-    if os.path.exists(local_stock_pool_path):
-        with open(local_stock_pool_path, "r", encoding="utf-8") as f:
-            local_pool = {line.strip() for line in f if line.strip()}
-    else:
-        st.error(f"本地股票池文件不存在：{local_stock_pool_path}")
+    rsi_codes = securities.to_ids(df_selected["ts_code"])
+
+    # 加载本地股东股票池（最新快照；尚无快照时从 date/股东.txt 导入）
+    local_pool_bits = pools.bitmap("股东")
+    if local_pool_bits is None:
+        st.error("本地股票池不存在：date/股东.txt")
         return
+    local_pool = np.flatnonzero(local_pool_bits)
 
     # 与本地股票池取交集
-    selected_codes = rsi_codes.intersection(local_pool)
-    if not selected_codes:
+    selected_codes = intersect(rsi_codes, local_pool)
+    if not len(selected_codes):
         st.info("经过本地股票池筛选后，没有符合条件的股票。")
         return
 
@@ -136,10 +113,14 @@ def main():
     df_basic = pro.stock_basic(exchange='', list_status='L', fields='ts_code,name')
     name_map = pd.Series(df_basic.name.values, index=df_basic.ts_code).to_dict()
 
+    # 并发获取各股票的概念标签（批量优先级，不挤占页面即时查询）
+    selected_codes = sorted(securities.codes(selected_codes))
+    with priority(BULK):
+        concepts_list = fan_out(get_stock_concepts, selected_codes, default="获取失败").results
+
     records = []
-    for code in selected_codes:
+    for code, concepts in zip(selected_codes, concepts_list):
         stock_name = name_map.get(code, "未知")
-        concepts = get_stock_concepts(code)
         records.append({
             "股票代码": code,
             "股票名称": stock_name,
@@ -153,14 +134,8 @@ def main():
     st.write("### 选股结果")
     st.dataframe(result_df, use_container_width=True)
 
-    # 保存股票代码到本地文件，保存路径为 "date/RSI选股.txt"（相对路径）
-    save_dir = "date"
-    if not os.path.exists(save_dir):
-        os.makedirs(save_dir)
-    save_path = os.path.join(save_dir, "RSI选股.txt")
-    with open(save_path, "w", encoding="utf-8") as f:
-        for code in result_df["股票代码"]:
-            f.write(f"{code}\n")
+    # 保存股票代码到本地文件 "date/RSI选股.txt"（相对路径），并保存当天的股票池快照
+    save_path = pools.save("RSI选股", result_df["股票代码"])
     st.success(f"选股结果已保存到：{save_path}")
 
 
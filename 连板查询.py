@@ -1,45 +1,53 @@
-import tushare as ts
 import pandas as pd
 from collections import defaultdict
 import streamlit as st
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
-# 从 secrets.toml 文件中读取 Tushare API Token
-tushare_token = st.secrets["api_keys"]["tushare_token"]
+# 所有 Tushare 调用统一经过接口网关（进程内共享限流）
+from 接口网关 import pro
+from 交易日历 import calendar
+from 并发执行 import fan_out, fetch_pages
+from 接口解码 import to_datetime
+from 股票池 import pools
 
-# 设置 Tushare API Token
-ts.set_token(tushare_token)
-pro = ts.pro_api()
 
+def fetch_theme(ts_code):
+    """获取单只股票最近一次的涨停主题"""
+    df_theme = pro.kpl_list(ts_code=ts_code, limit=1, fields=["theme", "ts_code", "name"])
+    return df_theme.iloc[0]['theme'] if not df_theme.empty else ""
 
-def fetch_all_themes(pro, ts_codes):
+
+def fetch_all_themes(ts_codes):
     """
-    针对近 11 个交易日所有需要查询的 ts_code 使用进度条获取主题数据，
+    针对近 11 个交易日所有需要查询的 ts_code 并发获取主题数据（进度条显示进度），
     返回：{ts_code: theme} 的字典
     """
-    theme_dict = {}
-    total = len(ts_codes)
     progress = st.progress(0)
-    for i, ts_code in enumerate(ts_codes):
-        try:
-            df_theme = pro.kpl_list(ts_code=ts_code, limit=1, fields=["theme", "ts_code", "name"])
-            theme = df_theme.iloc[0]['theme'] if not df_theme.empty else ""
-            theme_dict[ts_code] = theme
-        except Exception as e:
-            st.error(f"获取 {ts_code} 主题失败: {e}")
-            theme_dict[ts_code] = ""
-        progress.progress((i + 1) / total)
-    return theme_dict
+    outcome = fan_out(fetch_theme, ts_codes, default="",
+                      on_progress=lambda done, total: progress.progress(done / total))
+    for index, e in outcome.errors.items():
+        st.error(f"获取 {ts_codes[index]} 主题失败: {e}")
+    return dict(zip(ts_codes, outcome.results))
 
 
-def run_analysis(token):
+def run_analysis():
     # ------------------ 1. 拉取数据 ------------------
-    pro = ts.pro_api(token)
+    # 取最近 11 个有数据的交易日的全部连板记录，单页上限 1000 条，超出的部分分页拉取；
+    # 盘中当天的连板数据尚未发布，多取两个交易日，保证仍有 11 个交易日
+    days = calendar.last_n(13)
+    if not days:
+        return {"error": "获取交易日历失败"}
     try:
-        df = pro.limit_step(limit='1000', offset='')
+        df = fetch_pages(
+            lambda offset: pro.limit_step(start_date=days[0], end_date=days[-1], limit=1000, offset=offset),
+            1000,
+            dedup_subset=['trade_date', 'ts_code'],
+        )
     except Exception as e:
         return {"error": f"数据拉取失败: {e}"}
+    if df.empty:
+        return {"error": "未获取到数据（或全部为ST），请检查接口或参数是否正确。"}
 
     # ------------------ 2. 剔除 ST 股票 ------------------
     df = df[~df['name'].str.contains('ST', case=False)]
@@ -47,32 +55,34 @@ def run_analysis(token):
         return {"error": "未获取到数据（或全部为ST），请检查接口或参数是否正确。"}
 
     # ------------------ 3. 数据预处理 ------------------
-    # 按交易日期降序排列（最新在前）
-    df['trade_date'] = pd.to_datetime(df['trade_date'], format='%Y%m%d')
+    # 按交易日期降序排列（最新在前）；网关已把 trade_date 解码为整数日期、nums 解码为数值
+    df['trade_date'] = to_datetime(df['trade_date'])
     df = df.sort_values('trade_date', ascending=False)
-    df['nums'] = pd.to_numeric(df['nums'], errors='coerce')
+    # 日期标签只格式化一次，后面各步骤按标签筛选
+    df['date_label'] = df['trade_date'].dt.strftime('%m.%d')
 
-    # 取 11 个交易日的数据（按 df 排序后的前 11 个日期），用于计算晋级率
-    all_dates = list(df['trade_date'].dt.strftime('%m.%d').unique()[:11])
+    # 取 11 个交易日的数据（按 df 排序后的前 11 个日期，即最近 11 个有数据的交易日），用于计算晋级率
+    all_dates = list(df['date_label'].unique()[:11])
+    df = df[df['date_label'].isin(all_dates)]
     # 用于显示（表2、表3、综合图）只显示最近 10 个交易日，即去掉最后一天
     display_dates = all_dates[:-1]
 
     # ------------------ 4. 收集这 11 天所有需要查询主题的股票代码（去重） ------------------
     all_ts_codes = set()
     for date in all_dates:
-        day_data = df[df['trade_date'].dt.strftime('%m.%d') == date]
+        day_data = df[df['date_label'] == date]
         ts_codes = day_data['ts_code'].tolist()
         all_ts_codes.update(ts_codes)
     all_ts_codes = list(all_ts_codes)
 
     # ------------------ 5. 使用进度条获取所有主题信息 ------------------
-    theme_dict = fetch_all_themes(pro, all_ts_codes)
+    theme_dict = fetch_all_themes(all_ts_codes)
 
     # ------------------ 6. 逐日整理股票数据，并填入对应主题 ------------------
     stocks_data_per_date = {}
     data_per_date = defaultdict(list)
     for date in all_dates:
-        day_data = df[df['trade_date'].dt.strftime('%m.%d') == date][['name', 'nums', 'ts_code']]
+        day_data = df[df['date_label'] == date][['name', 'nums', 'ts_code']]
         if day_data.empty:
             continue
         day_data_sorted = day_data.sort_values(by='nums', ascending=False).copy()
@@ -88,7 +98,7 @@ def run_analysis(token):
     # ------------------ 7. 计算每个交易日的连板数统计（nums >= 2） ------------------
     count_per_date = {}
     for date in all_dates:
-        day_df = df[df['trade_date'].dt.strftime('%m.%d') == date]
+        day_df = df[df['date_label'] == date]
         count_nums = day_df['nums'].value_counts().to_dict()
         count_per_date[date] = {k: v for k, v in count_nums.items() if k >= 2}
     counts_df = pd.DataFrame(count_per_date).fillna(0).astype(int).T
@@ -242,9 +252,10 @@ def run_analysis(token):
     # ------------------ 将最新一天的连板股票代码保存到文件“date/涨停板.txt” ------------------
     latest_date = display_dates[0]
     latest_date_stocks = stocks_data_per_date.get(latest_date, pd.DataFrame())
-    latest_date_stocks = latest_date_stocks[['ts_code']]
-    file_path = "date/涨停板.txt"
-    latest_date_stocks.to_csv(file_path, index=False, encoding='utf-8')
+    latest_codes = latest_date_stocks['ts_code'] if 'ts_code' in latest_date_stocks.columns else []
+    # 每行一个代码，不写表头（表头会被当作股票代码读入）；同时按交易日保存股票池快照
+    latest_trade_date = df.loc[df['date_label'] == latest_date, 'trade_date'].max().strftime('%Y%m%d')
+    file_path = pools.save("涨停板", latest_codes, day=latest_trade_date)
     st.success(f"最新一天的连板股票代码已保存到 {file_path}")
 
     # ------------------ 为综合图表准备数据 ------------------
@@ -267,7 +278,7 @@ def run_analysis(token):
         "daily_rates_df": daily_rates_df,   # 表2：每日连板晋级率
         "stocks_df": stocks_df,             # 表3：涨停板股票数据（含每日晋级率）
         "recent_date": display_dates[0],
-        "recent_date_stocks": df[df['trade_date'].dt.strftime('%m.%d') == display_dates[0]]['ts_code'].tolist(),
+        "recent_date_stocks": df[df['date_label'] == display_dates[0]]['ts_code'].tolist(),
         # 综合图表所需数据（只取最近 10 个交易日）
         "counts_df": display_counts_df,
         "highest_board_series": highest_board_series,
@@ -433,7 +444,7 @@ def main():
 
     if st.button("开始分析"):
         with st.spinner("正在分析，请稍候..."):
-            results = run_analysis(tushare_token)
+            results = run_analysis()
         if "error" in results:
             st.error(results["error"])
         else:
@@ -69,6 +69,21 @@ for module in query_modules:
 
 st.sidebar.markdown("---")
 
+# “接口缓存统计”：查看本地缓存每天为各接口节省的调用次数
+cache_expander = st.sidebar.expander("接口缓存统计", expanded=False)
+if cache_expander.button("刷新统计", key="cache_stats", use_container_width=True):
+    try:
+        from 接口网关 import pro
+        cache_expander.dataframe(pro.cache_stats(), use_container_width=True, hide_index=True)
+        transport_stats = pro.transport_stats()
+        if transport_stats is not None:
+            cache_expander.caption("连接耗时（建连 vs 服务端）")
+            cache_expander.dataframe(transport_stats, use_container_width=True, hide_index=True)
+        cache_expander.caption("今日额度使用（所有进程合计）")
+        cache_expander.dataframe(pro.quota_usage(), use_container_width=True, hide_index=True)
+    except Exception as e:
+        cache_expander.error(f"读取缓存统计失败: {e}")
+
 # ------------------------------------------------------
 # 5. 返回主页的回调函数
 # ------------------------------------------------------
@@ -0,0 +1,169 @@
+import contextlib
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+
+# 调用优先级：交互查询（页面上的即时查询）优先于批量扫描（更新股票池等后台任务）
+INTERACTIVE = 0
+BULK = 1
+
+_priority = contextvars.ContextVar("tushare_priority", default=INTERACTIVE)
+
+
+def current_priority():
+    return _priority.get()
+
+
+@contextlib.contextmanager
+def priority(level):
+    """
+    在 with 块内发出的接口调用使用指定优先级，例如：
+        with priority(BULK):
+            fan_out(fetch_one, codes)
+    fan_out 会把上下文复制到工作线程，因此线程内的调用同样生效。
+    """
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """
+    令牌桶限流器（线程安全）。
+
+    calls_per_minute 为接口每分钟的调用上限，burst 为允许的瞬时突发量。
+    为了保证任意 60 秒窗口内的调用数都不超过上限，令牌补充速度取
+    (calls_per_minute - burst) / 60 次每秒。
+
+    等待令牌的调用按 (优先级, 到达顺序) 排队：交互调用排在所有批量调用之前；
+    批量调用还要在桶里留下 bulk_reserve 个令牌，交互调用到来时通常无需等待。
+    """
+
+    def __init__(self, calls_per_minute, burst=None, bulk_reserve=None):
+        if calls_per_minute <= 0:
+            raise ValueError("calls_per_minute 必须大于 0")
+        if burst is None:
+            burst = max(1, calls_per_minute // 60)
+        self.calls_per_minute = calls_per_minute
+        self.burst = min(burst, calls_per_minute)
+        self.rate = max(calls_per_minute - self.burst, 1) / 60.0
+        if bulk_reserve is None:
+            bulk_reserve = self.burst // 4
+        self.bulk_reserve = max(0, min(bulk_reserve, self.burst - 1))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._queue = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _needed(self, level):
+        return 1 + (self.bulk_reserve if level == BULK else 0)
+
+    def wait_time(self, level=None):
+        """现在以 level 优先级申请一个令牌大约需要等待的秒数（计入排在前面的调用），只查看不申请"""
+        level = current_priority() if level is None else level
+        with self._cond:
+            self._refill(time.monotonic())
+            ahead = sum(1 for queued_level, _ in self._queue if queued_level <= level)
+            shortage = ahead + self._needed(level) - self._tokens
+            return max(0.0, shortage / self.rate)
+
+    def enqueue(self, level=None):
+        """排队申请一个令牌，返回排队凭据，之后调用 wait(凭据) 等待放行"""
+        level = current_priority() if level is None else level
+        entry = (level, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._queue, entry)
+        return entry
+
+    def wait(self, entry):
+        """阻塞直到排队凭据 entry 拿到令牌"""
+        needed = self._needed(entry[0])
+        with self._cond:
+            try:
+                while True:
+                    self._refill(time.monotonic())
+                    if self._queue[0] == entry:
+                        if self._tokens >= needed:
+                            heapq.heappop(self._queue)
+                            self._tokens -= 1
+                            self._cond.notify_all()
+                            return
+                        self._cond.wait((needed - self._tokens) / self.rate)
+                    else:
+                        # 排在前面的调用拿到令牌后会唤醒其余等待者
+                        self._cond.wait()
+            except BaseException:
+                if entry in self._queue:
+                    self._queue.remove(entry)
+                    heapq.heapify(self._queue)
+                    self._cond.notify_all()
+                raise
+
+    def acquire(self, level=None):
+        """阻塞直到拿到一个令牌；level 默认取当前上下文的优先级"""
+        self.wait(self.enqueue(level))
+
+
+class RateLimiter:
+    """
+    按接口名称分别维护令牌桶。未单独配置的接口使用 default_calls_per_minute。
+    """
+
+    def __init__(self, default_calls_per_minute, endpoint_limits=None):
+        self.default_calls_per_minute = default_calls_per_minute
+        self.endpoint_limits = dict(endpoint_limits or {})
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, api_name):
+        with self._lock:
+            bucket = self._buckets.get(api_name)
+            if bucket is None:
+                limit = self.endpoint_limits.get(api_name, self.default_calls_per_minute)
+                bucket = TokenBucket(limit)
+                self._buckets[api_name] = bucket
+            return bucket
+
+    def acquire(self, api_name):
+        self.bucket(api_name).acquire()
+
+
+class PooledRateLimiter:
+    """
+    多账号额度池：每个 token 各有一个 RateLimiter，分别按接口统计额度。
+    每次调用选择该接口最早可用的账号（等待时间相同则轮流），返回账号下标。
+    """
+
+    def __init__(self, limiters):
+        if not limiters:
+            raise ValueError("limiters 不能为空")
+        self.limiters = list(limiters)
+        self.default_calls_per_minute = self.limiters[0].default_calls_per_minute
+        self.endpoint_limits = self.limiters[0].endpoint_limits
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.limiters)
+
+    def acquire(self, api_name):
+        level = current_priority()
+        count = len(self.limiters)
+        with self._lock:
+            start = self._next.get(api_name, 0)
+            buckets = [limiter.bucket(api_name) for limiter in self.limiters]
+            index = min(range(count), key=lambda i: (buckets[i].wait_time(level), (i - start) % count))
+            self._next[api_name] = (index + 1) % count
+            # 在池锁内排队，后来的调用选账号时能看到这次排队
+            entry = buckets[index].enqueue(level)
+        buckets[index].wait(entry)
+        return index
@@ -1,12 +1,10 @@
 import time
-import tushare as ts
+import numpy as np
 import pandas as pd
-import datetime as dt
 import logging
-import os
 import streamlit as st
 import plotly.express as px
-from datetime import datetime, timedelta
+from datetime import datetime
 
 # ==================== 全局设置 ====================
 pd.set_option('display.max_columns', None)
@@ -19,10 +17,12 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-# 从 secrets.toml 中读取 Tushare API Token，并初始化 pro
-tushare_token = st.secrets["api_keys"]["tushare_token"]
-ts.set_token(tushare_token)
-pro = ts.pro_api()
+# 所有 Tushare 调用统一经过接口网关（进程内共享限流）
+from 接口网关 import pro
+from 交易日历 import calendar
+from 本地仓库 import daily_bars
+from 证券索引 import securities, union
+from 股票池 import pools
 
 # 定义全局颜色标准（用于图表）
 HOT_MONEY_COLOR_SCALE = px.colors.sequential.Blues
@@ -33,18 +33,7 @@ def get_last_n_trade_dates(n=10):
     """
     获取最近 n 个交易日列表，返回形如 ['20250109', '20250108', …]
     """
-    try:
-        today = dt.datetime.today()
-        today_str = today.strftime('%Y%m%d')
-        trade_cal = pro.trade_cal(exchange='', end_date=today_str, is_open=1)
-        if trade_cal.empty:
-            logging.error("获取交易日历失败，返回空数据")
-            return []
-        trade_cal = trade_cal.sort_values(by='cal_date', ascending=False)
-        return trade_cal['cal_date'].head(n).tolist()
-    except Exception as e:
-        logging.error(f"获取交易日历时出错: {e}")
-        return []
+    return list(reversed(calendar.last_n(n)))
 
 
 def get_themes_for_date(trade_date):
@@ -70,7 +59,7 @@ def get_themes_for_date(trade_date):
             if col not in df.columns:
                 logging.error(f"'{col}' 不在题材数据中")
                 return pd.DataFrame()
-            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+            df[col] = df[col].fillna(0)
         return df
     except Exception as e:
         logging.error(f"Error fetching themes for date {trade_date}: {e}")
@@ -173,18 +162,15 @@ def compute_hot_money_counts_for_themes_once(df, latest_date, fallback_date=None
         comps = get_component_stocks(theme_code, trade_dates_to_try)
         theme_to_components[theme_code] = comps
 
-    all_components = set()
-    for comps in theme_to_components.values():
-        all_components.update(comps)
-    all_components = list(all_components)
+    all_components = union(*(securities.to_ids(comps) for comps in theme_to_components.values()))
 
     hm_df = get_all_hot_money_details(latest_date, fallback_date)
     if not hm_df.empty:
-        hm_df = hm_df[hm_df['ts_code'].isin(all_components)]
+        hm_df = hm_df[np.isin(securities.ids(hm_df['ts_code']), all_components)]
 
     stock_to_hotmoney = {}
     if not hm_df.empty:
-        for stock, group in hm_df.groupby('ts_code'):
+        for stock, group in hm_df.groupby('ts_code', observed=True):
             stock_to_hotmoney[stock] = set(group['hm_name'].dropna().unique())
 
     theme_hotmoney_count = {}
@@ -298,18 +284,19 @@ def get_concept_data(trade_date):
 def get_latest_daily_data(trade_date, max_rollback=5):
     """
     获取每日行情数据（只包含股票代码和涨跌幅），
-    如果当前日期没有数据则回撤一天，最多回撤 max_rollback 次，
+    如果当前日期没有数据则回撤到上一个交易日，最多回撤 max_rollback 次，
     返回每日数据及实际使用的交易日期。
     """
     try:
-        daily_data = pro.daily(trade_date=trade_date, fields=["ts_code", "pct_chg"])
+        daily_data = daily_bars.day(trade_date, columns=["pct_chg"])[["ts_code", "pct_chg"]]
         rollback_attempt = 0
         while daily_data.empty and rollback_attempt < max_rollback:
-            trade_date_dt = datetime.strptime(trade_date, "%Y%m%d")
-            trade_date_dt -= timedelta(days=1)
-            trade_date = trade_date_dt.strftime("%Y%m%d")
+            prev_date = calendar.prev(trade_date)
+            if prev_date is None:
+                break
+            trade_date = prev_date
             st.info(f"每日行情数据为空，回撤到 {trade_date}")
-            daily_data = pro.daily(trade_date=trade_date, fields=["ts_code", "pct_chg"])
+            daily_data = daily_bars.day(trade_date, columns=["pct_chg"])[["ts_code", "pct_chg"]]
             rollback_attempt += 1
         return daily_data, trade_date
     except Exception as e:
@@ -321,8 +308,8 @@ def get_concept_cons_data(concept_code, cons_trade_date, daily_trade_date, max_r
     """
     获取指定题材代码对应的成分股数据，并合并每个成分股的最新涨跌幅数据。
     成分股数据和每日行情数据均采用回撤逻辑：
-      - 如果成分股数据为空，则回撤一天后重新查询（最多回撤 max_rollback 次）。
-      - 每日行情数据查询时，如果当前日期无数据，则回撤一天后重新查询（最多回撤 max_rollback 次）。
+      - 如果成分股数据为空，则回撤到上一个交易日后重新查询（最多回撤 max_rollback 次）。
+      - 每日行情数据查询时，如果当前日期无数据，则回撤到上一个交易日后重新查询（最多回撤 max_rollback 次）。
     注意：最终输出的成分股表中不包含交易日期列。
     """
     try:
@@ -334,9 +321,10 @@ def get_concept_cons_data(concept_code, cons_trade_date, daily_trade_date, max_r
             fields=["ts_code", "name", "con_name", "con_code", "trade_date", "desc", "hot_num"]
         )
         while df_cons.empty and rollback_attempt < max_rollback:
-            cons_trade_date_dt = datetime.strptime(cons_trade_date, "%Y%m%d")
-            cons_trade_date_dt -= timedelta(days=1)
-            cons_trade_date = cons_trade_date_dt.strftime("%Y%m%d")
+            prev_date = calendar.prev(cons_trade_date)
+            if prev_date is None:
+                break
+            cons_trade_date = prev_date
             st.info(f"成分股数据为空，回撤到 {cons_trade_date}")
             df_cons = pro.kpl_concept_cons(
                 ts_code=concept_code,
@@ -503,14 +491,7 @@ def theme_data_analysis():
                     trade_dates_to_try.append(fallback_date)
                 comps = get_component_stocks(theme, trade_dates_to_try)
                 all_stock_codes.update(comps)
-            output_folder = "date"
-            os.makedirs(output_folder, exist_ok=True)
-            output_file = os.path.join(output_folder, '成分股.txt')
-            if os.path.exists(output_file):
-                os.remove(output_file)
-            with open(output_file, 'w', encoding='utf-8') as f:
-                for code in sorted(all_stock_codes):
-                    f.write(f"{code}\n")
+            output_file = pools.save("成分股", sorted(all_stock_codes), day=latest_date)
             progress_value = 100
             progress.progress(progress_value)
 
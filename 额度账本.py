@@ -0,0 +1,128 @@
+import datetime as dt
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+from 容错策略 import QuotaExceededError
+
+# ------------------------------------------------------
+# 持久化额度账本：令牌桶只在本进程内存中计数，Streamlit 重启或同时运行多个进程时各自从满额开始，
+# 合计调用量会超过服务端限额。账本把每次调用按 账号 × 接口 记入本地 SQLite，所有进程共用：
+#   每分钟额度  近 60 秒内的调用数达到上限时，等到窗口内最早的一次调用滑出后再发出
+#   每日额度    当天调用数达到 secrets.toml [tushare_daily_quotas] 中的上限时抛出 QuotaExceededError
+# 账号只记录 token 的哈希，不落盘 token 本身。
+# ------------------------------------------------------
+
+QUOTA_LEDGER_PATH = os.path.join("date", "cache", "quota_ledger.sqlite3")
+
+WINDOW_SECONDS = 60
+PRUNE_EVERY = 200           # 每记账多少次清理一次滑出窗口的调用记录
+BUSY_TIMEOUT_SECONDS = 30   # 其他进程持有写锁时的最长等待
+
+
+def token_id(token):
+    """账本中的账号标识：token 的 SHA-1 前 12 位"""
+    return hashlib.sha1(str(token).encode("utf-8")).hexdigest()[:12]
+
+
+class QuotaLedger:
+    """
+    acquire(account, api_name, per_minute, per_day=None)：跨进程申请一次调用额度，
+    必要时阻塞等待；当天额度用完时抛出 QuotaExceededError。
+    每个线程使用各自的 SQLite 连接，记账在 BEGIN IMMEDIATE 事务内完成，多进程之间互斥。
+    """
+
+    def __init__(self, path=QUOTA_LEDGER_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._count = 0
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._lock:
+                if not self._ready:
+                    conn.executescript("""
+                        CREATE TABLE IF NOT EXISTS calls (
+                            account TEXT NOT NULL, api TEXT NOT NULL, ts REAL NOT NULL);
+                        CREATE INDEX IF NOT EXISTS calls_by_key ON calls (account, api, ts);
+                        CREATE TABLE IF NOT EXISTS daily (
+                            account TEXT NOT NULL, api TEXT NOT NULL, day TEXT NOT NULL,
+                            count INTEGER NOT NULL, PRIMARY KEY (account, api, day));
+                    """)
+                    self._ready = True
+            self._local.conn = conn
+        return conn
+
+    def _reserve(self, account, api_name, per_minute, per_day):
+        """尝试记账一次；成功返回 0，否则返回需要等待的秒数"""
+        conn = self._connect()
+        now = time.time()
+        today = dt.date.today().strftime("%Y%m%d")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if per_day:
+                row = conn.execute("SELECT count FROM daily WHERE account=? AND api=? AND day=?",
+                                   (account, api_name, today)).fetchone()
+                if row is not None and row[0] >= per_day:
+                    conn.execute("ROLLBACK")
+                    raise QuotaExceededError(f"接口 {api_name} 今日额度 {per_day} 次已用完")
+            count, oldest = conn.execute(
+                "SELECT COUNT(*), MIN(ts) FROM calls WHERE account=? AND api=? AND ts>?",
+                (account, api_name, now - WINDOW_SECONDS)).fetchone()
+            if count >= per_minute:
+                conn.execute("ROLLBACK")
+                return max(0.01, oldest + WINDOW_SECONDS - now)
+            conn.execute("INSERT INTO calls (account, api, ts) VALUES (?, ?, ?)", (account, api_name, now))
+            conn.execute("""
+                INSERT INTO daily (account, api, day, count) VALUES (?, ?, ?, 1)
+                ON CONFLICT (account, api, day) DO UPDATE SET count = count + 1
+            """, (account, api_name, today))
+            conn.execute("COMMIT")
+        except QuotaExceededError:
+            raise
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        with self._lock:
+            self._count += 1
+            prune = self._count % PRUNE_EVERY == 0
+        if prune:
+            conn.execute("DELETE FROM calls WHERE ts<?", (now - WINDOW_SECONDS,))
+        return 0.0
+
+    def acquire(self, account, api_name, per_minute, per_day=None):
+        while True:
+            try:
+                delay = self._reserve(account, api_name, per_minute, per_day)
+            except QuotaExceededError:
+                raise
+            except Exception as e:
+                # 账本不可用（磁盘只读、文件损坏等）时不阻塞调用，只按进程内令牌桶限流
+                logging.error(f"额度账本记账失败，本次调用不计入账本: {e}")
+                return
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def usage(self, day=None):
+        """返回某天（默认今天）按账号、接口汇总的调用次数"""
+        day = day or dt.date.today().strftime("%Y%m%d")
+        try:
+            rows = self._connect().execute(
+                "SELECT account, api, count FROM daily WHERE day=? ORDER BY count DESC", (day,)).fetchall()
+        except Exception as e:
+            logging.error(f"读取额度账本失败: {e}")
+            rows = []
+        return pd.DataFrame(rows, columns=["账号", "接口", "今日调用次数"])